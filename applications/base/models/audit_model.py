@@ -28,7 +28,24 @@ class Audit(ScaffoldModel, TimestampMixin):
     response_code = fields.CharField(max_length=16, default="", null=True, index=True, description="响应代码")
     response_message = fields.CharField(max_length=512, default="", null=True, description="响应消息")
     response_params = fields.TextField(default="", null=True, description="响应参数")
-    response_elapsed = fields.CharField(max_length=16, description="响应耗时")
+    response_elapsed = fields.BigIntField(default=0, index=True, description="响应耗时(微秒)")
 
     class Meta:
         table = "krun_audit"
+        # 按路由统计耗时分位数、查询路由最慢请求
+        indexes = (("request_router", "response_elapsed"),)
+
+
+class AuditSearchToken(ScaffoldModel):
+    """
+    审计日志关键字检索倒排表
+
+    由审计日志写入器维护（见 applications/base/services/audit_search.py），每行表示某个时间桶内至少有一条审计记录的检索字段包含该二元组（小写），检索时先按关键字的二元组
+    找出同时包含全部二元组的时间桶，再只在这些时间桶的 request_time 范围内做 LIKE 校验。
+    """
+    token = fields.CharField(max_length=2, description="二元组（小写）")
+    bucket = fields.DatetimeField(index=True, description="时间桶起始时间（按 request_time 划分）")
+
+    class Meta:
+        table = "krun_audit_search_token"
+        unique_together = (("token", "bucket"),)
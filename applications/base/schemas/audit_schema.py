@@ -11,7 +11,7 @@ from typing import Optional, List
 
 from pydantic import BaseModel, Field
 
-from enums import HTTPMethod
+from enums import HTTPMethod, MatchMode
 
 
 class AuditBase(BaseModel):
@@ -30,7 +30,7 @@ class AuditBase(BaseModel):
     response_code: Optional[str] = Field(default=None, max_length=16, description="响应代码")
     response_message: Optional[str] = Field(default=None, max_length=512, description="响应消息")
     response_params: Optional[str] = Field(default=None, description="响应参数")
-    response_elapsed: Optional[str] = Field(default=None, max_length=16, description="响应耗时")
+    response_elapsed: Optional[int] = Field(default=None, ge=0, description="响应耗时(微秒)")
 
 
 class AuditCreate(AuditBase):
@@ -40,7 +40,7 @@ class AuditCreate(AuditBase):
     request_method: HTTPMethod = Field(..., description="请求方式")
     request_router: str = Field(..., max_length=255, description="请求路由")
     response_time: datetime = Field(..., description="响应时间")
-    response_elapsed: str = Field(..., max_length=16, description="响应耗时")
+    response_elapsed: int = Field(..., ge=0, description="响应耗时(微秒)")
 
     def create_dict(self):
         return self.model_dump(exclude_unset=True)
@@ -52,6 +52,9 @@ class AuditSelect(AuditBase):
     order: Optional[list] = Field(default=[], examples=["-created_time"], description="排序字段")
     start_time: Optional[str] = Field(default=None, description="开始时间")
     end_time: Optional[str] = Field(default=None, description="结束时间")
+    min_elapsed: Optional[float] = Field(default=None, ge=0, description="最小响应耗时(毫秒)")
+    keyword: Optional[str] = Field(default=None, description="关键字（检索请求接口/路由/参数、响应消息/参数，空格分隔多个关键字）")
+    match_mode: MatchMode = Field(default=MatchMode.CONTAINS, description="文本条件匹配方式: contains | prefix | exact")
 
 
 class AuditBatchDelete(BaseModel):
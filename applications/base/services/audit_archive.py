@@ -0,0 +1,306 @@
+# -*- coding: utf-8 -*-
+"""
+@Author  : yangkai
+@Email   : 807440781@qq.com
+@Project : Krun
+@Module  : audit_archive.py
+@DateTime: 2026/6/23
+
+审计日志冷归档。
+
+早于 AUDIT_ARCHIVE_AFTER_DAYS 天（按自然日对齐）的审计日志按 created_time 逐天归档：
+1. 按主键 keyset 顺序分批读取当天数据，写入 gzip 压缩的 JSON Lines 文件（每行一条记录）；
+2. 重新读取文件校验行数，与写入行数、数据库中的行数一致后，原子重命名为正式文件并记入当天的清单；
+3. 按主键分批删除已归档的数据。
+
+目录结构（OUTPUT_DATAGRAM_DIR/audit_archive）：
+    202606/20260601-{最小id}-{最大id}.jsonl.gz    归档文件，同一天可能有多个（多次归档）
+    202606/20260601.manifest.json                 当天清单：已校验的归档文件、行数、主键范围
+清单只记录校验通过的文件；删除阶段中断时，下次归档先补删清单中主键范围内的残留数据，不会重复归档。
+归档文件按天懒加载读取，只打开查询时间范围内的文件。
+"""
+import asyncio
+import gzip
+import itertools
+import os
+import traceback
+from datetime import date, datetime, timedelta
+from typing import Any, AsyncIterator, Dict, IO, List, Optional, Tuple
+
+import orjson
+from tortoise import fields
+from tortoise.expressions import Q
+
+from applications.base.models.audit_model import Audit
+from applications.base.services.audit_partition import AUDIT_PARTITIONS
+from applications.base.services.audit_search import AUDIT_SEARCH
+from applications.base.services.db_router import DB_ROUTER
+from applications.base.services.scaffold import iter_keyset_chunks
+from configure import GLOBAL_CONFIG, PROJECT_CONFIG, LOGGER
+
+# 归档根目录
+ARCHIVE_DIR = os.path.join(PROJECT_CONFIG.OUTPUT_DATAGRAM_DIR, "audit_archive")
+# 归档任务的命名锁
+_LOCK_NAME = "krun_audit_archive"
+# 归档的字段（模型的全部数据库字段）
+ARCHIVE_FIELDS: Tuple[str, ...] = tuple(
+    name for name in Audit._meta.fields_map if name in Audit._meta.fields_db_projection
+)
+# 归档文件中需还原格式的日期时间字段
+_DATETIME_FIELDS = frozenset(
+    name for name in ARCHIVE_FIELDS if isinstance(Audit._meta.fields_map[name], fields.DatetimeField)
+)
+
+
+def _count_lines(path: str) -> int:
+    with gzip.open(path, "rb") as file:
+        return sum(1 for _ in file)
+
+
+def _read_rows(file: IO[bytes], count: int) -> List[Dict[str, Any]]:
+    """从已打开的 gzip 文件中继续读取最多 count 行并解析。"""
+    return [orjson.loads(line) for line in itertools.islice(file, count)]
+
+
+def _write_json(path: str, data: Any) -> None:
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as file:
+        file.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+    os.replace(temp_path, path)
+
+
+def _to_naive(value: str) -> datetime:
+    return datetime.fromisoformat(value).replace(tzinfo=None)
+
+
+class AuditArchiver:
+    """
+    审计日志冷归档器（每个 worker 进程一个实例，多 worker 间通过命名锁互斥）。
+
+    使用方式：
+        await AUDIT_ARCHIVE.start()                                 # lifespan 启动阶段
+        await AUDIT_ARCHIVE.archive()                               # 手动执行一次归档
+        async for rows in AUDIT_ARCHIVE.iter_day(date(2026, 6, 1)):  # 分块读取某天的归档数据
+        await AUDIT_ARCHIVE.stop()                                  # lifespan 关闭阶段
+    """
+
+    def __init__(
+            self,
+            archive_dir: str,
+            after_days: int = 0,
+            interval: float = 86400.0,
+            chunk_size: int = 2000,
+    ):
+        """
+        :param archive_dir: 归档根目录
+        :param after_days: 归档早于多少天的数据，0 表示不归档
+        :param interval: 归档任务执行间隔（秒）
+        :param chunk_size: 每次从数据库读取的行数
+        """
+        self.model = Audit
+        self.archive_dir = archive_dir
+        self.after_days = after_days
+        self.interval = interval
+        self.chunk_size = max(1, chunk_size)
+        self._task: Optional[asyncio.Task] = None
+        # 运行指标
+        self.last_archived: Optional[str] = None
+        self.days_archived: int = 0
+        self.rows_archived: int = 0
+        self.rows_deleted: int = 0
+        self.errors: int = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.after_days > 0
+
+    def cutoff(self) -> Optional[datetime]:
+        """归档截止时间（当天零点对齐），早于该时间的数据会被归档；未启用时返回 None。"""
+        if not self.enabled:
+            return None
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        return today - timedelta(days=self.after_days)
+
+    def _day_dir(self, day: date) -> str:
+        return os.path.join(self.archive_dir, f"{day:%Y%m}")
+
+    def _manifest_path(self, day: date) -> str:
+        return os.path.join(self._day_dir(day), f"{day:%Y%m%d}.manifest.json")
+
+    def load_manifest(self, day: date) -> Dict[str, Any]:
+        """读取某天的归档清单，没有归档时返回空清单。"""
+        path = self._manifest_path(day)
+        if not os.path.exists(path):
+            return {"day": day.isoformat(), "parts": []}
+        with open(path, "rb") as file:
+            return orjson.loads(file.read())
+
+    def archived_days(self, start: Optional[date] = None, end: Optional[date] = None) -> List[date]:
+        """列出 [start, end] 内有归档数据的日期（升序），只扫描范围内月份的目录。"""
+        if not os.path.isdir(self.archive_dir):
+            return []
+        days: List[date] = []
+        for month in sorted(os.listdir(self.archive_dir)):
+            if not month.isdigit() or len(month) != 6:
+                continue
+            if (start and month < f"{start:%Y%m}") or (end and month > f"{end:%Y%m}"):
+                continue
+            for name in sorted(os.listdir(os.path.join(self.archive_dir, month))):
+                if not name.endswith(".manifest.json"):
+                    continue
+                day = datetime.strptime(name[:8], "%Y%m%d").date()
+                if (start is None or day >= start) and (end is None or day <= end):
+                    days.append(day)
+        return days
+
+    async def iter_day(self, day: date) -> AsyncIterator[List[Dict[str, Any]]]:
+        """
+        流式读取某天的归档数据（按主键升序），每次产出最多 chunk_size 行，不会把整天的数据解压到内存；
+        日期时间字段还原为 GLOBAL_CONFIG.DATETIME_FORMAT2 格式。
+        """
+        for part in self.load_manifest(day)["parts"]:
+            file = await asyncio.to_thread(gzip.open, os.path.join(self._day_dir(day), part["file"]), "rb")
+            try:
+                while True:
+                    rows = await asyncio.to_thread(_read_rows, file, self.chunk_size)
+                    if not rows:
+                        break
+                    for row in rows:
+                        for name in _DATETIME_FIELDS:
+                            if row.get(name):
+                                row[name] = _to_naive(row[name]).strftime(GLOBAL_CONFIG.DATETIME_FORMAT2)
+                    yield rows
+            finally:
+                file.close()
+
+    async def archive(self) -> int:
+        """归档截止时间之前的全部数据，返回本次归档的行数。"""
+        cutoff = self.cutoff()
+        if cutoff is None:
+            return 0
+        archived = 0
+        async with DB_ROUTER.named_lock(_LOCK_NAME) as acquired:
+            if not acquired:
+                # 其他 worker 正在归档
+                return 0
+            day = await self._next_day(None, cutoff)
+            while day is not None:
+                archived += await self.archive_day(day)
+                day = await self._next_day(datetime.combine(day + timedelta(days=1), datetime.min.time()), cutoff)
+        self.last_archived = datetime.now().isoformat(sep=" ", timespec="seconds")
+        return archived
+
+    async def _next_day(self, since: Optional[datetime], cutoff: datetime) -> Optional[date]:
+        """截止时间之前、since 之后最早一条数据所在的日期。"""
+        search = Q(created_time__lt=cutoff)
+        if since is not None:
+            search &= Q(created_time__gte=since)
+        values = await self.model.filter(search).order_by("created_time").limit(1).values_list("created_time", flat=True)
+        return values[0].date() if values else None
+
+    def _day_q(self, day: date) -> Q:
+        start = datetime.combine(day, datetime.min.time())
+        return Q(created_time__gte=start, created_time__lt=start + timedelta(days=1))
+
+    async def _delete_part(self, day: date, part: Dict[str, Any]) -> int:
+        return await AUDIT_PARTITIONS.delete_batched(
+            self._day_q(day) & Q(id__gte=part["min_id"], id__lte=part["max_id"])
+        )
+
+    async def archive_day(self, day: date) -> int:
+        """归档某一天的数据：导出、校验、记入清单、分批删除；校验失败时保留数据库中的数据。"""
+        manifest = self.load_manifest(day)
+        # 上次删除阶段中断的残留数据（已校验归档）
+        for part in manifest["parts"]:
+            self.rows_deleted += await self._delete_part(day, part)
+
+        query = self.model.filter(self._day_q(day))
+        max_ids = await query.order_by("-id").limit(1).values_list("id", flat=True)
+        if not max_ids:
+            return 0
+        # 以当前最大主键为界，归档期间新写入的数据留给下一次归档
+        query = query.filter(id__lte=max_ids[0])
+        expected = await query.count()
+
+        os.makedirs(self._day_dir(day), exist_ok=True)
+        temp_path = os.path.join(self._day_dir(day), f"{day:%Y%m%d}.jsonl.gz.tmp")
+        id_index = ARCHIVE_FIELDS.index("id")
+        written, min_id, max_id = 0, None, None
+        with gzip.open(temp_path, "wb") as file:
+            async for chunk in iter_keyset_chunks(query, self.chunk_size, order=["id"], fields=list(ARCHIVE_FIELDS)):
+                data = b"".join(orjson.dumps(dict(zip(ARCHIVE_FIELDS, row))) + b"\n" for row in chunk)
+                await asyncio.to_thread(file.write, data)
+                written += len(chunk)
+                min_id = chunk[0][id_index] if min_id is None else min_id
+                max_id = chunk[-1][id_index]
+
+        lines = await asyncio.to_thread(_count_lines, temp_path)
+        if not written or lines != written or written != expected:
+            os.remove(temp_path)
+            if written:
+                self.errors += 1
+                LOGGER.error(
+                    f"审计日志归档校验失败, 保留数据库数据: 日期={day}, 应归档={expected}, 已读取={written}, 文件行数={lines}"
+                )
+            return 0
+
+        part = {"file": f"{day:%Y%m%d}-{min_id}-{max_id}.jsonl.gz", "rows": written, "min_id": min_id, "max_id": max_id}
+        os.replace(temp_path, os.path.join(self._day_dir(day), part["file"]))
+        manifest["parts"].append(part)
+        _write_json(self._manifest_path(day), manifest)
+
+        deleted = await self._delete_part(day, part)
+        if deleted != written:
+            LOGGER.warning(f"审计日志归档删除行数与归档行数不一致: 日期={day}, 归档={written}, 删除={deleted}")
+        # 更早的日期均已归档，删除至当天结束的检索倒排表时间桶
+        await AUDIT_SEARCH.purge(datetime.combine(day + timedelta(days=1), datetime.min.time()))
+        self.days_archived += 1
+        self.rows_archived += written
+        self.rows_deleted += deleted
+        LOGGER.info(f"审计日志已归档: 日期={day}, 行数={written}, 文件={part['file']}")
+        return written
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.archive()
+            except Exception as e:
+                self.errors += 1
+                LOGGER.error(f"审计日志归档失败, 异常描述: {e}\n{traceback.format_exc()}")
+            await asyncio.sleep(self.interval)
+
+    async def start(self) -> None:
+        """启动归档任务（未启用归档时不启动）。"""
+        if not self.enabled or (self._task is not None and not self._task.done()):
+            return
+        self._task = asyncio.create_task(self._run(), name="audit-archive")
+        LOGGER.info(f"审计日志归档已启动: 归档早于 {self.after_days} 天的数据, 目录={self.archive_dir}")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "after_days": self.after_days,
+            "last_archived": self.last_archived,
+            "days_archived": self.days_archived,
+            "rows_archived": self.rows_archived,
+            "rows_deleted": self.rows_deleted,
+            "errors": self.errors,
+        }
+
+
+AUDIT_ARCHIVE = AuditArchiver(
+    archive_dir=ARCHIVE_DIR,
+    after_days=PROJECT_CONFIG.AUDIT_ARCHIVE_AFTER_DAYS,
+    interval=PROJECT_CONFIG.AUDIT_ARCHIVE_INTERVAL,
+    chunk_size=PROJECT_CONFIG.AUDIT_ARCHIVE_CHUNK_SIZE,
+)
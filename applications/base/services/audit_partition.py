@@ -0,0 +1,329 @@
+# -*- coding: utf-8 -*-
+"""
+@Author  : yangkai
+@Email   : 807440781@qq.com
+@Project : Krun
+@Module  : audit_partition.py
+@DateTime: 2026/6/22
+
+审计日志分区维护与保留策略。
+
+审计表按 created_time 做 RANGE COLUMNS 分区（迁移 4），分区以其数据的起始时间命名
+（月分区 p202606，日分区 p20260601），最后一个分区 p_future 存放超出已建分区范围的数据。
+lifespan 启动的后台任务每 AUDIT_PARTITION_CHECK_INTERVAL 秒执行一次维护：
+- 从 p_future 拆分出未来 AUDIT_PARTITION_PREMAKE 个周期的分区（REORGANIZE PARTITION）；
+- 删除上界不晚于保留期限（AUDIT_RETENTION_DAYS）的整个分区（DROP PARTITION），
+  不产生逐行删除的行锁与 undo 日志；保留期限落在某个分区中间时，该分区在整体过期后才删除。
+  删除不可恢复，保留期默认 0（永久保留，不删除任何数据），需显式配置后才会生效。
+关键字检索倒排表（AUDIT_SEARCH）早于保留期限的时间桶同时删除。
+多 worker 部署时通过主库命名锁（DB_ROUTER.named_lock）保证同一时刻只有一个进程执行维护 DDL。
+非 MySQL 数据库或审计表未分区时，过期数据改为按主键分批删除。
+"""
+import asyncio
+import traceback
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from tortoise import connections
+from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise.expressions import Q
+
+from applications.base.models.audit_model import Audit
+from applications.base.services.audit_search import AUDIT_SEARCH
+from applications.base.services.db_router import DB_ROUTER, PRIMARY_CONNECTION
+from configure import PROJECT_CONFIG, LOGGER
+
+# 存放超出已建分区范围数据的最后一个分区
+FUTURE_PARTITION = "p_future"
+# 分区维护的命名锁
+_LOCK_NAME = "krun_audit_partition"
+# 分区粒度 -> 分区名格式
+_NAME_FORMATS = {"month": "p%Y%m", "day": "p%Y%m%d"}
+
+
+class AuditPartition(NamedTuple):
+    """审计表的一个分区。"""
+    name: str
+    # 分区上界（不含），None 表示 MAXVALUE
+    upper: Optional[datetime]
+    # information_schema 中的估算行数
+    rows: int
+
+
+def _period_start(value: datetime, interval: str) -> datetime:
+    value = value.replace(hour=0, minute=0, second=0, microsecond=0)
+    return value.replace(day=1) if interval == "month" else value
+
+
+def _next_period(value: datetime, interval: str) -> datetime:
+    if interval == "month":
+        return (value.replace(day=1) + timedelta(days=32)).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    return _period_start(value, interval) + timedelta(days=1)
+
+
+def _parse_bound(description: Optional[str]) -> Optional[datetime]:
+    """解析 PARTITION_DESCRIPTION（"'2026-07-01 00:00:00'" 或 "MAXVALUE"）。"""
+    if not description or description.upper() == "MAXVALUE":
+        return None
+    return datetime.fromisoformat(description.strip("'\""))
+
+
+class AuditPartitionManager:
+    """
+    审计日志分区管理器（每个 worker 进程一个实例）。
+
+    使用方式：
+        await AUDIT_PARTITIONS.start()                        # lifespan 启动阶段，启动分区维护任务
+        search &= AUDIT_PARTITIONS.retention_q()              # 查询限定在保留期内，裁剪过期分区
+        await AUDIT_PARTITIONS.delete_range(start, end)       # 按时间范围删除，整分区 DROP
+        await AUDIT_PARTITIONS.stop()                         # lifespan 关闭阶段
+    """
+
+    def __init__(
+            self,
+            retention_days: int = 0,
+            interval: str = "month",
+            premake: int = 3,
+            check_interval: float = 3600.0,
+            delete_batch_size: int = 5000,
+    ):
+        """
+        :param retention_days: 保留天数，0 表示永久保留
+        :param interval: 新建分区的粒度（month/day）
+        :param premake: 提前创建的未来分区数量
+        :param check_interval: 维护任务执行间隔（秒）
+        :param delete_batch_size: 分批删除的每批行数
+        """
+        if interval not in _NAME_FORMATS:
+            raise ValueError(f"不支持的审计分区粒度: {interval}, 可选: {list(_NAME_FORMATS)}")
+        self.model = Audit
+        self.retention_days = retention_days
+        self.interval = interval
+        self.premake = max(1, premake)
+        self.check_interval = check_interval
+        self.delete_batch_size = max(1, delete_batch_size)
+        self._task: Optional[asyncio.Task] = None
+        # 运行指标
+        self.last_maintained: Optional[str] = None
+        self.partitions_created: int = 0
+        self.partitions_dropped: int = 0
+        self.rows_purged: int = 0
+        self.errors: int = 0
+
+    @property
+    def table(self) -> str:
+        return self.model._meta.db_table
+
+    @staticmethod
+    def _client() -> BaseDBAsyncClient:
+        return connections.get(PRIMARY_CONNECTION)
+
+    def supported(self) -> bool:
+        """数据库是否支持分区维护（MySQL）。"""
+        return self._client().capabilities.dialect == "mysql"
+
+    def cutoff(self) -> Optional[datetime]:
+        """保留期限：早于该时间的数据已过期；永久保留时返回 None。"""
+        if not self.retention_days:
+            return None
+        return datetime.now() - timedelta(days=self.retention_days)
+
+    def retention_q(self) -> Q:
+        """
+        保留期内的查询条件。
+
+        附加到审计查询上后，MySQL 按 created_time 裁剪掉尚未删除的过期分区；
+        查询自带的时间范围条件同样参与分区裁剪。
+        """
+        cutoff = self.cutoff()
+        return Q(created_time__gte=cutoff) if cutoff else Q()
+
+    async def partitions(self) -> List[AuditPartition]:
+        """按顺序列出审计表的分区，未分区或非 MySQL 时返回空列表。"""
+        if not self.supported():
+            return []
+        rows = await self._execute(
+            "SELECT PARTITION_NAME, PARTITION_DESCRIPTION, TABLE_ROWS FROM information_schema.PARTITIONS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL "
+            "ORDER BY PARTITION_ORDINAL_POSITION",
+            [self.table],
+        )
+        return [AuditPartition(name=row[0], upper=_parse_bound(row[1]), rows=int(row[2] or 0)) for row in rows]
+
+    async def ensure_future(self) -> List[str]:
+        """从 p_future 拆分出覆盖到当前周期之后 premake 个周期的分区，返回新建的分区名。"""
+        partitions = await self.partitions()
+        if not partitions or partitions[-1].name != FUTURE_PARTITION:
+            return []
+        bounded = [partition.upper for partition in partitions if partition.upper is not None]
+        bound = bounded[-1] if bounded else _period_start(datetime.now(), self.interval)
+        target = _period_start(datetime.now(), self.interval)
+        for _ in range(self.premake + 1):
+            target = _next_period(target, self.interval)
+
+        created: List[Tuple[str, datetime]] = []
+        while bound < target:
+            upper = _next_period(bound, self.interval)
+            created.append((bound.strftime(_NAME_FORMATS[self.interval]), upper))
+            bound = upper
+        if not created:
+            return []
+
+        definitions = ", ".join(
+            f"PARTITION `{name}` VALUES LESS THAN ('{upper:%Y-%m-%d %H:%M:%S}')" for name, upper in created
+        )
+        await self._execute(
+            f"ALTER TABLE `{self.table}` REORGANIZE PARTITION `{FUTURE_PARTITION}` INTO "
+            f"({definitions}, PARTITION `{FUTURE_PARTITION}` VALUES LESS THAN (MAXVALUE))",
+        )
+        names = [name for name, _ in created]
+        self.partitions_created += len(names)
+        LOGGER.info(f"审计表已创建分区: {names}")
+        return names
+
+    async def drop_partitions(self, names: Sequence[str]) -> None:
+        if not names:
+            return
+        await self._execute(
+            f"ALTER TABLE `{self.table}` DROP PARTITION {', '.join(f'`{name}`' for name in names)}",
+        )
+        self.partitions_dropped += len(names)
+        LOGGER.info(f"审计表已删除分区: {list(names)}")
+
+    async def purge_expired(self) -> int:
+        """删除过期数据：分区表整分区删除，否则分批删除；返回删除的行数（整分区删除时为估算值）。"""
+        cutoff = self.cutoff()
+        if cutoff is None:
+            return 0
+        partitions = await self.partitions()
+        if not partitions:
+            purged = await self.delete_batched(Q(created_time__lt=cutoff))
+        else:
+            expired = [p for p in partitions if p.upper is not None and p.upper <= cutoff]
+            await self.drop_partitions([p.name for p in expired])
+            purged = sum(p.rows for p in expired)
+        await AUDIT_SEARCH.purge(cutoff)
+        self.rows_purged += purged
+        return purged
+
+    async def delete_batched(self, search: Q) -> int:
+        """按主键分批删除满足条件的行，每批一个短事务，避免长时间锁表与大事务。"""
+        deleted = 0
+        while True:
+            ids = await self.model.filter(search).limit(self.delete_batch_size).values_list("id", flat=True)
+            if not ids:
+                return deleted
+            deleted += await self.model.filter(id__in=list(ids)).delete()
+            if len(ids) < self.delete_batch_size:
+                return deleted
+
+    async def delete_range(self, start: Optional[datetime], end: Optional[datetime]) -> int:
+        """
+        删除 created_time 在 [start, end] 内的数据。
+
+        完全落在区间内的分区整体删除，区间边缘所在分区中的数据分批删除；不预先 COUNT(*) 扫描整个区间。
+
+        :return: 删除的行数（整分区删除的部分为 information_schema 中的估算行数，其余为分批删除的实际行数）
+        """
+        search = Q()
+        if start is not None:
+            search &= Q(created_time__gte=start)
+        if end is not None:
+            search &= Q(created_time__lte=end)
+
+        inside: List[AuditPartition] = []
+        lower: Optional[datetime] = None
+        for partition in await self.partitions():
+            lower_inside = start is None or (lower is not None and lower >= start)
+            upper_inside = end is None or (partition.upper is not None and partition.upper <= end)
+            # p_future 总是保留，最早的分区下界为负无穷
+            if lower_inside and upper_inside and partition.name != FUTURE_PARTITION:
+                inside.append(partition)
+            lower = partition.upper
+        await self.drop_partitions([partition.name for partition in inside])
+        return sum(partition.rows for partition in inside) + await self.delete_batched(search)
+
+    async def truncate(self) -> int:
+        """
+        清空审计表：MySQL 使用 TRUNCATE TABLE（保留分区定义），其他数据库分批删除；同时清理检索倒排表。
+
+        :return: 删除的行数（分区表为 information_schema 中的估算行数）
+        """
+        partitions = await self.partitions()
+        if partitions:
+            total = sum(partition.rows for partition in partitions)
+            await self._execute(f"TRUNCATE TABLE `{self.table}`")
+        elif self.supported():
+            total = await self.model.all().count()
+            await self._execute(f"TRUNCATE TABLE `{self.table}`")
+        else:
+            total = await self.delete_batched(Q())
+        await AUDIT_SEARCH.purge()
+        return total
+
+    async def maintain(self) -> None:
+        """执行一次分区维护：创建未来分区、删除过期数据。"""
+        if not self.supported():
+            await self.purge_expired()
+            self.last_maintained = datetime.now().isoformat(sep=" ", timespec="seconds")
+            return
+        async with DB_ROUTER.named_lock(_LOCK_NAME) as acquired:
+            if not acquired:
+                # 其他 worker 正在维护
+                return
+            await self.ensure_future()
+            await self.purge_expired()
+        self.last_maintained = datetime.now().isoformat(sep=" ", timespec="seconds")
+
+    async def _execute(self, sql: str, params: Optional[list] = None) -> list:
+        _, rows = await self._client().execute_query(sql, params)
+        return [tuple(row.values()) if isinstance(row, dict) else tuple(row) for row in rows or []]
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.maintain()
+            except Exception as e:
+                self.errors += 1
+                LOGGER.error(f"审计分区维护失败, 异常描述: {e}\n{traceback.format_exc()}")
+            await asyncio.sleep(self.check_interval)
+
+    async def start(self) -> None:
+        """启动分区维护任务。"""
+        if self._task is not None and not self._task.done():
+            return
+        self._task = asyncio.create_task(self._run(), name="audit-partition")
+        LOGGER.info(
+            f"审计分区维护已启动: 保留天数={self.retention_days or '永久'}, 分区粒度={self.interval}, "
+            f"预建分区={self.premake}, 检查间隔={self.check_interval}s"
+        )
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "retention_days": self.retention_days,
+            "interval": self.interval,
+            "last_maintained": self.last_maintained,
+            "partitions_created": self.partitions_created,
+            "partitions_dropped": self.partitions_dropped,
+            "rows_purged": self.rows_purged,
+            "errors": self.errors,
+        }
+
+
+AUDIT_PARTITIONS = AuditPartitionManager(
+    retention_days=PROJECT_CONFIG.AUDIT_RETENTION_DAYS,
+    interval=PROJECT_CONFIG.AUDIT_PARTITION_INTERVAL,
+    premake=PROJECT_CONFIG.AUDIT_PARTITION_PREMAKE,
+    check_interval=PROJECT_CONFIG.AUDIT_PARTITION_CHECK_INTERVAL,
+    delete_batch_size=PROJECT_CONFIG.AUDIT_DELETE_BATCH_SIZE,
+)
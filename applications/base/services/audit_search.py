@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""
+@Author  : yangkai
+@Email   : 807440781@qq.com
+@Project : Krun
+@Module  : audit_search.py
+@DateTime: 2026/6/21
+
+审计日志关键字检索索引（ngram 时间桶倒排表 krun_audit_search_token）。
+
+审计表按 created_time 分区（迁移 4）后 MySQL 不支持 FULLTEXT 索引，关键字检索改为由应用维护的倒排表：
+- 写入：审计日志写入器每批落库前，按 request_time 把记录划入 AUDIT_SEARCH_BUCKET_MINUTES 分钟的时间桶，
+  提取检索字段的二元组（小写，不含空白字符），以 INSERT IGNORE 写入 (token, bucket)；
+  每个进程记住最近时间桶已写入的二元组，同一时间桶内重复出现的二元组不再写库；
+- 检索：关键字的二元组须在同一时间桶内全部出现，命中的时间桶合并为 request_time 区间，
+  查询只扫描这些区间（使用 request_time 索引，并由 created_time 条件裁剪分区），再以 LIKE 校验；
+  倒排表覆盖范围之前的记录（最早的时间桶及更早）仍按 LIKE 扫描。
+时间桶只从最早的一端删除，且不删除最近 _RECENT_WINDOW 内的时间桶（各进程仍可能认为其已写入），
+因此倒排表覆盖的时间范围始终连续，检索结果与逐行 LIKE 扫描一致。
+"""
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Set, Tuple
+
+from tortoise.expressions import Q
+from tortoise.functions import Count
+
+from applications.base.models.audit_model import AuditSearchToken
+from applications.base.services.db_router import DB_ROUTER
+from configure import PROJECT_CONFIG, LOGGER
+
+# 关键字检索的字段
+AUDIT_SEARCH_FIELDS = ("request_summary", "request_router", "request_params", "response_message", "response_params")
+# 每个关键字最多使用的二元组数量（任意子集都只会放宽候选时间桶，不影响结果正确性）
+_TERM_TOKEN_LIMIT = 8
+# 进程内记住已写入二元组的时间范围；删除时间桶时保留该范围两倍以内的时间桶
+_RECENT_WINDOW = timedelta(hours=1)
+
+
+def _naive(value: datetime) -> datetime:
+    """去掉时区信息（use_tz=False 时数据库中保存的即为本地时间）。"""
+    return value.replace(tzinfo=None) if value.tzinfo is not None else value
+
+
+class AuditSearchIndex:
+    """
+    审计日志关键字检索索引（每个 worker 进程一个实例）。
+
+    使用方式：
+        await AUDIT_SEARCH.index(records)                  # 审计日志写入器，在记录落库前调用
+        q = await AUDIT_SEARCH.search_q(["订单", "order"])  # 关键字命中记录所在的 request_time 范围
+        await AUDIT_SEARCH.purge(before)                   # 删除早于 before 的时间桶
+    """
+
+    def __init__(self, bucket_minutes: int = 10, max_ranges: int = 500, batch_size: int = 5000):
+        """
+        :param bucket_minutes: 时间桶分钟数（1~1440）
+        :param max_ranges: 命中的时间区间超过该数量时放弃使用倒排表
+        :param batch_size: 批量写入/删除的每批行数
+        """
+        self.model = AuditSearchToken
+        self.bucket_minutes = min(max(1, bucket_minutes), 1440)
+        self.max_ranges = max(1, max_ranges)
+        self.batch_size = max(1, batch_size)
+        # 时间桶 -> 本进程已写入的二元组
+        self._written: Dict[datetime, Set[str]] = {}
+        # 运行指标
+        self.tokens_written: int = 0
+        self.searches: int = 0
+        self.fallbacks: int = 0
+
+    @property
+    def step(self) -> timedelta:
+        return timedelta(minutes=self.bucket_minutes)
+
+    def bucket_of(self, value: datetime) -> datetime:
+        """时间所在时间桶的起始时间（按当天的分钟数对齐）。"""
+        minutes = value.hour * 60 + value.minute
+        minutes -= minutes % self.bucket_minutes
+        return value.replace(hour=minutes // 60, minute=minutes % 60, second=0, microsecond=0)
+
+    @staticmethod
+    def tokens(text: str) -> Set[str]:
+        """文本的二元组集合（casefold 后按字符切分，跳过含空白字符的二元组）。"""
+        text = text.casefold()
+        grams = {text[i:i + 2] for i in range(len(text) - 1)}
+        return {gram for gram in grams if not (gram[0].isspace() or gram[1].isspace())}
+
+    async def index(self, records: Iterable[Mapping[str, Any]]) -> int:
+        """
+        为一批审计记录写入倒排表（须在记录落库前调用，写入失败时调用方不应写入审计记录）。
+
+        :return: 写入的 (token, bucket) 行数（含已存在而被忽略的行）
+        """
+        pending: Dict[datetime, Set[str]] = {}
+        for record in records:
+            request_time = record.get("request_time")
+            if request_time is None:
+                continue
+            grams = pending.setdefault(self.bucket_of(request_time), set())
+            for field in AUDIT_SEARCH_FIELDS:
+                value = record.get(field)
+                if value:
+                    grams |= self.tokens(str(value))
+
+        rows = [
+            self.model(token=gram, bucket=bucket)
+            for bucket, grams in pending.items()
+            for gram in grams - self._written.get(bucket, set())
+        ]
+        if rows:
+            await self.model.bulk_create(rows, batch_size=self.batch_size, ignore_conflicts=True)
+            self.tokens_written += len(rows)
+
+        for bucket, grams in pending.items():
+            self._written.setdefault(bucket, set()).update(grams)
+        recent = datetime.now() - _RECENT_WINDOW
+        for bucket in [bucket for bucket in self._written if _naive(bucket) < recent]:
+            del self._written[bucket]
+        return len(rows)
+
+    async def search_q(self, terms: Sequence[str], since: Optional[datetime] = None) -> Optional[Q]:
+        """
+        构造关键字命中记录所在 request_time 范围的条件（须与各关键字的 LIKE 条件同时使用）。
+
+        :param terms: 关键字列表，需同时命中
+        :param since: 只查找不早于该时间的时间桶（如保留期限）
+        :return: request_time 范围条件；关键字均短于 2 个字符、倒排表为空或命中区间过多时返回 None（按 LIKE 扫描）
+        """
+        grams: Set[str] = set()
+        for term in terms:
+            grams.update(sorted(self.tokens(term))[:_TERM_TOKEN_LIMIT])
+        if not grams:
+            return None
+        self.searches += 1
+        client = DB_ROUTER.db_for_read()
+        first = await self.model.all().using_db(client).order_by("bucket").limit(1).values_list("bucket", flat=True)
+        if not first:
+            self.fallbacks += 1
+            return None
+        # 最早的时间桶中可能有建立倒排表之前写入的记录，与更早的记录一起按 LIKE 扫描
+        covered = _naive(first[0]) + self.step
+        lower = covered if since is None else max(covered, self.bucket_of(_naive(since)))
+        buckets = await (
+            self.model.filter(token__in=list(grams), bucket__gte=lower)
+            .using_db(client)
+            .annotate(hits=Count("id"))
+            .group_by("bucket")
+            .filter(hits=len(grams))
+            .order_by("bucket")
+            .values_list("bucket", flat=True)
+        )
+        ranges: List[Tuple[datetime, datetime]] = []
+        for bucket in map(_naive, buckets):
+            if ranges and ranges[-1][1] == bucket:
+                ranges[-1] = (ranges[-1][0], bucket + self.step)
+            else:
+                ranges.append((bucket, bucket + self.step))
+        if len(ranges) > self.max_ranges:
+            # 关键字过于常见，按时间区间过滤没有裁剪效果
+            self.fallbacks += 1
+            return None
+        conditions = [Q(request_time__lt=covered)]
+        conditions.extend(Q(request_time__gte=start, request_time__lt=end) for start, end in ranges)
+        return Q(*conditions, join_type=Q.OR)
+
+    async def purge(self, before: Optional[datetime] = None) -> int:
+        """
+        分批删除早于 before 的时间桶，before 为空时删除最近时间桶以外的全部；最近的时间桶始终保留
+        （各进程可能认为其已写入，删除后新记录的二元组不会补写），其对应的记录即使已删除也只会使检索多扫描该时间段。
+
+        :return: 删除的行数
+        """
+        latest = self.bucket_of(datetime.now() - 2 * _RECENT_WINDOW)
+        before = latest if before is None else min(_naive(before), latest)
+        deleted = 0
+        while True:
+            ids = await self.model.filter(bucket__lt=before).limit(self.batch_size).values_list("id", flat=True)
+            if not ids:
+                break
+            deleted += await self.model.filter(id__in=list(ids)).delete()
+            if len(ids) < self.batch_size:
+                break
+        if deleted:
+            LOGGER.info(f"审计检索倒排表已删除早于 {before} 的时间桶, 删除行数: {deleted}")
+        return deleted
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "bucket_minutes": self.bucket_minutes,
+            "tokens_written": self.tokens_written,
+            "searches": self.searches,
+            "fallbacks": self.fallbacks,
+        }
+
+
+AUDIT_SEARCH = AuditSearchIndex(
+    bucket_minutes=PROJECT_CONFIG.AUDIT_SEARCH_BUCKET_MINUTES,
+    max_ranges=PROJECT_CONFIG.AUDIT_SEARCH_MAX_RANGES,
+    batch_size=PROJECT_CONFIG.AUDIT_DELETE_BATCH_SIZE,
+)
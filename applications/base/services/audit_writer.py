@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+@Author  : yangkai
+@Email   : 807440781@qq.com
+@Project : Krun
+@Module  : audit_writer.py
+@DateTime: 2026/6/10
+
+审计日志异步批量写入器。
+
+请求链路只负责把审计记录放入进程内有界队列，由 lifespan 启动的后台任务按
+数量阈值（AUDIT_BATCH_SIZE）或时间阈值（AUDIT_FLUSH_INTERVAL）聚合后
+使用 bulk_create 多行插入（落库前写入关键字检索倒排表，见 audit_search.py），应用关闭时排空队列后再退出。
+"""
+import asyncio
+import traceback
+from typing import Any, Dict, List, Optional
+
+from applications.base.models.audit_model import Audit
+from applications.base.services.audit_search import AUDIT_SEARCH
+from configure import PROJECT_CONFIG, LOGGER
+
+# 停止信号：排在其之前的记录全部落库后工作协程退出
+_STOP_SIGNAL = object()
+
+
+class AuditWriter:
+    """
+    审计日志后台写入器（每个 worker 进程一个实例）。
+
+    使用方式：
+        await AUDIT_WRITER.start()      # lifespan 启动阶段
+        AUDIT_WRITER.submit(audit_log)  # 请求链路，非阻塞
+        await AUDIT_WRITER.stop()       # lifespan 关闭阶段，排空队列
+    """
+
+    def __init__(
+            self,
+            max_queue_size: int = 10000,
+            batch_size: int = 200,
+            flush_interval: float = 1.0,
+            drain_timeout: float = 10.0,
+    ):
+        """
+        :param max_queue_size: 队列容量上限
+        :param batch_size: 单次批量落库的最大记录数
+        :param flush_interval: 批次未写满时的最长等待时间（秒）
+        :param drain_timeout: 停止时等待队列排空的最长时间（秒）
+        """
+        self.max_queue_size = max_queue_size
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.drain_timeout = drain_timeout
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        # 运行指标
+        self.written: int = 0
+        self.dropped: int = 0
+        self.failed: int = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "pending": self.pending,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
+
+    async def start(self) -> None:
+        """在当前事件循环中创建队列并启动后台写入协程。"""
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._task = asyncio.create_task(self._run(), name="audit-writer")
+        LOGGER.info(
+            f"审计日志写入器已启动: 队列容量={self.max_queue_size}, "
+            f"批量大小={self.batch_size}, 刷新间隔={self.flush_interval}s"
+        )
+
+    def submit(self, record: Dict[str, Any]) -> bool:
+        """
+        提交一条审计记录（非阻塞）。
+
+        :param record: Audit 模型字段字典
+        :return: 入队成功返回 True；写入器未运行或队列已满时丢弃并返回 False
+        """
+        if not self.running:
+            self.dropped += 1
+            LOGGER.warning(f"审计日志写入器未运行, 丢弃审计记录: {record.get('request_router')}")
+            return False
+        try:
+            self._queue.put_nowait(record)
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            LOGGER.warning(f"审计日志队列已满({self.max_queue_size}), 丢弃审计记录, 累计丢弃: {self.dropped}")
+            return False
+
+    async def stop(self) -> None:
+        """发送停止信号并等待队列排空，超时后取消后台协程。"""
+        if not self.running:
+            return
+        await self._queue.put(_STOP_SIGNAL)
+        try:
+            await asyncio.wait_for(self._task, timeout=self.drain_timeout)
+        except asyncio.TimeoutError:
+            LOGGER.error(f"审计日志队列排空超时({self.drain_timeout}s), 剩余未落库: {self.pending}")
+            self._task.cancel()
+        finally:
+            self._task = None
+        LOGGER.info(f"审计日志写入器已停止: 已写入={self.written}, 丢弃={self.dropped}, 失败={self.failed}")
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            record = await self._queue.get()
+            if record is _STOP_SIGNAL:
+                return
+
+            batch: List[Dict[str, Any]] = [record]
+            stopping = False
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                # 优先取走已就绪的记录，队列为空时才按剩余时间等待
+                if self._queue.empty():
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        record = await asyncio.wait_for(self._queue.get(), timeout=timeout)
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    record = self._queue.get_nowait()
+                if record is _STOP_SIGNAL:
+                    stopping = True
+                    break
+                batch.append(record)
+
+            await self._flush(batch)
+            if stopping:
+                return
+
+    async def _flush(self, batch: List[Dict[str, Any]]) -> None:
+        """
+        先写入关键字检索倒排表，再多行插入一批审计记录；失败时仅记录日志，不影响后续批次。
+
+        倒排表写入失败时不写入审计记录（否则这些记录无法被关键字检索命中），审计记录写入失败时
+        已写入的倒排表行只会使检索多扫描对应时间段。
+        """
+        try:
+            await AUDIT_SEARCH.index(batch)
+            await Audit.bulk_create([Audit(**record) for record in batch], batch_size=self.batch_size)
+            self.written += len(batch)
+        except Exception as e:
+            self.failed += len(batch)
+            LOGGER.error(f"审计日志批量落库失败, 数量={len(batch)}, 异常描述: {e}\n{traceback.format_exc()}")
+
+
+AUDIT_WRITER = AuditWriter(
+    max_queue_size=PROJECT_CONFIG.AUDIT_QUEUE_MAX_SIZE,
+    batch_size=PROJECT_CONFIG.AUDIT_BATCH_SIZE,
+    flush_interval=PROJECT_CONFIG.AUDIT_FLUSH_INTERVAL,
+    drain_timeout=PROJECT_CONFIG.AUDIT_DRAIN_TIMEOUT,
+)
@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+"""
+@Author  : yangkai
+@Email   : 807440781@qq.com
+@Project : Krun
+@Module  : db_router.py
+@DateTime: 2026/6/17
+
+读写分离路由。
+
+ScaffoldCrud/QueryBuilder 的读操作通过 DB_ROUTER.db_for_read() 选择连接：配置了只读副本
+（PROJECT_CONFIG.DATABASE_REPLICAS）时按策略（轮询/最低延迟）选取健康副本，以下情况仍走主库：
+- 处于事务中（DB_ROUTER.transaction / ScaffoldCrud.transactional）；
+- 同一请求内发生写操作后的 DATABASE_READ_YOUR_WRITES_WINDOW 秒内（读己之写）；
+- 显式 with DB_ROUTER.use_primary() 代码块内。
+
+写操作由注册到 Tortoise 的 ReadYourWritesRouter 记录（不改变写连接），
+后台探测任务定期对副本执行 SELECT 1，更新延迟并剔除不可用副本。
+"""
+import asyncio
+import contextvars
+import itertools
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager, contextmanager
+from time import monotonic
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Type, Union
+
+from tortoise import connections
+from tortoise.backends.base.client import BaseDBAsyncClient, BaseTransactionWrapper
+from tortoise.transactions import in_transaction
+
+from configure import PROJECT_CONFIG, LOGGER
+
+# 主库连接名
+PRIMARY_CONNECTION = "default"
+
+# 本请求读操作需走主库的截止时间（monotonic），由写操作刷新
+CTX_PRIMARY_UNTIL: contextvars.ContextVar[float] = contextvars.ContextVar("db_primary_until", default=0.0)
+# 显式指定读主库
+CTX_FORCE_PRIMARY: contextvars.ContextVar[bool] = contextvars.ContextVar("db_force_primary", default=False)
+
+
+class ReplicaPolicy(ABC):
+    """副本选择策略：从健康副本中选出本次读操作使用的连接名。"""
+
+    name: str = ""
+
+    @abstractmethod
+    def choose(self, replicas: List[str], latency: Dict[str, float]) -> str:
+        ...
+
+
+class RoundRobinPolicy(ReplicaPolicy):
+    """轮询。"""
+
+    name = "round_robin"
+
+    def __init__(self):
+        self._counter = itertools.count()
+
+    def choose(self, replicas: List[str], latency: Dict[str, float]) -> str:
+        return replicas[next(self._counter) % len(replicas)]
+
+
+class LeastLatencyPolicy(ReplicaPolicy):
+    """选择探测延迟（指数移动平均）最低的副本，尚未探测的副本优先。"""
+
+    name = "least_latency"
+
+    def choose(self, replicas: List[str], latency: Dict[str, float]) -> str:
+        return min(replicas, key=lambda replica: latency.get(replica, 0.0))
+
+
+REPLICA_POLICIES: Dict[str, Type[ReplicaPolicy]] = {
+    RoundRobinPolicy.name: RoundRobinPolicy,
+    LeastLatencyPolicy.name: LeastLatencyPolicy,
+}
+
+
+class DatabaseRouter:
+    """
+    读写分离路由器（每个 worker 进程一个实例）。
+
+    使用方式：
+        await DB_ROUTER.start()                               # lifespan 启动阶段，开始探测副本
+        query = Model.filter(...).using_db(DB_ROUTER.db_for_read())
+        with DB_ROUTER.use_primary(): ...                     # 强制读主库
+        await DB_ROUTER.stop()                                # lifespan 关闭阶段
+    """
+
+    # 延迟指数移动平均的平滑系数
+    LATENCY_ALPHA = 0.3
+
+    def __init__(
+            self,
+            replicas: List[str],
+            policy: Union[str, ReplicaPolicy] = RoundRobinPolicy.name,
+            read_your_writes_window: float = 2.0,
+            probe_interval: float = 5.0,
+            primary: str = PRIMARY_CONNECTION,
+    ):
+        """
+        :param replicas: 只读副本连接名列表，为空时所有读操作走主库
+        :param policy: 副本选择策略名（见 REPLICA_POLICIES）或 ReplicaPolicy 实例
+        :param read_your_writes_window: 写操作后读主库的时间窗口（秒）
+        :param probe_interval: 副本探测间隔（秒）
+        :param primary: 主库连接名
+        """
+        self.primary = primary
+        self.replicas = list(replicas)
+        self.read_your_writes_window = read_your_writes_window
+        self.probe_interval = probe_interval
+        self.policy: ReplicaPolicy = self._resolve_policy(policy)
+        self._unhealthy: set = set()
+        self._latency: Dict[str, float] = {}
+        self._task: Optional[asyncio.Task] = None
+        # 运行指标
+        self.primary_reads: int = 0
+        self.replica_reads: Dict[str, int] = {replica: 0 for replica in self.replicas}
+
+    @staticmethod
+    def _resolve_policy(policy: Union[str, ReplicaPolicy]) -> ReplicaPolicy:
+        if isinstance(policy, ReplicaPolicy):
+            return policy
+        if policy not in REPLICA_POLICIES:
+            raise ValueError(f"不支持的副本选择策略: {policy}, 可选: {list(REPLICA_POLICIES)}")
+        return REPLICA_POLICIES[policy]()
+
+    def set_policy(self, policy: Union[str, ReplicaPolicy]) -> None:
+        """替换副本选择策略。"""
+        self.policy = self._resolve_policy(policy)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.replicas)
+
+    def mark_write(self) -> None:
+        """记录本请求发生了写操作，读己之写窗口内的读操作走主库。"""
+        if self.replicas:
+            CTX_PRIMARY_UNTIL.set(monotonic() + self.read_your_writes_window)
+
+    @contextmanager
+    def use_primary(self) -> Iterator[None]:
+        """代码块内的读操作强制走主库。"""
+        token = CTX_FORCE_PRIMARY.set(True)
+        try:
+            yield
+        finally:
+            CTX_FORCE_PRIMARY.reset(token)
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[BaseDBAsyncClient]:
+        """在主库上开启事务，提交后开启读己之写窗口（事务内显式 using_db 的写操作不经过 Tortoise 路由）。"""
+        async with in_transaction(self.primary) as connection:
+            yield connection
+        self.mark_write()
+
+    @asynccontextmanager
+    async def named_lock(self, name: str) -> AsyncIterator[bool]:
+        """
+        主库命名锁（MySQL GET_LOCK，非阻塞），用于多 worker 间互斥执行后台维护任务：
+            async with DB_ROUTER.named_lock("task") as acquired:
+                if acquired: ...
+
+        锁绑定在会话上，代码块执行期间独占一个连接；非 MySQL 数据库直接视为获取成功。
+        """
+        client = connections.get(self.primary)
+        if client.capabilities.dialect != "mysql":
+            yield True
+            return
+        async with client.acquire_connection() as connection:
+            async with connection.cursor() as cursor:
+                await cursor.execute("SELECT GET_LOCK(%s, 0)", [name])
+                row = await cursor.fetchone()
+            acquired = bool(row) and list(row.values() if isinstance(row, dict) else row)[0] == 1
+            try:
+                yield acquired
+            finally:
+                if acquired:
+                    async with connection.cursor() as cursor:
+                        await cursor.execute("SELECT RELEASE_LOCK(%s)", [name])
+
+    def _should_read_primary(self) -> bool:
+        if CTX_FORCE_PRIMARY.get() or monotonic() < CTX_PRIMARY_UNTIL.get():
+            return True
+        # 事务内的读必须与写使用同一连接
+        return isinstance(connections.get(self.primary), BaseTransactionWrapper)
+
+    def db_for_read(self) -> Optional[BaseDBAsyncClient]:
+        """
+        选择读连接。
+
+        :return: 选中的副本连接；应读主库时返回 None（由 Tortoise 使用模型默认连接，事务内即为事务连接）
+        """
+        if not self.replicas or self._should_read_primary():
+            self.primary_reads += 1
+            return None
+        healthy = [replica for replica in self.replicas if replica not in self._unhealthy]
+        if not healthy:
+            self.primary_reads += 1
+            return None
+        replica = self.policy.choose(healthy, self._latency)
+        self.replica_reads[replica] += 1
+        return connections.get(replica)
+
+    def observe(self, replica: str, elapsed: Optional[float]) -> None:
+        """记录一次副本探测结果，elapsed 为 None 表示探测失败。"""
+        if elapsed is None:
+            if replica not in self._unhealthy:
+                LOGGER.warning(f"只读副本不可用, 读操作暂时改走其他副本或主库: {replica}")
+            self._unhealthy.add(replica)
+            return
+        if replica in self._unhealthy:
+            LOGGER.info(f"只读副本已恢复: {replica}")
+            self._unhealthy.discard(replica)
+        previous = self._latency.get(replica)
+        self._latency[replica] = elapsed if previous is None else (
+                self.LATENCY_ALPHA * elapsed + (1 - self.LATENCY_ALPHA) * previous
+        )
+
+    async def probe(self) -> None:
+        """对所有副本执行一次 SELECT 1 探测。"""
+        for replica in self.replicas:
+            started = monotonic()
+            try:
+                await connections.get(replica).execute_query("SELECT 1")
+            except Exception as e:
+                LOGGER.error(f"只读副本探测失败: {replica}, 异常描述: {e}")
+                self.observe(replica, None)
+            else:
+                self.observe(replica, monotonic() - started)
+
+    async def _run(self) -> None:
+        while True:
+            await self.probe()
+            await asyncio.sleep(self.probe_interval)
+
+    async def start(self) -> None:
+        """启动副本探测任务（未配置副本时不启动）。"""
+        if not self.replicas or (self._task is not None and not self._task.done()):
+            return
+        self._task = asyncio.create_task(self._run(), name="db-replica-probe")
+        LOGGER.info(
+            f"读写分离已启用: 副本={self.replicas}, 策略={self.policy.name or type(self.policy).__name__}, "
+            f"读己之写窗口={self.read_your_writes_window}s"
+        )
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "policy": self.policy.name or type(self.policy).__name__,
+            "primary_reads": self.primary_reads,
+            "replicas": {
+                replica: {
+                    "healthy": replica not in self._unhealthy,
+                    "latency_ms": round(self._latency[replica] * 1000, 3) if replica in self._latency else None,
+                    "reads": self.replica_reads[replica],
+                }
+                for replica in self.replicas
+            },
+        }
+
+
+class ReadYourWritesRouter:
+    """
+    Tortoise 连接路由（配置项 routers）。
+
+    不改变任何查询的连接选择，仅在写操作选择连接时记录写入时间，
+    使同一请求后续经 ScaffoldCrud 的读操作在窗口期内走主库。
+    读写均返回模型自身的连接名：返回 None 时 Tortoise 会以 connections.get(None) 查找连接，
+    每次查询都抛出并捕获一次 ConfigurationError。
+    """
+
+    def db_for_read(self, model: Any) -> str:
+        return model._meta.default_connection
+
+    def db_for_write(self, model: Any) -> str:
+        DB_ROUTER.mark_write()
+        return model._meta.default_connection
+
+
+DB_ROUTER = DatabaseRouter(
+    replicas=PROJECT_CONFIG.DATABASE_REPLICA_CONNECTIONS,
+    policy=PROJECT_CONFIG.DATABASE_REPLICA_POLICY,
+    read_your_writes_window=PROJECT_CONFIG.DATABASE_READ_YOUR_WRITES_WINDOW,
+    probe_interval=PROJECT_CONFIG.DATABASE_REPLICA_PROBE_INTERVAL,
+)
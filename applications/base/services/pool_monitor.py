@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+@Author  : yangkai
+@Email   : 807440781@qq.com
+@Project : Krun
+@Module  : pool_monitor.py
+@DateTime: 2026/6/18
+
+数据库连接池监控。
+
+lifespan 启动阶段调用 POOL_MONITOR.attach()，为每个 Tortoise 连接的 aiomysql 连接池包装 acquire：
+统计获取连接的等待时间（直方图）、等待中的协程数与获取超时次数，并为获取连接加上
+DATABASE_POOL_ACQUIRE_TIMEOUT 超时，连接池耗尽时尽快失败而不是无限排队。
+连接池尚未创建（首次使用时才建立）时在创建后再包装。
+"""
+import asyncio
+from time import monotonic
+from typing import Any, Dict, List, Optional
+
+from tortoise import connections
+from tortoise.exceptions import DBConnectionError
+
+from configure import PROJECT_CONFIG, LOGGER
+
+# 获取连接等待时间直方图的桶上限（毫秒），最后一个桶为 +Inf
+ACQUIRE_WAIT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class PoolMetrics:
+    """单个连接池的获取连接指标。"""
+
+    __slots__ = ("acquired", "timeouts", "waiting", "max_waiting", "wait_sum", "wait_max", "buckets")
+
+    def __init__(self):
+        self.acquired: int = 0
+        self.timeouts: int = 0
+        self.waiting: int = 0
+        self.max_waiting: int = 0
+        self.wait_sum: float = 0.0
+        self.wait_max: float = 0.0
+        self.buckets: List[int] = [0] * (len(ACQUIRE_WAIT_BUCKETS_MS) + 1)
+
+    def observe(self, elapsed: float) -> None:
+        elapsed_ms = elapsed * 1000
+        self.wait_sum += elapsed_ms
+        self.wait_max = max(self.wait_max, elapsed_ms)
+        for index, upper in enumerate(ACQUIRE_WAIT_BUCKETS_MS):
+            if elapsed_ms <= upper:
+                self.buckets[index] += 1
+                return
+        self.buckets[-1] += 1
+
+    def histogram(self) -> Dict[str, int]:
+        """累计直方图：{"le_1ms": 小于等于 1ms 的次数, ..., "le_inf": 总次数}"""
+        histogram: Dict[str, int] = {}
+        cumulative = 0
+        for upper, count in zip(ACQUIRE_WAIT_BUCKETS_MS, self.buckets):
+            cumulative += count
+            histogram[f"le_{upper}ms"] = cumulative
+        histogram["le_inf"] = cumulative + self.buckets[-1]
+        return histogram
+
+
+class PoolMonitor:
+    """
+    连接池监控（每个 worker 进程一个实例）。
+
+    使用方式：
+        POOL_MONITOR.attach()   # lifespan 启动阶段，数据库注册之后
+        POOL_MONITOR.stats()    # 指标接口
+    """
+
+    def __init__(self, acquire_timeout: float = 10.0):
+        """
+        :param acquire_timeout: 获取连接的最长等待时间（秒），0 表示不限制
+        """
+        self.acquire_timeout = acquire_timeout
+        self._pools: Dict[str, Any] = {}
+        self._metrics: Dict[str, PoolMetrics] = {}
+
+    def attach(self) -> None:
+        """包装当前全部 Tortoise 连接的连接池（重复调用只包装一次）。"""
+        for name in connections.db_config:
+            if name in self._metrics:
+                continue
+            client = connections.get(name)
+            self._metrics[name] = PoolMetrics()
+            pool = getattr(client, "_pool", None)
+            if pool is not None:
+                self._instrument(name, pool)
+            else:
+                self._instrument_on_create(name, client)
+
+    def _instrument_on_create(self, name: str, client: Any) -> None:
+        create_connection = client.create_connection
+
+        async def create_connection_wrapper(*args, **kwargs):
+            await create_connection(*args, **kwargs)
+            pool = getattr(client, "_pool", None)
+            if pool is not None and name not in self._pools:
+                self._instrument(name, pool)
+
+        client.create_connection = create_connection_wrapper
+
+    def _instrument(self, name: str, pool: Any) -> None:
+        if not hasattr(pool, "acquire"):
+            return
+        metrics = self._metrics[name]
+        acquire = pool.acquire
+        acquire_timeout = self.acquire_timeout
+
+        async def acquire_wrapper():
+            metrics.waiting += 1
+            metrics.max_waiting = max(metrics.max_waiting, metrics.waiting)
+            started = monotonic()
+            try:
+                if acquire_timeout:
+                    connection = await asyncio.wait_for(acquire(), timeout=acquire_timeout)
+                else:
+                    connection = await acquire()
+            except asyncio.TimeoutError:
+                metrics.timeouts += 1
+                LOGGER.error(
+                    f"获取数据库连接超时({acquire_timeout}s): 连接={name}, "
+                    f"连接池={getattr(pool, 'size', '-')}/{getattr(pool, 'maxsize', '-')}, 等待数={metrics.waiting}"
+                )
+                raise DBConnectionError(f"获取数据库连接超时({acquire_timeout}s), 连接池已耗尽: {name}")
+            finally:
+                metrics.waiting -= 1
+            metrics.acquired += 1
+            metrics.observe(monotonic() - started)
+            return connection
+
+        # Tortoise 仅以 await pool.acquire() 的方式获取连接
+        pool.acquire = acquire_wrapper
+        self._pools[name] = pool
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        result: Dict[str, Dict[str, Any]] = {}
+        for name, metrics in self._metrics.items():
+            pool = self._pools.get(name)
+            size: Optional[int] = getattr(pool, "size", None)
+            idle: Optional[int] = getattr(pool, "freesize", None)
+            result[name] = {
+                "minsize": getattr(pool, "minsize", None),
+                "maxsize": getattr(pool, "maxsize", None),
+                "size": size,
+                "in_use": size - idle if size is not None and idle is not None else None,
+                "idle": idle,
+                "waiting": metrics.waiting,
+                "max_waiting": metrics.max_waiting,
+                "acquired": metrics.acquired,
+                "acquire_timeouts": metrics.timeouts,
+                "acquire_wait_avg_ms": round(metrics.wait_sum / metrics.acquired, 3) if metrics.acquired else 0.0,
+                "acquire_wait_max_ms": round(metrics.wait_max, 3),
+                "acquire_wait_histogram": metrics.histogram(),
+            }
+        return result
+
+
+POOL_MONITOR = PoolMonitor(acquire_timeout=PROJECT_CONFIG.DATABASE_POOL_ACQUIRE_TIMEOUT)
@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+"""
+@Author  : yangkai
+@Email   : 807440781@qq.com
+@Project : Krun
+@Module  : query_cache.py
+@DateTime: 2026/6/19
+
+查询结果缓存。
+
+ScaffoldCrud 开启缓存（cache_ttl）后，list/list_keyset/count/exists/aggregate/group_by 以及
+@ScaffoldCrud.cached 标记的自定义读方法的结果按 模型 + 查询 SQL（即规范化后的 Q、排序、分页）缓存。
+每个模型维护一个缓存代数（generation），键中包含代数；ScaffoldCrud 的写方法提交后递增代数，
+该模型的全部旧条目随即不可达，由 LRU/TTL 自然淘汰。代数在查询前读取，查询期间发生的写入
+不会让旧结果写回到新代数下。
+
+后端可插拔（QUERY_CACHE_BACKEND，默认 auto：多 worker 时为 redis，单 worker 时为 local）：
+- local：进程内 LRU + TTL，代数只在本进程递增，仅适用于单 worker 部署；
+  多 worker 部署时其他 worker 收不到失效，显式配置为 local 时缓存不启用（读方法直接查询数据库）；
+- redis：多 worker 共享缓存与代数。
+结果以 pickle 序列化存储，命中时返回独立副本，调用方修改返回对象不会污染缓存。
+"""
+import hashlib
+import pickle
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from configure import PROJECT_CONFIG, LOGGER
+
+
+class QueryCacheBackend(ABC):
+    """查询缓存存储后端（shared 表示缓存与代数在多个 worker 进程间共享）。"""
+
+    shared: bool = False
+
+    @abstractmethod
+    async def generation(self, namespace: str) -> int:
+        ...
+
+    @abstractmethod
+    async def invalidate(self, namespace: str) -> None:
+        """递增命名空间代数，使该命名空间下的已有条目全部失效。"""
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[bytes]:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        ...
+
+    async def close(self) -> None:
+        pass
+
+    def size(self) -> Optional[int]:
+        return None
+
+
+class LocalQueryCacheBackend(QueryCacheBackend):
+    """进程内 LRU + TTL 后端。"""
+
+    def __init__(self, max_size: int = 2048):
+        self.max_size = max(1, max_size)
+        self._entries: "OrderedDict[str, Tuple[bytes, float]]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+
+    async def generation(self, namespace: str) -> int:
+        return self._generations.get(namespace, 0)
+
+    async def invalidate(self, namespace: str) -> None:
+        self._generations[namespace] = self._generations.get(namespace, 0) + 1
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            self._entries.pop(key, None)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        self._entries[key] = (value, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def close(self) -> None:
+        self._entries.clear()
+
+    def size(self) -> Optional[int]:
+        return len(self._entries)
+
+
+class RedisQueryCacheBackend(QueryCacheBackend):
+    """Redis 共享后端：条目使用 PX 过期，代数使用 INCR 计数。"""
+
+    shared: bool = True
+
+    def __init__(self, redis_url: str, prefix: str):
+        self.redis_url = redis_url
+        self.prefix = prefix
+        self._client = None
+
+    def _redis(self):
+        if self._client is None:
+            try:
+                from redis import asyncio as aioredis
+            except ImportError as e:
+                raise RuntimeError("查询缓存后端为 redis, 但未安装 redis 依赖, 请重新安装项目依赖") from e
+            self._client = aioredis.from_url(self.redis_url)
+        return self._client
+
+    async def generation(self, namespace: str) -> int:
+        value = await self._redis().get(f"{self.prefix}:gen:{namespace}")
+        return int(value) if value is not None else 0
+
+    async def invalidate(self, namespace: str) -> None:
+        await self._redis().incr(f"{self.prefix}:gen:{namespace}")
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self._redis().get(f"{self.prefix}:{key}")
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        await self._redis().set(f"{self.prefix}:{key}", value, px=max(1, int(ttl * 1000)))
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class QueryCache:
+    """
+    查询结果缓存（每个 worker 进程一个实例）。
+
+    后端读写失败时记录日志并直接查询数据库，缓存故障不影响业务读写。
+    多 worker 部署默认使用 redis 后端；显式配置为 local（后端不共享）时不启用：写操作只能使本进程的代数失效，其他 worker 会在 TTL 内返回旧结果。
+    """
+
+    def __init__(self, backend: QueryCacheBackend, workers: int = 1):
+        """
+        :param backend: 存储后端
+        :param workers: worker 进程数，大于 1 时要求后端在进程间共享
+        """
+        self.backend = backend
+        self.enabled: bool = backend.shared or workers <= 1
+        if not self.enabled:
+            LOGGER.warning(
+                f"查询结果缓存未启用: {workers} 个 worker 进程但缓存后端不能跨进程失效, "
+                f"请配置 QUERY_CACHE_BACKEND=redis"
+            )
+        # 运行指标
+        self.hits: int = 0
+        self.misses: int = 0
+        self.invalidations: int = 0
+        self.errors: int = 0
+
+    @staticmethod
+    def _digest(key_parts: Tuple[Any, ...]) -> str:
+        return hashlib.blake2b(repr(key_parts).encode("utf-8"), digest_size=16).hexdigest()
+
+    async def get_or_load(
+            self,
+            namespace: str,
+            key_parts: Tuple[Any, ...],
+            loader: Callable[[], Awaitable[Any]],
+            ttl: float,
+    ) -> Any:
+        """
+        读取缓存，未命中时执行 loader 并回填。
+
+        :param namespace: 命名空间（模型表名）
+        :param key_parts: 组成缓存键的可 repr 值（查询 SQL、分页参数等）
+        :param loader: 查询数据库的协程函数
+        :param ttl: 缓存有效期（秒）
+        """
+        if not self.enabled:
+            return await loader()
+        try:
+            generation = await self.backend.generation(namespace)
+            key = f"{namespace}:{generation}:{self._digest(key_parts)}"
+            cached = await self.backend.get(key)
+        except Exception as e:
+            self.errors += 1
+            LOGGER.error(f"查询缓存读取失败, 改为直接查询, 命名空间={namespace}, 异常描述: {e}")
+            return await loader()
+
+        if cached is not None:
+            self.hits += 1
+            return pickle.loads(cached)
+
+        self.misses += 1
+        value = await loader()
+        try:
+            await self.backend.set(key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), ttl)
+        except Exception as e:
+            self.errors += 1
+            LOGGER.error(f"查询缓存回填失败, 命名空间={namespace}, 异常描述: {e}")
+        return value
+
+    async def invalidate(self, namespace: str) -> None:
+        """失效命名空间下的全部缓存；需在写操作提交之后调用。"""
+        if not self.enabled:
+            return
+        self.invalidations += 1
+        try:
+            await self.backend.invalidate(namespace)
+        except Exception as e:
+            self.errors += 1
+            LOGGER.error(f"查询缓存失效失败, 命名空间={namespace}, 异常描述: {e}")
+
+    async def close(self) -> None:
+        await self.backend.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": type(self.backend).__name__,
+            "enabled": self.enabled,
+            "size": self.backend.size(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "errors": self.errors,
+        }
+
+
+def _build_backend() -> QueryCacheBackend:
+    if PROJECT_CONFIG.shared_backend(PROJECT_CONFIG.QUERY_CACHE_BACKEND) == "redis":
+        return RedisQueryCacheBackend(
+            redis_url=PROJECT_CONFIG.REDIS_URL,
+            prefix=PROJECT_CONFIG.QUERY_CACHE_REDIS_PREFIX,
+        )
+    return LocalQueryCacheBackend(max_size=PROJECT_CONFIG.QUERY_CACHE_MAX_SIZE)
+
+
+QUERY_CACHE = QueryCache(backend=_build_backend(), workers=PROJECT_CONFIG.SERVER_WORKERS)
@@ -7,23 +7,39 @@
 @DateTime: 2025/1/18 10:48
 """
 import asyncio
+import base64
+import functools
+import math
 import traceback
 import uuid
+from collections import OrderedDict
+from contextlib import nullcontext
+from functools import lru_cache
 from datetime import datetime, date, time, timedelta
 from decimal import Decimal
-from typing import Any, Dict, Generic, List, Tuple, Type, TypeVar, Union, Optional, Set
+from enum import Enum
+from time import monotonic
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, FrozenSet, Generic, List, Sequence, Tuple, Type, TypeVar, Union, Optional, Set
 
+import orjson
+from pypika.terms import Function as PypikaFunction, Term, ValueWrapper
 from pydantic import BaseModel, GetCoreSchemaHandler
 from pydantic_core import core_schema
-from tortoise import fields, models
+from tortoise import connections, fields, models
 from tortoise.exceptions import FieldError
-from tortoise.expressions import Q
+from tortoise.expressions import Expression, Q, ResolveContext
+from tortoise.filters import Like, escape_like
+from tortoise.functions import Function
 from tortoise.models import Model
-from tortoise.queryset import QuerySet
+from tortoise.query_utils import QueryModifier
+from tortoise.queryset import AwaitableQuery, QuerySet
 from tortoise.transactions import in_transaction
 
-from configure import GLOBAL_CONFIG, LOGGER
+from applications.base.services.db_router import DB_ROUTER, PRIMARY_CONNECTION
+from applications.base.services.query_cache import QUERY_CACHE
+from configure import GLOBAL_CONFIG, PROJECT_CONFIG, LOGGER
 from core.exceptions import ParameterException, NotFoundException
+from enums import CountMode, ConflictMode, MatchMode
 
 
 def unique_identify() -> str:
@@ -38,6 +54,87 @@ def unique_identify() -> str:
     return f"{timestamp}-{uuid4_str}"
 
 
+def _format_value(value: Any):
+    """
+    格式化字段值为可序列化的类型（通用格式化器，按值类型逐个判断）。
+
+    支持的类型转换：
+    - Decimal -> str（避免 JSON 序列化错误）
+    - datetime/date/time -> str（按全局配置格式化）
+    - bytes -> str（UTF-8 解码）
+    - timedelta -> str
+    """
+    if isinstance(value, Decimal):
+        return str(value)
+    elif isinstance(value, datetime):
+        value = value.strftime(GLOBAL_CONFIG.DATETIME_FORMAT2)
+    elif isinstance(value, date):
+        value = value.strftime(GLOBAL_CONFIG.DATE_FORMAT)
+    elif isinstance(value, time):
+        value = value.strftime(GLOBAL_CONFIG.TIME_FORMAT)
+    elif isinstance(value, bytes):
+        value = value.decode("utf-8")
+    elif isinstance(value, timedelta):
+        value = str(value)
+    return value
+
+
+def _format_datetime(value: Any):
+    return value.strftime(GLOBAL_CONFIG.DATETIME_FORMAT2) if isinstance(value, datetime) else _format_value(value)
+
+
+def _format_date(value: Any):
+    return value.strftime(GLOBAL_CONFIG.DATE_FORMAT) if isinstance(value, date) else _format_value(value)
+
+
+def _format_decimal(value: Any):
+    return str(value) if isinstance(value, Decimal) else _format_value(value)
+
+
+def _format_bytes(value: Any):
+    return value.decode("utf-8") if isinstance(value, bytes) else _format_value(value)
+
+
+# 按字段 python 类型选择格式化器：None 表示原样输出，未列出的类型使用通用格式化器
+_FIELD_TYPE_FORMATTERS: Dict[type, Optional[Callable[[Any], Any]]] = {
+    int: None,
+    str: None,
+    bool: None,
+    float: None,
+    datetime: _format_datetime,
+    date: _format_date,
+    Decimal: _format_decimal,
+    bytes: _format_bytes,
+}
+
+# 序列化计划：(实例属性名, 输出键, 格式化器或 None)
+SerializerPlan = Tuple[Tuple[str, str, Optional[Callable[[Any], Any]]], ...]
+
+
+@lru_cache(maxsize=512)
+def _compile_serializer_plan(
+        model: Type["ScaffoldModel"],
+        include_fields: Optional[Tuple[str, ...]],
+        exclude_fields: FrozenSet[str],
+        replace_fields: Optional[Tuple[Tuple[str, str], ...]],
+) -> SerializerPlan:
+    """按 (模型, 包含字段, 排除字段, 别名映射) 编译序列化计划，结果进入 LRU 缓存。"""
+    replace_map: Dict[str, str] = dict(replace_fields or ())
+    fields_map = model._meta.fields_map
+    plan = []
+    for field in include_fields or model._meta.fields_db_projection:
+        if field in exclude_fields:
+            continue
+        field_object = fields_map.get(field)
+        if field_object is None:
+            # 非模型字段（如动态属性）无法确定类型，使用通用格式化器
+            formatter = _format_value
+        else:
+            formatter = _FIELD_TYPE_FORMATTERS.get(field_object.field_type, _format_value)
+        plan.append((field, replace_map.get(field, field), formatter))
+    return tuple(plan)
+
+
 class ScaffoldModel(models.Model):
     """
     脚手架模型基类，提供通用的模型序列化能力。
@@ -47,6 +144,26 @@ class ScaffoldModel(models.Model):
     """
     id = fields.BigIntField(pk=True, description="主键")
 
+    @classmethod
+    def serializer_plan(
+            cls,
+            include_fields: Optional[Union[List[str], Set[str]]] = None,
+            exclude_fields: Optional[Union[List[str], Set[str]]] = None,
+            replace_fields: Optional[Dict[str, str]] = None,
+    ) -> SerializerPlan:
+        """
+        获取当前模型在给定字段选择下的序列化计划。
+
+        计划为 (属性名, 输出键, 格式化器) 的扁平元组，格式化器按 _meta.fields_map 中的字段类型选定；
+        相同的字段选择只编译一次，之后从 LRU 缓存中直接取用。
+        """
+        return _compile_serializer_plan(
+            cls,
+            tuple(include_fields) if include_fields else None,
+            frozenset(exclude_fields or ()),
+            tuple(sorted(replace_fields.items())) if replace_fields else None,
+        )
+
     async def to_dict(
             self,
             include_fields: Optional[Union[List[str], Set[str]]] = None,
@@ -94,20 +211,11 @@ class ScaffoldModel(models.Model):
         m2m_exclude_fields = m2m_exclude_fields or []
         fk_exclude_fields = fk_exclude_fields or []
 
+        # 按编译好的序列化计划处理本表字段，并对特定类型的值进行预处理
         d = {}
-        # 获取本表字段并根据 include_fields 参数确定要处理的字段列表
-        db_fields_process = self._meta.db_fields
-        if include_fields:
-            db_fields_process = include_fields
-
-        # 遍历字段列表，将字段值添加到字典中，并对特定类型的值进行预处理
-        for field in db_fields_process:
-            if field in exclude_fields:
-                continue
+        for field, key, formatter in self.serializer_plan(include_fields, exclude_fields, replace_fields):
             value = getattr(self, field)
-            if replace_fields:
-                field = replace_fields.get(field, field)
-            d[field] = await self.__format_value(value)
+            d[key] = formatter(value) if formatter is not None else value
 
         # 如果 fk 为 True，异步获取外键字段关联的数据
         if fk:
@@ -136,29 +244,77 @@ class ScaffoldModel(models.Model):
         return d
 
     @classmethod
-    async def __format_value(cls, value: Any):
-        """
-        格式化字段值为可序列化的类型。
-
-        支持的类型转换：
-        - Decimal -> str（避免 JSON 序列化错误）
-        - datetime/date/time -> str（按全局配置格式化）
-        - bytes -> str（UTF-8 解码）
-        - timedelta -> str
-        """
-        if isinstance(value, Decimal):
-            return str(value)
-        elif isinstance(value, datetime):
-            value = value.strftime(GLOBAL_CONFIG.DATETIME_FORMAT2)
-        elif isinstance(value, date):
-            value = value.strftime(GLOBAL_CONFIG.DATE_FORMAT)
-        elif isinstance(value, time):
-            value = value.strftime(GLOBAL_CONFIG.TIME_FORMAT)
-        elif isinstance(value, bytes):
-            value = value.decode("utf-8")
-        elif isinstance(value, timedelta):
-            value = str(value)
-        return value
+    async def to_dicts(
+            cls,
+            instances: List["ScaffoldModel"],
+            include_fields: Optional[Union[List[str], Set[str]]] = None,
+            exclude_fields: Optional[Union[List[str], Set[str]]] = None,
+            replace_fields: Optional[Dict[str, str]] = None,
+            m2m: bool = False,
+            m2m_include_fields: Optional[Union[List[str], Set[str]]] = None,
+            m2m_exclude_fields: Optional[Union[List[str], Set[str]]] = None,
+            fk: bool = False,
+            fk_include_fields: Optional[Union[List[str], Set[str]]] = None,
+            fk_exclude_fields: Optional[Union[List[str], Set[str]]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        批量将同一模型的实例列表转换为字典列表，参数含义与 to_dict 一致。
+
+        与逐个 await to_dict 相比：
+        - 序列化计划（见 serializer_plan）整批只取一次，字段值在同步循环中格式化；
+        - 外键/多对多关系按关系字段各执行一次 IN 查询批量加载整页关联对象，而非每行一次查询。
+
+        使用示例：
+            total, instances = await user_crud.list(page=1, page_size=10)
+            data = await User.to_dicts(instances, exclude_fields=["password"])
+
+        :param instances: 模型实例列表（须为当前模型的实例）
+        :return: 与 instances 顺序一致的字典列表
+        """
+        instances = list(instances)
+        if not instances:
+            return []
+
+        exclude_fields = exclude_fields or []
+        plan = cls.serializer_plan(include_fields, exclude_fields, replace_fields)
+        rows: List[Dict[str, Any]] = []
+        for instance in instances:
+            row = {}
+            for field, key, formatter in plan:
+                value = getattr(instance, field)
+                row[key] = formatter(value) if formatter is not None else value
+            rows.append(row)
+
+        relations: List[Tuple[str, bool]] = []
+        if fk:
+            relations.extend((field, False) for field in cls._meta.fk_fields if field not in exclude_fields)
+        if m2m:
+            relations.extend((field, True) for field in cls._meta.m2m_fields if field not in exclude_fields)
+        if not relations:
+            return rows
+
+        # 每个关系字段一次 IN 查询，批量加载整页的关联对象
+        await cls.fetch_for_list(instances, *(field for field, _ in relations))
+        for field, many in relations:
+            related_model = cls._meta.fields_map[field].related_model
+            if many:
+                related_groups = [list(getattr(instance, field).related_objects) for instance in instances]
+                related_objs = [obj for group in related_groups for obj in group]
+                related_rows = iter(await related_model.to_dicts(
+                    related_objs, include_fields=m2m_include_fields, exclude_fields=m2m_exclude_fields
+                ))
+                for row, group in zip(rows, related_groups):
+                    row[field] = [next(related_rows) for _ in group]
+            else:
+                related_objs = [getattr(instance, field) for instance in instances]
+                related_rows = iter(await related_model.to_dicts(
+                    [obj for obj in related_objs if obj is not None],
+                    include_fields=fk_include_fields,
+                    exclude_fields=fk_exclude_fields,
+                ))
+                for row, obj in zip(rows, related_objs):
+                    row[field] = next(related_rows) if obj is not None else None
+        return rows
 
     async def __fetch_fk_field(self, field, fk_include_fields, fk_exclude_fields, cache):
         """
@@ -271,6 +427,412 @@ class ReserveFields:
     reserve_3 = fields.CharField(max_length=255, default=None, null=True, description="备用字段3")
 
 
+def _keyset_order(model: Type[Model], order: Optional[List[str]]) -> List[Tuple[str, bool]]:
+    """
+    解析游标分页的排序字段，返回 [(字段名, 是否倒序), ...]。
+
+    排序字段须为本表数据库字段；末尾自动追加主键 id（方向与首个排序字段一致）作为唯一性兜底。
+    """
+    keys: List[Tuple[str, bool]] = []
+    for item in order or []:
+        desc = item.startswith("-")
+        field = item.lstrip("-+")
+        if field not in model._meta.fields_db_projection:
+            raise ParameterException(message=f"游标分页仅支持按本表字段排序, 不支持: {item}")
+        keys.append((field, desc))
+        if field == model._meta.pk_attr:
+            # 主键之后的排序字段不影响结果
+            return keys
+    keys.append((model._meta.pk_attr, keys[0][1] if keys else False))
+    return keys
+
+
+def encode_cursor(keys: List[Tuple[str, bool]], instance: Model) -> str:
+    """将最后一条记录的排序键编码为不透明游标（base64url(orjson)）。"""
+    payload = {
+        "o": [f"-{field}" if desc else field for field, desc in keys],
+        "v": [getattr(instance, field) for field, _ in keys],
+    }
+    raw: bytes = orjson.dumps(payload, default=str)
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def decode_cursor(model: Type[Model], keys: List[Tuple[str, bool]], cursor: str) -> List[Any]:
+    """解码游标并按字段类型还原排序键的值；游标与当前排序条件不一致时抛出参数异常。"""
+    try:
+        payload = orjson.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        order, values = payload["o"], payload["v"]
+    except Exception:
+        raise ParameterException(message="游标分页失败, 参数(after)无效")
+    if order != [f"-{field}" if desc else field for field, desc in keys] or len(values) != len(keys):
+        raise ParameterException(message="游标分页失败, 游标与当前排序条件不一致")
+    fields_map = model._meta.fields_map
+    return [
+        fields_map[field].to_python_value(value) if value is not None else None
+        for (field, _), value in zip(keys, values)
+    ]
+
+
+def _keyset_condition(model: Type[Model], keys: List[Tuple[str, bool]], values: List[Any]) -> Q:
+    """
+    构造“严格位于游标之后”的条件：
+    (k1 > v1) OR (k1 = v1 AND k2 > v2) OR ...（倒序字段取 <）。
+    NULL 按 MySQL 规则处理：升序时排在最前，倒序时排在最后。
+    """
+    fields_map = model._meta.fields_map
+    condition: Optional[Q] = None
+    equals = Q()
+    for (field, desc), value in zip(keys, values):
+        if value is None:
+            after = None if desc else Q(**{f"{field}__isnull": False})
+            equal = Q(**{f"{field}__isnull": True})
+        else:
+            after = Q(**{f"{field}__lt" if desc else f"{field}__gt": value})
+            if desc and fields_map[field].null:
+                after |= Q(**{f"{field}__isnull": True})
+            equal = Q(**{field: value})
+        if after is not None:
+            term = equals & after
+            condition = term if condition is None else condition | term
+        equals &= equal
+    # 所有键均为 NULL 且倒序时，游标之后不存在记录
+    return condition if condition is not None else Q(**{f"{model._meta.pk_attr}__isnull": True})
+
+
+async def keyset_paginate(
+        query: QuerySet,
+        page_size: int,
+        order: Optional[List[str]] = None,
+        after: Optional[str] = None,
+) -> Tuple[List[Model], Optional[str]]:
+    """
+    对已带过滤条件的查询执行游标分页：按 (排序字段..., id) 定位上一页末尾，
+    使用 WHERE 条件代替 OFFSET，任意页的代价与第一页相同。
+
+    :param query: 已应用过滤条件（未排序、未分页）的 QuerySet
+    :param page_size: 每页数量
+    :param order: 排序字段列表，如 ["-created_time"]
+    :param after: 上一页返回的 next_cursor，为空时返回第一页
+    :return: (当前页记录列表, 下一页游标；没有下一页时为 None)
+    """
+    model = query.model
+    keys = _keyset_order(model, order)
+    if after:
+        query = query.filter(_keyset_condition(model, keys, decode_cursor(model, keys, after)))
+    ordering = [f"-{field}" if desc else field for field, desc in keys]
+    # 多取一条用于判断是否存在下一页
+    items = await query.order_by(*ordering).limit(page_size + 1)
+    if len(items) <= page_size:
+        return list(items), None
+    items = list(items[:page_size])
+    return items, encode_cursor(keys, items[-1])
+
+
+async def iter_keyset_chunks(
+        query: QuerySet,
+        chunk_size: int = 1000,
+        order: Optional[List[str]] = None,
+        fields: Optional[List[str]] = None,
+) -> AsyncIterator[List[Any]]:
+    """
+    按游标分批遍历已带过滤条件的查询，每批一次查询，内存占用与 chunk_size 成正比而与结果集大小无关。
+
+    :param query: 已应用过滤条件（未排序、未分页）的 QuerySet
+    :param chunk_size: 每批记录数
+    :param order: 排序字段列表（仅支持本表字段），末尾自动追加 id
+    :param fields: 为空时逐批返回模型实例；指定时逐批返回由这些字段值组成的元组
+    :return: 异步生成器，每次产出一批记录（列表）
+    """
+    model = query.model
+    keys = _keyset_order(model, order)
+    ordering = [f"-{field}" if desc else field for field, desc in keys]
+    key_fields = [field for field, _ in keys]
+    chunk_size = max(1, chunk_size)
+    if fields:
+        # 查询列 = 请求字段 + 未包含在其中的游标字段
+        columns = list(fields) + [field for field in key_fields if field not in fields]
+        key_positions = [columns.index(field) for field in key_fields]
+        width = len(fields)
+
+    values: Optional[List[Any]] = None
+    while True:
+        chunk_query = query if values is None else query.filter(_keyset_condition(model, keys, values))
+        chunk_query = chunk_query.order_by(*ordering).limit(chunk_size)
+        if fields:
+            rows = await chunk_query.values_list(*columns)
+            if not rows:
+                return
+            yield [tuple(row[:width]) for row in rows]
+            values = [rows[-1][position] for position in key_positions]
+        else:
+            rows = await chunk_query
+            if not rows:
+                return
+            yield list(rows)
+            values = [getattr(rows[-1], field) for field in key_fields]
+        if len(rows) < chunk_size:
+            return
+
+
+def query_fingerprint(query: AwaitableQuery) -> str:
+    """
+    查询的缓存键：参数化 SQL + 参数列表。
+
+    不使用 sql(params_inline=True)：Tortoise 不会内联子查询（Subquery）中的参数，
+    仅子查询参数不同的两个查询会得到相同的 SQL 文本。
+    """
+    query._choose_db_if_not_chosen()
+    query._make_query()
+    sql, params = query.query.get_parameterized_sql()
+    return f"{sql}|{params!r}"
+
+
+class _CountCache:
+    """按过滤条件 SQL 缓存总数的短期缓存（LRU + TTL，每个 worker 进程一个实例）。"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max(1, max_size)
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[int, float]]" = OrderedDict()
+
+    def get(self, key: Tuple[str, str]) -> Optional[int]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at <= monotonic():
+            self._entries.pop(key, None)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: Tuple[str, str], value: int, ttl: float) -> None:
+        self._entries[key] = (value, monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+_COUNT_CACHE = _CountCache(max_size=PROJECT_CONFIG.QUERY_COUNT_CACHE_MAX_SIZE)
+
+
+def _find_plan_rows(node: Any) -> Optional[float]:
+    """从执行计划（MySQL/PostgreSQL 的 JSON 格式）中查找首个表的预估行数。"""
+    if isinstance(node, dict):
+        if "rows_examined_per_scan" in node:
+            # MySQL: 预估扫描行数 * 过滤比例
+            return float(node["rows_examined_per_scan"]) * float(node.get("filtered") or 100) / 100
+        if "Plan Rows" in node:
+            return float(node["Plan Rows"])
+        children = node.values()
+    elif isinstance(node, list):
+        children = node
+    else:
+        return None
+    for child in children:
+        rows = _find_plan_rows(child)
+        if rows is not None:
+            return rows
+    return None
+
+
+async def _estimate_count(query: QuerySet) -> int:
+    """按执行计划估算总数；数据库不提供预估行数时（如 SQLite）退化为精确统计。"""
+    try:
+        plan = await query.explain()
+        if isinstance(plan, list) and plan and isinstance(plan[0], dict):
+            # MySQL: [{"EXPLAIN": "<json>"}]
+            plan = [orjson.loads(value) if isinstance(value, (str, bytes)) else value for value in plan[0].values()]
+        rows = _find_plan_rows(plan)
+    except Exception as e:
+        LOGGER.warning(f"执行计划估算总数失败, 改为精确统计, 异常描述: {e}")
+        rows = None
+    if rows is None:
+        return await query.count()
+    return int(rows)
+
+
+async def count_query(
+        query: QuerySet,
+        count_mode: Union[CountMode, str] = CountMode.EXACT,
+        count_cap: Optional[int] = None,
+        cache_ttl: Optional[float] = None,
+) -> Optional[int]:
+    """
+    按指定方式统计已带过滤条件的查询的总数。
+
+    :param query: 已应用过滤条件（未排序、未分页）的 QuerySet
+    :param count_mode: 统计方式，见 CountMode
+    :param count_cap: 封顶统计的上限，默认为 QUERY_COUNT_CAP
+    :param cache_ttl: 按过滤条件缓存总数的秒数，为空或 0 时不缓存
+    :return: 总数；count_mode=none 时返回 None，capped 时返回值最大为 count_cap + 1
+    """
+    count_mode = CountMode(count_mode)
+    if count_mode == CountMode.NONE:
+        return None
+
+    count_cap = count_cap or PROJECT_CONFIG.QUERY_COUNT_CAP
+    cache_key: Optional[Tuple[str, str]] = None
+    if cache_ttl:
+        cache_key = (f"{count_mode.value}:{count_cap}", query_fingerprint(query))
+        cached = _COUNT_CACHE.get(cache_key)
+        if cached is not None:
+            return cached
+
+    if count_mode == CountMode.ESTIMATE:
+        total = await _estimate_count(query)
+    elif count_mode == CountMode.CAPPED:
+        # 仅读取主键，最多 count_cap + 1 行，代价与 count_cap 成正比而与表大小无关
+        total = len(await query.limit(count_cap + 1).values_list(query.model._meta.pk_attr, flat=True))
+    else:
+        total = await query.count()
+
+    if cache_key is not None:
+        _COUNT_CACHE.set(cache_key, total, cache_ttl)
+    return total
+
+
+class TruncTime(Function):
+    """
+    按粒度截断日期时间字段，结果为字符串（hour: "2026-06-20 13:00:00"，day: "2026-06-20"，month: "2026-06"），
+    用于按时间桶分组统计：
+        await crud.group_by("bucket", annotations={"bucket": TruncTime("created_time", "hour")}, count=Count("id"))
+    """
+
+    # 粒度 -> {数据库方言: 格式}
+    FORMATS: Dict[str, Dict[str, str]] = {
+        "hour": {"mysql": "%Y-%m-%d %H:00:00", "sqlite": "%Y-%m-%d %H:00:00", "postgres": "YYYY-MM-DD HH24:00:00"},
+        "day": {"mysql": "%Y-%m-%d", "sqlite": "%Y-%m-%d", "postgres": "YYYY-MM-DD"},
+        "month": {"mysql": "%Y-%m", "sqlite": "%Y-%m", "postgres": "YYYY-MM"},
+    }
+
+    def __init__(self, field: str, precision: str = "hour"):
+        if precision not in self.FORMATS:
+            raise ParameterException(message=f"不支持的时间粒度: {precision}, 可选: {list(self.FORMATS)}")
+        super().__init__(field, precision)
+
+    def _get_function_field(self, field: Term, precision: str) -> PypikaFunction:
+        # 读写分离的副本与主库为同一种数据库，按主库方言生成函数
+        dialect = connections.get(PRIMARY_CONNECTION).capabilities.dialect
+        formats = self.FORMATS[precision]
+        if dialect == "sqlite":
+            return PypikaFunction("STRFTIME", formats["sqlite"], field)
+        if dialect == "postgres":
+            return PypikaFunction("TO_CHAR", field, formats["postgres"])
+        return PypikaFunction("DATE_FORMAT", field, formats["mysql"])
+
+
+class PrefixMatch(Q):
+    """
+    前缀匹配条件 field LIKE 'x%'（值中的 \\、%、_ 已转义），可与其他 Q 组合：
+        Model.filter(PrefixMatch("request_router", "/base/") & Q(user_id=1))
+
+    Tortoise 的 field__startswith 在 MySQL 上生成 CAST(field AS CHAR) LIKE ...，列套函数后无法使用索引，
+    此处直接比较列，可使用字段上的 B-Tree 索引（大小写是否敏感取决于字段排序规则）。
+    """
+
+    __slots__ = ("field", "value")
+
+    def __init__(self, field: str, value: Any):
+        super().__init__()
+        self.field = field
+        self.value = str(value)
+
+    def __invert__(self) -> "PrefixMatch":
+        q = PrefixMatch(self.field, self.value)
+        q._is_negated = not self._is_negated
+        return q
+
+    def __eq__(self, other: object) -> bool:
+        return (
+            isinstance(other, PrefixMatch)
+            and (self.field, self.value, self._is_negated) == (other.field, other.value, other._is_negated)
+        )
+
+    def resolve(self, resolve_context: ResolveContext) -> QueryModifier:
+        column = resolve_context.table[resolve_context.model._meta.fields_db_projection[self.field]]
+        pattern = ValueWrapper(f"{escape_like(self.value)}%")
+        # MySQL 的 LIKE 默认转义符即为反斜杠（字符串中的反斜杠需双写），不输出 ESCAPE 子句
+        dialect = connections.get(PRIMARY_CONNECTION).capabilities.dialect
+        criterion = Like(column, pattern, escape="") if dialect == "mysql" else Like(column, pattern)
+        modifier = QueryModifier(where_criterion=criterion)
+        return ~modifier if self._is_negated else modifier
+
+
+def match_q(
+        field: str,
+        value: Any,
+        mode: Union[MatchMode, str] = MatchMode.CONTAINS,
+        choices: Optional[Type[Enum]] = None,
+) -> Q:
+    """
+    按匹配方式构造文本字段条件。
+
+    contains 生成 UPPER(field) LIKE '%X%'，无法使用索引；prefix 生成 field LIKE 'x%'、exact 生成 field = 'x'，
+    均可使用字段上的 B-Tree 索引（大小写是否敏感取决于字段排序规则，MySQL 默认 *_ci 不区分）。
+
+    :param choices: 枚举字段（CharEnumField）的枚举类型；exact 时按枚举值（不区分大小写）转换为枚举成员，
+                    不是合法枚举值时抛出 ParameterException
+    """
+    mode = MatchMode(mode)
+    if isinstance(value, Enum):
+        value = value.value
+    if mode == MatchMode.EXACT:
+        if choices is not None:
+            members = {str(member.value).lower(): member for member in choices}
+            if str(value).lower() not in members:
+                raise ParameterException(message=f"{field} 不支持的值: {value}, 可选: {[member.value for member in choices]}")
+            value = members[str(value).lower()]
+        return Q(**{field: value})
+    if mode == MatchMode.PREFIX:
+        return PrefixMatch(field, value)
+    return Q(**{f"{field}__icontains": value})
+
+
+async def percentile_query(
+        query: QuerySet,
+        field: str,
+        percentiles: Sequence[float] = (0.5, 0.95),
+        total: Optional[int] = None,
+        semaphore: Optional[asyncio.Semaphore] = None,
+) -> Dict[str, Any]:
+    """
+    计算已带过滤条件的查询在某字段（或 annotate 别名）上的分位数（最近秩法）。
+
+    每个分位数一条 ORDER BY field LIMIT 1 OFFSET k 查询，只传输一个值，不把整列取回应用层；
+    field 上有索引（或过滤后行数不大）时代价较低。
+
+    field 为 NULL 的行不参与计算（NULL 排序在最前，会使秩偏移），在此统一排除。
+
+    :param query: 已应用过滤条件的 QuerySet
+    :param field: 排序取值的字段名或 annotate 别名
+    :param percentiles: 分位点（0~1）
+    :param total: 已知的 field 非空行数（如同一过滤条件下的 COUNT(field)），为空时按排除空值后的查询执行一次 count
+    :param semaphore: 限制同时执行的分位值查询数（多组分位数共用一个信号量），为空时各分位数并发执行
+    :return: {"p50": 值, "p95": 值}，没有数据时值为 None
+    """
+    for percentile in percentiles:
+        if not 0 < percentile <= 1:
+            raise ParameterException(message=f"分位点必须在 (0, 1] 区间内: {percentile}")
+    query = query.filter(**{f"{field}__isnull": False})
+    if total is None:
+        total = await query.count()
+
+    async def load(percentile: float) -> Any:
+        if not total:
+            return None
+        # 最近秩：第 ceil(p * n) 个值（round 消除 0.95 * 20 一类的浮点误差）
+        offset = max(0, math.ceil(round(percentile * total, 6)) - 1)
+        if semaphore is None:
+            rows = await query.order_by(field).offset(offset).limit(1).values_list(field, flat=True)
+        else:
+            async with semaphore:
+                rows = await query.order_by(field).offset(offset).limit(1).values_list(field, flat=True)
+        return rows[0] if rows else None
+
+    values = await asyncio.gather(*(load(percentile) for percentile in percentiles))
+    return {f"p{percentile * 100:g}": value for percentile, value in zip(percentiles, values)}
+
+
 # 类型变量定义，用于泛型约束
 # ModelType: 限定为 Tortoise ORM 的 Model 子类
 ModelType = TypeVar("ModelType", bound=Model)
@@ -296,15 +858,51 @@ class ScaffoldCrud(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         class UserCrud(ScaffoldCrud[User, UserCreate, UserUpdate]):
             def __init__(self):
                 super().__init__(model=User)
+
+        # 开启查询缓存：读方法结果缓存 30 秒，本模型的写方法提交后自动失效
+        class CategoryCrud(ScaffoldCrud[Category, CategoryCreate, CategoryUpdate]):
+            def __init__(self):
+                super().__init__(model=Category, cache_ttl=30)
     """
 
-    def __init__(self, model: Type[ModelType]):
+    def __init__(self, model: Type[ModelType], cache_ttl: Optional[float] = None):
         """
         初始化 CRUD 实例。
 
         :param model: 数据库模型类，必须是 ScaffoldModel 的子类
+        :param cache_ttl: 查询结果缓存有效期（秒），为空或 0 时不缓存；
+                          开启后 list/list_keyset/count/exists/aggregate/group_by 的结果按查询 SQL 缓存
         """
         self.model = model
+        self.cache_ttl = cache_ttl
+
+    async def _cached_read(
+            self,
+            loader: Callable[[], Awaitable[Any]],
+            *key_parts: Any,
+            ttl: Optional[float] = None,
+    ) -> Any:
+        """按缓存键读取查询缓存，未开启缓存时直接执行 loader；key_parts 中的查询对象以其 SQL 作为键。"""
+        if not self.cache_ttl:
+            return await loader()
+        key_parts = tuple(
+            query_fingerprint(part) if isinstance(part, AwaitableQuery) else part
+            for part in key_parts
+        )
+        return await QUERY_CACHE.get_or_load(self.model._meta.db_table, key_parts, loader, ttl or self.cache_ttl)
+
+    async def _invalidate_cache(self) -> None:
+        """失效本模型的查询缓存（写操作提交后调用）。"""
+        if self.cache_ttl:
+            await QUERY_CACHE.invalidate(self.model._meta.db_table)
+
+    def _read_query(self, *args: Q, **kwargs) -> QuerySet:
+        """只读查询：按读写分离策略选择连接（只读副本或主库）。"""
+        return self.model.filter(*args, **kwargs).using_db(DB_ROUTER.db_for_read())
+
+    async def _get_for_write(self, id: int, **kwargs) -> ModelType:
+        """读取待修改的记录，始终走主库。"""
+        return await self.model.get(id=id, **kwargs)
 
     async def get_or_error(self, id: int, **kwargs) -> ModelType:
         """
@@ -315,7 +913,7 @@ class ScaffoldCrud(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         :return: 数据库模型实例
         :raises DoesNotExist: 对象不存在时抛出
         """
-        return await self.model.get(id=id, **kwargs)
+        return await self._read_query(id=id, **kwargs).get()
 
     async def get_or_none(self, id: int, **kwargs) -> Optional[ModelType]:
         """
@@ -325,7 +923,7 @@ class ScaffoldCrud(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         :param kwargs: 额外的过滤条件
         :return: 数据库模型实例或 None
         """
-        return await self.model.filter(id=id, **kwargs).first()
+        return await self._read_query(id=id, **kwargs).first()
 
     async def get_by_conditions(
             self,
@@ -344,7 +942,7 @@ class ScaffoldCrud(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         :raises NotFoundException: 未找到记录且 on_error=True 时抛出
         """
         try:
-            stmt: QuerySet = self.model.filter(**kwargs)
+            stmt: QuerySet = self._read_query(**kwargs)
             instances = await (stmt.first() if only_one else stmt.all())
         except (FieldError, Exception) as e:
             error_message: str = f"根据条件[{kwargs}]查询数据异常: {e}"
@@ -363,8 +961,12 @@ class ScaffoldCrud(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
             page_size: int,
             search: Q = Q(),
             order: Optional[list] = None,
-            related: Optional[list] = None
-    ) -> Tuple[int, List[ModelType]]:
+            related: Optional[list] = None,
+            count_mode: Union[CountMode, str] = CountMode.EXACT,
+            count_cap: Optional[int] = None,
+            count_cache_ttl: Optional[float] = None,
+            concurrent_count: bool = False,
+    ) -> Tuple[Optional[int], List[ModelType]]:
         """
         分页查询记录列表。
 
@@ -373,16 +975,81 @@ class ScaffoldCrud(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         :param search: 搜索条件，使用 Q 对象组合复杂查询
         :param order: 排序字段列表，如 ["-created_time"] 表示按创建时间倒序
         :param related: 预加载的关联字段列表
-        :return: (总记录数, 当前页记录列表)
+        :param count_mode: 总数统计方式：exact（默认）| none | estimate | capped，见 CountMode
+        :param count_cap: capped 模式的统计上限，默认为 QUERY_COUNT_CAP
+        :param count_cache_ttl: 按过滤条件缓存总数的秒数，为空或 0 时不缓存
+        :param concurrent_count: 是否与分页查询并发执行总数统计（各占用一个连接）
+        :return: (总记录数, 当前页记录列表)；count_mode=none 时总记录数为 None
         """
         order: list = order or []
         related: list = related or []
-        query = self.model.filter(search)
-        return (
-            await query.count(),
-            await query.offset((page - 1) * page_size).limit(page_size).order_by(*order).prefetch_related(*related)
+        query = self._read_query(search)
+        page_query = query.offset((page - 1) * page_size).limit(page_size).order_by(*order).prefetch_related(*related)
+
+        async def load() -> Tuple[Optional[int], List[ModelType]]:
+            total_task = count_query(query, count_mode=count_mode, count_cap=count_cap, cache_ttl=count_cache_ttl)
+            if concurrent_count:
+                total, items = await asyncio.gather(total_task, page_query)
+                return total, items
+            return await total_task, await page_query
+
+        return await self._cached_read(load, "list", page_query, related, str(count_mode), count_cap)
+
+    async def list_keyset(
+            self,
+            page_size: int,
+            search: Q = Q(),
+            order: Optional[list] = None,
+            after: Optional[str] = None,
+            related: Optional[list] = None
+    ) -> Tuple[List[ModelType], Optional[str]]:
+        """
+        游标分页查询记录列表（不统计总数）。
+
+        使用示例：
+            items, next_cursor = await crud.list_keyset(page_size=20, order=["-created_time"])
+            items, next_cursor = await crud.list_keyset(page_size=20, order=["-created_time"], after=next_cursor)
+
+        :param page_size: 每页记录数
+        :param search: 搜索条件，使用 Q 对象组合复杂查询
+        :param order: 排序字段列表（仅支持本表字段），末尾自动追加 id
+        :param after: 上一页返回的 next_cursor，为空时查询第一页
+        :param related: 预加载的关联字段列表
+        :return: (当前页记录列表, 下一页游标)
+        """
+        query = self._read_query(search)
+        if related:
+            query = query.prefetch_related(*related)
+        return await self._cached_read(
+            lambda: keyset_paginate(query, page_size=page_size, order=order, after=after),
+            "list_keyset", query, page_size, order, after, related,
         )
 
+    async def iter_chunks(
+            self,
+            search: Q = Q(),
+            chunk_size: int = 1000,
+            order: Optional[list] = None,
+            fields: Optional[List[str]] = None,
+    ) -> AsyncIterator[List[Any]]:
+        """
+        按游标分批遍历符合条件的记录（不缓存），用于导出、统计等需要遍历大表的场景。
+
+        使用示例：
+            async for chunk in crud.iter_chunks(Q(state=0), chunk_size=500):
+                for obj in chunk: ...
+            async for rows in crud.iter_chunks(fields=["request_method", "response_code"]):
+                for method, code in rows: ...
+
+        :param search: 搜索条件
+        :param chunk_size: 每批记录数
+        :param order: 排序字段列表（仅支持本表字段），末尾自动追加 id
+        :param fields: 为空时逐批返回模型实例；指定时逐批返回字段值元组
+        :return: 异步生成器，每次产出一批记录（列表）
+        """
+        async for chunk in iter_keyset_chunks(self._read_query(search), chunk_size=chunk_size, order=order, fields=fields):
+            yield chunk
+
     async def create(self, obj_in: Union[CreateSchemaType, Dict]) -> ModelType:
         """
         创建新记录。
@@ -396,29 +1063,129 @@ class ScaffoldCrud(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
             obj_dict = obj_in.model_dump(warnings=False)
         obj = self.model(**obj_dict)
         await obj.save()
+        await self._invalidate_cache()
         return obj
 
-    async def batch_create(self, obj_list: List[Union[CreateSchemaType, Dict]]) -> List[ModelType]:
+    def _unique_fields(self) -> List[str]:
+        """模型上除主键外的唯一字段（非空字段优先，其余按定义顺序）。"""
+        meta = self.model._meta
+        unique_fields = [
+            name for name, field in meta.fields_map.items()
+            if name in meta.db_fields and name != meta.pk_attr and field.unique
+        ]
+        return sorted(unique_fields, key=lambda name: meta.fields_map[name].null)
+
+    async def batch_create(
+            self,
+            obj_list: List[Union[CreateSchemaType, Dict]],
+            chunk_size: Optional[int] = None,
+            on_conflict: Union[ConflictMode, str] = ConflictMode.ERROR,
+            conflict_fields: Optional[List[str]] = None,
+            update_fields: Optional[List[str]] = None,
+            return_ids: bool = True,
+    ) -> List[ModelType]:
         """
         批量创建记录。
 
+        在单个事务内按 chunk_size 分块执行多行 INSERT，N 条记录只需 N/chunk_size 次往返，
+        任一分块失败整批回滚。
+
+        冲突处理（on_conflict）：
+        - error: 唯一键冲突时抛出异常
+        - ignore: 跳过冲突行，保留已存在的记录
+        - update: 冲突行以新值覆盖 update_fields，默认覆盖本次提交的全部字段（冲突字段与主键除外）
+
+        bulk_create 不回填自增主键，return_ids=True 时在同一事务内按唯一字段回查记录：
+        error 模式仅回填主键；ignore/update 模式返回库中最终记录（被忽略的行返回已存在的记录）。
+        模型没有可用的唯一字段时无法回查，返回的对象不含主键。
+
+        使用示例：
+            await crud.batch_create(products, on_conflict="update", conflict_fields=["code"])
+
         :param obj_list: 创建数据列表，每个元素可以是 Pydantic Schema 实例或字典
-        :return: 创建成功的数据库对象列表
+        :param chunk_size: 单条 INSERT 包含的最大行数，默认 PROJECT_CONFIG.QUERY_BULK_CHUNK_SIZE
+        :param on_conflict: 唯一键冲突处理方式，见 ConflictMode
+        :param conflict_fields: 冲突判定（及主键回查）使用的唯一字段，默认取模型第一个唯一字段
+        :param update_fields: update 模式下冲突时覆盖的字段
+        :param return_ids: 是否回查并回填主键
+        :return: 创建成功的数据库对象列表（与 obj_list 顺序一致）
+        :raises ParameterException: 冲突配置不合法时抛出
         """
         if not obj_list:
             return []
 
-        instances = []
+        on_conflict = ConflictMode(on_conflict)
+        chunk_size = max(1, chunk_size or PROJECT_CONFIG.QUERY_BULK_CHUNK_SIZE)
+        meta = self.model._meta
+        unique_fields = self._unique_fields()
+        if conflict_fields:
+            invalid_fields = set(conflict_fields) - set(unique_fields)
+            if invalid_fields:
+                raise ParameterException(message=f"冲突字段必须是唯一字段: {invalid_fields}")
+        else:
+            conflict_fields = unique_fields[:1]
+
+        instances: List[ModelType] = []
+        submitted_fields: Set[str] = set()
         for obj_in in obj_list:
             if isinstance(obj_in, Dict):
                 obj_dict = obj_in
             else:
                 obj_dict = obj_in.model_dump(warnings=False)
-            obj = self.model(**obj_dict)
-            await obj.save()
-            instances.append(obj)
+            submitted_fields.update(obj_dict.keys())
+            instances.append(self.model(**obj_dict))
+
+        bulk_kwargs: Dict[str, Any] = {}
+        if on_conflict == ConflictMode.IGNORE:
+            bulk_kwargs["ignore_conflicts"] = True
+        elif on_conflict == ConflictMode.UPDATE:
+            if not conflict_fields:
+                raise ParameterException(message=f"{self.model.__name__} 没有唯一字段, 无法按冲突更新")
+            if update_fields is None:
+                # 自动更新时间字段（auto_now）随冲突更新一并刷新
+                auto_now_fields = {
+                    name for name in meta.db_fields
+                    if getattr(meta.fields_map[name], "auto_now", False)
+                }
+                update_fields = sorted(
+                    (submitted_fields | auto_now_fields) & set(meta.db_fields)
+                    - set(conflict_fields) - {meta.pk_attr}
+                )
+            if not update_fields:
+                raise ParameterException(message="按冲突更新时 update_fields 不能为空")
+            bulk_kwargs["update_fields"] = update_fields
+            bulk_kwargs["on_conflict"] = conflict_fields
+
+        key_field: Optional[str] = conflict_fields[0] if conflict_fields else None
+        async with DB_ROUTER.transaction() as connection:
+            for offset in range(0, len(instances), chunk_size):
+                await self.model.bulk_create(
+                    instances[offset:offset + chunk_size], using_db=connection, **bulk_kwargs
+                )
+
+            if return_ids and key_field:
+                keys = list({getattr(obj, key_field) for obj in instances} - {None})
+                stored: Dict[Any, ModelType] = {}
+                for offset in range(0, len(keys), chunk_size):
+                    rows = await self.model.filter(
+                        **{f"{key_field}__in": keys[offset:offset + chunk_size]}
+                    ).using_db(connection)
+                    stored.update((getattr(row, key_field), row) for row in rows)
+
+                if on_conflict == ConflictMode.ERROR:
+                    for obj in instances:
+                        row = stored.get(getattr(obj, key_field))
+                        if row is not None:
+                            obj.pk = row.pk
+                            obj._saved_in_db = True
+                else:
+                    instances = [stored.get(getattr(obj, key_field), obj) for obj in instances]
 
-        LOGGER.info(f"批量创建成功: {self.model.__name__}, 数量={len(instances)}")
+        LOGGER.info(
+            f"批量创建成功: {self.model.__name__}, 数量={len(instances)}, "
+            f"分块大小={chunk_size}, 冲突处理={on_conflict.value}"
+        )
+        await self._invalidate_cache()
         return instances
 
     async def update(self, id: int, obj_in: Union[UpdateSchemaType, Dict[str, Any]]) -> ModelType:
@@ -430,7 +1197,7 @@ class ScaffoldCrud(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         :return: 更新后的数据库对象
         :raises DoesNotExist: 记录不存在时抛出
         """
-        obj = await self.get_or_error(id=id)
+        obj = await self._get_for_write(id=id)
         if isinstance(obj_in, Dict):
             obj_dict = obj_in
         else:
@@ -438,39 +1205,67 @@ class ScaffoldCrud(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         obj = obj.update_from_dict(obj_dict)
         await obj.save()
         LOGGER.info(f"更新成功: {self.model.__name__}(id={id}), 字段: {list(obj_dict.keys())}")
+        await self._invalidate_cache()
         return obj
 
     async def batch_update(
             self,
             updates: List[Dict[str, Any]],
             key_field: str = "id",
-            strict: bool = True
-    ) -> int:
+            strict: bool = True,
+            chunk_size: Optional[int] = None,
+            atomic: bool = True,
+    ) -> Dict[str, Any]:
         """
-        批量更新记录。
+        批量更新记录（集合式更新）。
+
+        按更新的字段集合对数据分组，每组按 chunk_size 分块执行一条
+        UPDATE ... SET col = CASE pk WHEN ... END WHERE pk IN (...)；全部分块在同一事务内执行，
+        每个分块在各自的保存点（SAVEPOINT）内执行，分块失败时回滚到保存点并退回逐行更新（每行一个保存点），
+        失败原因记入对应行的结果；其余异常（如连接中断）整批回滚，不会留下部分提交的分块。
+        值中含表达式（如 F("stock") - 1）的行逐行执行 filter(...).update()。
+        同一条件值出现多次时按出现顺序合并，后出现的字段值覆盖先出现的。
 
         :param updates: 更新数据列表，每个元素必须包含 key_field 指定的字段
-        :param key_field: 作为更新条件的字段名，默认为 "id"
-        :param strict: 是否严格校验字段
-        :return: 实际更新的记录数
+        :param key_field: 作为更新条件的字段名，默认为 "id"，需为主键或唯一字段
+        :param strict: 是否严格校验字段，严格模式下包含不存在字段的行整行跳过，否则仅忽略不存在的字段
+        :param chunk_size: 单条 UPDATE 包含的最大行数，默认 PROJECT_CONFIG.QUERY_BULK_CHUNK_SIZE
+        :param atomic: 是否在同一事务内执行；False 时每个分块、每行独立提交（中途失败时已执行的分块不会回滚），
+                       适用于不要求整批一致、希望缩短事务与锁持有时间的超大批量更新
+        :return: {"updated_count": 成功行数, "failed_count": 失败行数,
+                  "results": [{"index": 行下标, key_field: 条件值, "success": bool, "message": str}, ...]}
+        :raises ParameterException: key_field 不是主键或唯一字段时抛出
 
         使用示例：
-            await crud.batch_update([
+            result = await crud.batch_update([
                 {"id": 1, "name": "张三", "age": 20},
                 {"id": 2, "name": "李四", "age": 25},
             ])
+            # 返回: {"updated_count": 2, "failed_count": 0, "results": [{"index": 0, "id": 1, "success": True, "message": ""}, ...]}
         """
+        results: List[Dict[str, Any]] = []
         if not updates:
-            return 0
+            return {"updated_count": 0, "failed_count": 0, "results": results}
 
-        # 获取模型有效字段列表
-        valid_fields = set(self.model._meta.db_fields)
-        valid_fields.update(self.model._meta.fk_fields)
+        meta = self.model._meta
+        if key_field != meta.pk_attr and key_field not in self._unique_fields():
+            raise ParameterException(message=f"批量更新条件字段必须是主键或唯一字段: {key_field}")
+        chunk_size = max(1, chunk_size or PROJECT_CONFIG.QUERY_BULK_CHUNK_SIZE)
 
-        total_updated = 0
-        for update_data in updates:
+        # 获取模型有效字段列表
+        valid_fields = set(meta.db_fields)
+        valid_fields.update(meta.fk_fields)
+        valid_fields.discard(meta.pk_attr)
+
+        # 条件值 -> 合并后的更新字段，及引用该条件值的结果行
+        merged: Dict[Any, Dict[str, Any]] = {}
+        pending_rows: Dict[Any, List[Dict[str, Any]]] = {}
+        for index, update_data in enumerate(updates):
             key_value = update_data.get(key_field)
+            row_result: Dict[str, Any] = {"index": index, key_field: key_value, "success": False, "message": ""}
+            results.append(row_result)
             if not key_value:
+                row_result["message"] = f"缺少{key_field}字段"
                 LOGGER.warning(f"批量更新跳过: 缺少{key_field}字段")
                 continue
 
@@ -481,22 +1276,102 @@ class ScaffoldCrud(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
             invalid_fields = set(update_dict.keys()) - valid_fields
             if invalid_fields:
                 if strict:
-                    LOGGER.error(f"批量更新跳过(id={key_value}): 包含不存在的字段: {invalid_fields}")
+                    row_result["message"] = f"包含不存在的字段: {sorted(invalid_fields)}"
+                    LOGGER.error(f"批量更新跳过({key_field}={key_value}): 包含不存在的字段: {invalid_fields}")
                     continue
                 else:
-                    LOGGER.warning(f"批量更新忽略字段(id={key_value}): {invalid_fields}")
+                    LOGGER.warning(f"批量更新忽略字段({key_field}={key_value}): {invalid_fields}")
                     for field in invalid_fields:
                         update_dict.pop(field, None)
 
             if not update_dict:
+                row_result["message"] = "没有需要更新的字段"
                 continue
 
-            # 执行更新
-            count = await self.model.filter(**{key_field: key_value}).update(**update_dict)
-            total_updated += count
+            # 外键字段统一转换为外键列（xxx_id）
+            for field in set(update_dict) & meta.fk_fields:
+                value = update_dict.pop(field)
+                update_dict[f"{field}_id"] = value.pk if isinstance(value, Model) else value
+
+            merged.setdefault(key_value, {}).update(update_dict)
+            pending_rows.setdefault(key_value, []).append(row_result)
+
+        updated_keys: Set[Any] = set()
+        # 条件值 -> 失败原因（逐行更新失败时记录）
+        errors: Dict[Any, str] = {}
+        if merged:
+            # 事务内每个分块、每行使用保存点；非原子模式下逐条独立执行
+            savepoint = (lambda: in_transaction(DB_ROUTER.primary)) if atomic else nullcontext
+            async with (DB_ROUTER.transaction() if atomic else nullcontext()) as connection:
+                with DB_ROUTER.use_primary():
+                    # 条件值 -> 主键（同时确认记录存在），走主库
+                    keys = list(merged.keys())
+                    key_to_pk: Dict[Any, Any] = {}
+                    for offset in range(0, len(keys), chunk_size):
+                        rows = await self.model.filter(
+                            **{f"{key_field}__in": keys[offset:offset + chunk_size]}
+                        ).using_db(connection).values_list(key_field, meta.pk_attr)
+                        key_to_pk.update(rows)
+
+                # 按字段集合分组；值中含表达式（F()、函数等）或无法转换为字段值的行逐行更新
+                groups: Dict[Tuple[str, ...], List[Tuple[Any, ModelType]]] = {}
+                row_keys: List[Any] = []
+                for key_value, update_dict in merged.items():
+                    if key_value not in key_to_pk:
+                        continue
+                    if any(isinstance(value, (Expression, Term)) for value in update_dict.values()):
+                        row_keys.append(key_value)
+                        continue
+                    try:
+                        obj = self.model(**update_dict)
+                    except Exception:
+                        row_keys.append(key_value)
+                        continue
+                    obj.pk = key_to_pk[key_value]
+                    groups.setdefault(tuple(sorted(update_dict)), []).append((key_value, obj))
+
+                # 每个分块是一条 UPDATE，分块失败时回滚到保存点并退回逐行更新，定位失败的行
+                for columns, items in groups.items():
+                    for offset in range(0, len(items), chunk_size):
+                        chunk = items[offset:offset + chunk_size]
+                        try:
+                            async with savepoint():
+                                await self.model.bulk_update(
+                                    [obj for _, obj in chunk], fields=columns, batch_size=chunk_size, using_db=connection
+                                )
+                            updated_keys.update(key_value for key_value, _ in chunk)
+                        except Exception as e:
+                            LOGGER.warning(f"批量更新分块失败, 退回逐行更新: {self.model.__name__}, 行数={len(chunk)}, 异常描述: {e}")
+                            row_keys.extend(key_value for key_value, _ in chunk)
+
+                for key_value in row_keys:
+                    try:
+                        async with savepoint():
+                            count = await self.model.filter(
+                                **{meta.pk_attr: key_to_pk[key_value]}
+                            ).using_db(connection).update(**merged[key_value])
+                        if count:
+                            updated_keys.add(key_value)
+                    except Exception as e:
+                        errors[key_value] = str(e)
+                        LOGGER.error(f"批量更新失败({key_field}={key_value}): {e}")
+
+        for key_value, row_results in pending_rows.items():
+            for row_result in row_results:
+                if key_value in updated_keys:
+                    row_result["success"] = True
+                else:
+                    row_result["message"] = errors.get(key_value, "记录不存在")
 
-        LOGGER.info(f"批量更新成功: {self.model.__name__}, 数量={total_updated}")
-        return total_updated
+        updated_count = sum(1 for row_result in results if row_result["success"])
+        failed_count = len(results) - updated_count
+        LOGGER.info(
+            f"批量更新成功: {self.model.__name__}, 数量={updated_count}, 失败={failed_count}, "
+            f"记录数={len(updated_keys)}"
+        )
+        if updated_keys:
+            await self._invalidate_cache()
+        return {"updated_count": updated_count, "failed_count": failed_count, "results": results}
 
     async def remove_or_error(self, id: int, **kwargs) -> ModelType:
         """
@@ -507,8 +1382,9 @@ class ScaffoldCrud(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         :return: 被删除的数据库对象
         :raises DoesNotExist: 记录不存在时抛出
         """
-        obj = await self.get_or_error(id=id, **kwargs)
+        obj = await self._get_for_write(id=id, **kwargs)
         await obj.delete()
+        await self._invalidate_cache()
         return obj
 
     async def hard_delete(self, id: int) -> ModelType:
@@ -518,9 +1394,10 @@ class ScaffoldCrud(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         :return: 被删除的数据库对象
         :raises DoesNotExist: 记录不存在时抛出
         """
-        obj = await self.get_or_error(id=id)
+        obj = await self._get_for_write(id=id)
         await obj.delete()
         LOGGER.info(f"硬删除成功: {self.model.__name__}(id={id})")
+        await self._invalidate_cache()
         return obj
 
     async def batch_hard_delete(self, ids: List[int]) -> int:
@@ -535,6 +1412,7 @@ class ScaffoldCrud(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
 
         count = await self.model.filter(id__in=ids).delete()
         LOGGER.info(f"批量硬删除成功: {self.model.__name__}, 数量={count}, ids={ids}")
+        await self._invalidate_cache()
         return count
 
     def query(self) -> 'QueryBuilder[ModelType]':
@@ -564,7 +1442,8 @@ class ScaffoldCrud(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         :param search: 搜索条件
         :return: 记录数量
         """
-        return await self.model.filter(search).count()
+        query = self._read_query(search)
+        return await self._cached_read(query.count, "count", query)
 
     async def exists(self, **kwargs) -> bool:
         """
@@ -573,7 +1452,8 @@ class ScaffoldCrud(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         :param kwargs: 查询条件
         :return: 是否存在
         """
-        return await self.model.filter(**kwargs).exists()
+        query = self._read_query(**kwargs)
+        return await self._cached_read(query.exists, "exists", query)
 
     async def aggregate(
             self,
@@ -599,24 +1479,30 @@ class ScaffoldCrud(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         :return: 聚合结果字典
         """
 
-        query = self.model.filter(search)
-        result = await query.annotate(**aggregations).first()
+        query = self._read_query(search).annotate(**aggregations)
 
-        if result:
-            return {
-                key: getattr(result, key)
-                for key in aggregations.keys()
-            }
-        return {key: None for key in aggregations.keys()}
+        async def load() -> Dict[str, Any]:
+            result = await query.first()
+            if result:
+                return {
+                    key: getattr(result, key)
+                    for key in aggregations.keys()
+                }
+            return {key: None for key in aggregations.keys()}
+
+        return await self._cached_read(load, "aggregate", query)
 
     async def group_by(
             self,
-            field: str,
+            field: Union[str, Sequence[str]],
             search: Q = Q(),
+            order: Optional[list] = None,
+            limit: Optional[int] = None,
+            annotations: Optional[Dict[str, Any]] = None,
             **aggregations
     ) -> List[Dict[str, Any]]:
         """
-        分组统计查询。
+        分组统计查询，分组与聚合均在数据库中完成，只返回分组结果。
 
         使用示例：
             results = await crud.group_by(
@@ -630,16 +1516,34 @@ class ScaffoldCrud(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
             #     {"gender": 2, "count": 45, "avg_age": 24}
             # ]
 
-        :param field: 分组字段
+            # 按表达式分组（annotations 中的别名可作为分组字段），按数量倒序取前 10 组
+            results = await crud.group_by(
+                ["day"],
+                annotations={"day": TruncTime("created_time", "day")},
+                order=["-count"],
+                limit=10,
+                count=Count("id"),
+            )
+
+        :param field: 分组字段，多个字段时传列表
         :param search: 搜索条件
+        :param order: 排序字段（可使用分组字段与聚合别名）
+        :param limit: 最多返回的分组数
+        :param annotations: 分组前计算的表达式（别名: 表达式），其别名可用作分组字段
         :param aggregations: 聚合函数字典
         :return: 分组统计结果列表
         """
-
-        query = self.model.filter(search).group_by(field)
-        results = await query.annotate(**aggregations).values(field, *aggregations.keys())
-
-        return results
+        group_fields = [field] if isinstance(field, str) else list(field)
+        query = self._read_query(search)
+        if annotations:
+            query = query.annotate(**annotations)
+        query = query.group_by(*group_fields).annotate(**aggregations)
+        if order:
+            query = query.order_by(*order)
+        if limit:
+            query = query.limit(limit)
+        query = query.values(*group_fields, *aggregations.keys())
+        return await self._cached_read(lambda: query, "group_by", query)
 
     @staticmethod
     def transactional(func):
@@ -653,18 +1557,55 @@ class ScaffoldCrud(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
                     await self.update(from_id, {"balance": F("balance") - amount})
                     await self.update(to_id, {"balance": F("balance") + amount})
 
+        被装饰的方法属于开启了查询缓存的 CRUD 时，事务提交后失效该模型的缓存。
+
         :param func: 要包装的异步函数
         :return: 包装后的函数
         """
 
+        @functools.wraps(func)
         async def wrapper(*args, **kwargs):
-            async with in_transaction() as connection:
+            async with DB_ROUTER.transaction() as connection:
                 # 将 connection 注入 kwargs，供被装饰函数使用
                 kwargs['_connection'] = connection
-                return await func(*args, **kwargs)
+                result = await func(*args, **kwargs)
+            if args and isinstance(args[0], ScaffoldCrud):
+                await args[0]._invalidate_cache()
+            return result
 
         return wrapper
 
+    @staticmethod
+    def cached(ttl: Optional[float] = None):
+        """
+        查询缓存装饰器，缓存自定义读方法的返回值（CRUD 未开启缓存时不生效）。
+
+        缓存键由方法名与参数的 repr 组成，参数应为字符串、数字等值类型（Q 对象请改为在方法内构造）；
+        该模型的任一写方法提交后缓存失效。返回值需可 pickle 序列化。
+
+        使用示例：
+            class ProductCrud(ScaffoldCrud[Product, ProductCreate, ProductUpdate]):
+                @ScaffoldCrud.cached(ttl=60)
+                async def get_statistics(self, category_id: int) -> Dict[str, Any]:
+                    ...
+
+        :param ttl: 缓存有效期（秒），默认使用 CRUD 的 cache_ttl
+        :return: 装饰器
+        """
+
+        def decorator(func):
+            @functools.wraps(func)
+            async def wrapper(self: "ScaffoldCrud", *args, **kwargs):
+                return await self._cached_read(
+                    lambda: func(self, *args, **kwargs),
+                    func.__qualname__, args, sorted(kwargs.items()),
+                    ttl=ttl,
+                )
+
+            return wrapper
+
+        return decorator
+
     async def create_with_related(
             self,
             obj_in: Union[CreateSchemaType, Dict],
@@ -678,7 +1619,7 @@ class ScaffoldCrud(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         :return: 创建成功的主记录对象
         :raises Exception: 创建失败时回滚事务
         """
-        async with in_transaction() as connection:
+        async with DB_ROUTER.transaction() as connection:
             # 创建主记录
             if isinstance(obj_in, Dict):
                 obj_dict = obj_in
@@ -698,7 +1639,9 @@ class ScaffoldCrud(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
                             await related_manager.create(**item.model_dump(warnings=False), using_db=connection)
 
             LOGGER.info(f"事务创建成功: {self.model.__name__}(id={obj.id})")
-            return obj
+
+        await self._invalidate_cache()
+        return obj
 
     async def update_with_related(
             self,
@@ -715,9 +1658,9 @@ class ScaffoldCrud(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         :return: 更新后的主记录对象
         :raises Exception: 更新失败时回滚事务
         """
-        async with in_transaction() as connection:
+        async with DB_ROUTER.transaction() as connection:
             # 更新主记录
-            obj = await self.get_or_error(id=id)
+            obj = await self._get_for_write(id=id)
             if isinstance(obj_in, Dict):
                 obj_dict = obj_in
             else:
@@ -736,7 +1679,9 @@ class ScaffoldCrud(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
                             await related_manager.filter(id=item_id).update(**item_data, using_db=connection)
 
             LOGGER.info(f"事务更新成功: {self.model.__name__}(id={id})")
-            return obj
+
+        await self._invalidate_cache()
+        return obj
 
     async def soft_delete(self, id: int, updated_user: Optional[str] = None) -> ModelType:
         """
@@ -748,7 +1693,7 @@ class ScaffoldCrud(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         :raises NotFoundException: 记录不存在时抛出
         :raises ParameterException: 模型未继承 StateModel 时抛出
         """
-        obj = await self.get_or_error(id=id)
+        obj = await self._get_for_write(id=id)
         if not hasattr(obj, 'state'):
             error_message: str = f"模型[{self.model.__name__}]未继承 StateModel，无法执行软删除"
             LOGGER.error(error_message)
@@ -762,6 +1707,7 @@ class ScaffoldCrud(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         obj.state = 1
         await obj.save(update_fields=["state", "updated_user"] if hasattr(obj, 'updated_user') else ["state"])
         LOGGER.info(f"软删除成功: {self.model.__name__}(id={id})")
+        await self._invalidate_cache()
         return obj
 
     async def soft_delete_restore(self, id: int, updated_user: Optional[str] = None) -> ModelType:
@@ -774,7 +1720,7 @@ class ScaffoldCrud(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         :raises NotFoundException: 记录不存在时抛出
         :raises ParameterException: 模型未继承 StateModel 时抛出
         """
-        obj = await self.get_or_error(id=id)
+        obj = await self._get_for_write(id=id)
 
         if not hasattr(obj, 'state'):
             error_message: str = f"模型[{self.model.__name__}]未继承 StateModel，无法执行恢复操作"
@@ -788,6 +1734,7 @@ class ScaffoldCrud(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         obj.state = 0
         await obj.save(update_fields=["state", "updated_user"] if hasattr(obj, 'updated_user') else ["state"])
         LOGGER.info(f"恢复软删除成功: {self.model.__name__}(id={id})")
+        await self._invalidate_cache()
         return obj
 
     async def soft_deleted_list(
@@ -839,6 +1786,7 @@ class ScaffoldCrud(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
 
         count = await self.model.filter(id__in=ids, state__not=1).update(**update_fields)
         LOGGER.info(f"批量软删除成功: {self.model.__name__}, 数量={count}, ids={ids}")
+        await self._invalidate_cache()
         return count
 
     async def soft_delete_restore_batch(self, ids: List[int], updated_user: Optional[str] = None) -> int:
@@ -864,6 +1812,7 @@ class ScaffoldCrud(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
 
         count = await self.model.filter(id__in=ids, state=1).update(**update_fields)
         LOGGER.info(f"批量恢复成功: {self.model.__name__}, 数量={count}, ids={ids}")
+        await self._invalidate_cache()
         return count
 
 
@@ -881,6 +1830,9 @@ class QueryBuilder(Generic[ModelType]):
         # 分页
         total, items = await crud.query().filter(is_active=True).paginate(page=1, page_size=20)
 
+        # 游标分页
+        items, next_cursor = await crud.query().order_by("-created_time").paginate_keyset(page_size=20, after=cursor)
+
         # 预加载关联
         results = await crud.query().prefetch("roles", "permissions").all()
 
@@ -953,9 +1905,9 @@ class QueryBuilder(Generic[ModelType]):
         self._prefetch.extend(fields)
         return self
 
-    def _build_query(self) -> QuerySet:
-        """构建最终查询"""
-        query = self.model.filter()
+    def _build_filtered_query(self) -> QuerySet:
+        """构建仅包含过滤/排除条件的查询（用于总数统计），读连接按读写分离策略选择"""
+        query = self.model.filter().using_db(DB_ROUTER.db_for_read())
 
         # 应用过滤条件
         for f in self._filters:
@@ -965,6 +1917,13 @@ class QueryBuilder(Generic[ModelType]):
         for e in self._excludes:
             query = query.exclude(e)
 
+        return query
+
+    def _build_query(self, query: Optional[QuerySet] = None) -> QuerySet:
+        """构建最终查询，可传入已构建的过滤查询复用"""
+        if query is None:
+            query = self._build_filtered_query()
+
         # 应用排序
         if self._order_by:
             query = query.order_by(*self._order_by)
@@ -993,22 +1952,76 @@ class QueryBuilder(Generic[ModelType]):
         """统计数量"""
         return await self._build_query().count()
 
-    async def paginate(self, page: int = 1, page_size: int = 10) -> Tuple[int, List[ModelType]]:
+    async def paginate(
+            self,
+            page: int = 1,
+            page_size: int = 10,
+            count_mode: Union[CountMode, str] = CountMode.EXACT,
+            count_cap: Optional[int] = None,
+            count_cache_ttl: Optional[float] = None,
+            concurrent_count: bool = False,
+    ) -> Tuple[Optional[int], List[ModelType]]:
         """
         分页查询。
 
         :param page: 页码，从 1 开始
         :param page_size: 每页数量
-        :return: (总记录数, 当前页记录列表)
+        :param count_mode: 总数统计方式：exact（默认）| none | estimate | capped，见 CountMode
+        :param count_cap: capped 模式的统计上限，默认为 QUERY_COUNT_CAP
+        :param count_cache_ttl: 按过滤条件缓存总数的秒数，为空或 0 时不缓存
+        :param concurrent_count: 是否与分页查询并发执行总数统计（各占用一个连接）
+        :return: (总记录数, 当前页记录列表)；count_mode=none 时总记录数为 None
         """
-        query = self._build_query()
-        total = await query.count()
-
+        # 过滤条件只构建一次，总数统计与分页查询共用（QuerySet 链式调用返回副本，互不影响）
+        filtered_query = self._build_filtered_query()
         self._offset = (page - 1) * page_size
         self._limit = page_size
-        items = await self._build_query().all()
+        page_query = self._build_query(filtered_query)
+
+        total_task = count_query(filtered_query, count_mode=count_mode, count_cap=count_cap, cache_ttl=count_cache_ttl)
+        if concurrent_count:
+            total, items = await asyncio.gather(total_task, page_query)
+            return total, items
+        return await total_task, await page_query
 
-        return total, items
+    async def paginate_keyset(self, page_size: int = 10, after: Optional[str] = None) -> Tuple[List[ModelType], Optional[str]]:
+        """
+        游标分页查询，按 order_by 设置的排序字段（末尾自动追加 id）定位，不统计总数。
+
+        :param page_size: 每页数量
+        :param after: 上一页返回的 next_cursor，为空时查询第一页
+        :return: (当前页记录列表, 下一页游标)
+        """
+        query = self._build_filtered_query()
+        if self._prefetch:
+            query = query.prefetch_related(*self._prefetch)
+        return await keyset_paginate(query, page_size=page_size, order=self._order_by, after=after)
+
+    async def stream(self, chunk_size: int = 1000, fields: Optional[List[str]] = None) -> AsyncIterator[Any]:
+        """
+        按 order_by 设置的排序字段（末尾自动追加 id）游标分批查询，逐条产出记录，内存占用恒定。
+
+        使用示例：
+            async for obj in crud.query().filter(state=0).order_by("-created_time").stream(chunk_size=500):
+                ...
+
+        :param chunk_size: 每批查询的记录数
+        :param fields: 为空时产出模型实例；指定时产出字段值元组
+        :return: 异步生成器；设置了 limit 时最多产出 limit 条，忽略 offset
+        """
+        query = self._build_filtered_query()
+        if self._prefetch and not fields:
+            query = query.prefetch_related(*self._prefetch)
+        remaining = self._limit
+        if remaining is not None:
+            chunk_size = max(1, min(chunk_size, remaining))
+        async for chunk in iter_keyset_chunks(query, chunk_size=chunk_size, order=self._order_by, fields=fields):
+            for item in chunk:
+                if remaining is not None:
+                    if remaining <= 0:
+                        return
+                    remaining -= 1
+                yield item
 
     async def exists(self) -> bool:
         """检查是否存在"""
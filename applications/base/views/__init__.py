@@ -10,6 +10,7 @@ from fastapi import APIRouter
 
 from .audit_view import audit
 from .auth_view import auth_public, auth_secure
+from .metrics_view import metrics
 from .routes_view import routers
 
 base_public = APIRouter()
@@ -19,5 +20,6 @@ audit_secure = APIRouter()
 
 base_public.include_router(auth_public, prefix="/auth")
 base_secure.include_router(auth_secure, prefix="/auth")
+base_secure.include_router(metrics)
 audit_secure.include_router(audit, prefix="/audit")
 router_secure.include_router(routers, prefix="/routes")
@@ -7,22 +7,35 @@
 @DateTime: 2025/2/22 12:31
 """
 import traceback
+from datetime import datetime
+from typing import Optional
 
 from fastapi import APIRouter, Body, Query, Depends
 from tortoise.expressions import Q
 
 from applications.base.schemas.audit_schema import AuditBatchDelete, AuditSelect
+from applications.base.services.audit_archive import AUDIT_ARCHIVE
 from applications.base.services.audit_crud import AuditCrud
+from applications.base.services.scaffold import match_q
 from applications.base.dependencies import get_audit_crud
 from configure import LOGGER
-from core.exceptions import NotFoundException
+from core.exceptions import NotFoundException, ParameterException
+from core.middlewares.audit_policy import audit_policy
 from core.responses import FailureResponse, SuccessResponse
+from enums import AuditMode, CountMode, HTTPMethod, MatchMode
 from services import DependAuth
 
 audit = APIRouter(dependencies=[DependAuth])
+# 审计数据的只读查询响应体就是审计数据本身，只记录元数据，避免审计表自我膨胀
+_READ_POLICY = audit_policy(AuditMode.METADATA)
 
 
-@audit.get("/list", summary="查看操作日志", description="支持分页按条件查询审计日志列表信息（Query）")
+@audit.get(
+    "/list",
+    summary="查看操作日志",
+    description="支持分页按条件查询审计日志列表信息（Query）",
+    openapi_extra=audit_policy(AuditMode.OFF),
+)
 async def list_audit(
         page: int = Query(default=1, ge=1, description="页码"),
         page_size: int = Query(default=10, ge=10, description="每页数量"),
@@ -34,66 +47,100 @@ async def list_audit(
         response_code: str = Query(default=None, description="响应代码"),
         start_time: str = Query(default=None, description="开始时间"),
         end_time: str = Query(default=None, description="结束时间"),
+        min_elapsed: float = Query(default=None, ge=0, description="最小响应耗时(毫秒)"),
+        keyword: str = Query(default=None, description="关键字（检索请求接口/路由/参数、响应消息/参数，空格分隔多个关键字）"),
+        match_mode: MatchMode = Query(default=MatchMode.CONTAINS, description="文本条件匹配方式: contains | prefix | exact（prefix/exact 可使用索引）"),
+        after: str = Query(default=None, description="游标分页：上一页返回的 next_cursor（首页传空字符串），传入时忽略 page"),
+        count_mode: CountMode = Query(default=CountMode.EXACT, description="总数统计方式: exact | none | estimate | capped"),
         audit_crud: AuditCrud = Depends(get_audit_crud),
 ):
     q = Q()
     if username:
-        q &= Q(username__icontains=username)
+        q &= match_q("username", username, match_mode)
     if request_tags:
-        q &= Q(request_tags__icontains=request_tags)
+        q &= match_q("request_tags", request_tags, match_mode)
     if request_summary:
-        q &= Q(request_summary__icontains=request_summary)
+        q &= match_q("request_summary", request_summary, match_mode)
     if request_method:
-        q &= Q(request_method__icontains=request_method)
+        try:
+            q &= match_q("request_method", request_method, match_mode, choices=HTTPMethod)
+        except ParameterException as e:
+            return FailureResponse(message=e.message)
     if request_router:
-        q &= Q(request_router__icontains=request_router)
+        q &= match_q("request_router", request_router, match_mode)
     if response_code:
-        q &= Q(response_code__icontains=response_code)
+        q &= match_q("response_code", response_code, match_mode)
     if start_time and end_time:
         q &= Q(created_time__range=[start_time, end_time])
     elif start_time:
         q &= Q(created_time__gte=start_time)
     elif end_time:
         q &= Q(created_time__lte=end_time)
+    if min_elapsed is not None:
+        q &= Q(response_elapsed__gte=int(min_elapsed * 1000))
+    if keyword:
+        q &= await audit_crud.keyword_search(keyword)
 
-    total, audit_log_objs = await audit_crud.list_audit(page=page, page_size=page_size, search=q)
-    data = [await audit_log.to_dict() for audit_log in audit_log_objs]
+    if after is not None:
+        try:
+            audit_log_objs, next_cursor = await audit_crud.list_audit_keyset(page_size=page_size, search=q, after=after)
+        except ParameterException as e:
+            return FailureResponse(message=e.message)
+        data = await audit_crud.model.to_dicts(audit_log_objs)
+        return SuccessResponse(data=data, next_cursor=next_cursor)
+
+    total, audit_log_objs = await audit_crud.list_audit(page=page, page_size=page_size, search=q, count_mode=count_mode)
+    data = await audit_crud.model.to_dicts(audit_log_objs)
     return SuccessResponse(data=data, total=total)
 
 
-@audit.post("/search", summary="查询操作日志", description="支持分页按条件查询审计日志列表信息（Body）")
+@audit.post(
+    "/search",
+    summary="查询操作日志",
+    description="支持分页按条件查询审计日志列表信息（Body）",
+    openapi_extra=_READ_POLICY,
+)
 async def search_audit(
         user_in: AuditSelect = Body(),
         audit_crud: AuditCrud = Depends(get_audit_crud),
 ):
     q = Q()
     if user_in.username:
-        q &= Q(username__icontains=user_in.username)
+        q &= match_q("username", user_in.username, user_in.match_mode)
     if user_in.request_tags:
-        q &= Q(request_tags__icontains=user_in.request_tags)
+        q &= match_q("request_tags", user_in.request_tags, user_in.match_mode)
     if user_in.request_summary:
-        q &= Q(request_summary__icontains=user_in.request_summary)
+        q &= match_q("request_summary", user_in.request_summary, user_in.match_mode)
     if user_in.request_method:
-        q &= Q(request_method__icontains=user_in.request_method)
+        q &= match_q("request_method", user_in.request_method, user_in.match_mode, choices=HTTPMethod)
     if user_in.request_router:
-        q &= Q(request_router__icontains=user_in.request_router)
+        q &= match_q("request_router", user_in.request_router, user_in.match_mode)
     if user_in.response_code:
-        q &= Q(response_code__icontains=user_in.response_code)
+        q &= match_q("response_code", user_in.response_code, user_in.match_mode)
     if user_in.start_time and user_in.end_time:
         q &= Q(created_time__range=[user_in.start_time, user_in.end_time])
     elif user_in.start_time:
         q &= Q(created_time__gte=user_in.start_time)
     elif user_in.end_time:
         q &= Q(created_time__lte=user_in.end_time)
+    if user_in.min_elapsed is not None:
+        q &= Q(response_elapsed__gte=int(user_in.min_elapsed * 1000))
+    if user_in.keyword:
+        q &= await audit_crud.keyword_search(user_in.keyword)
 
     total, audit_log_objs = await audit_crud.list_audit(
         page=user_in.page, page_size=user_in.page_size, search=q, order=user_in.order
     )
-    data = [await audit_log.to_dict() for audit_log in audit_log_objs]
+    data = await audit_crud.model.to_dicts(audit_log_objs)
     return SuccessResponse(data=data, total=total)
 
 
-@audit.get("/get", summary="查询单条审计日志", description="根据id查询审计日志信息")
+@audit.get(
+    "/get",
+    summary="查询单条审计日志",
+    description="根据id查询审计日志信息",
+    openapi_extra=_READ_POLICY,
+)
 async def get_audit(
         audit_id: int = Query(..., description="审计日志ID"),
         audit_crud: AuditCrud = Depends(get_audit_crud),
@@ -109,7 +156,12 @@ async def get_audit(
         return FailureResponse(message=f"查询失败，异常描述: {e}")
 
 
-@audit.get("/byUser", summary="查询用户审计日志", description="根据用户ID查询该用户的所有审计日志")
+@audit.get(
+    "/byUser",
+    summary="查询用户审计日志",
+    description="根据用户ID查询该用户的所有审计日志",
+    openapi_extra=_READ_POLICY,
+)
 async def get_audit_by_user(
         user_id: int = Query(..., description="用户ID"),
         page: int = Query(default=1, ge=1, description="页码"),
@@ -119,14 +171,19 @@ async def get_audit_by_user(
     try:
         q = Q(user_id=user_id)
         total, audit_log_objs = await audit_crud.list_audit(page=page, page_size=page_size, search=q)
-        data = [await audit_log.to_dict() for audit_log in audit_log_objs]
+        data = await audit_crud.model.to_dicts(audit_log_objs)
         return SuccessResponse(data=data, total=total)
     except Exception as e:
         LOGGER.error(f"查询用户审计日志失败，异常描述: {e}\n{traceback.format_exc()}")
         return FailureResponse(message=f"查询失败，异常描述: {e}")
 
 
-@audit.get("/recent", summary="查询最近审计日志", description="获取最近的审计日志记录")
+@audit.get(
+    "/recent",
+    summary="查询最近审计日志",
+    description="获取最近的审计日志记录",
+    openapi_extra=_READ_POLICY,
+)
 async def get_recent_audits(
         limit: int = Query(default=10, ge=1, le=100, description="返回数量"),
         user_id: int = Query(default=None, description="用户ID"),
@@ -134,26 +191,169 @@ async def get_recent_audits(
 ):
     try:
         audit_logs = await audit_crud.get_recent_audits(limit=limit, user_id=user_id)
-        data = [await audit_log.to_dict() for audit_log in audit_logs]
+        data = await audit_crud.model.to_dicts(audit_logs)
         return SuccessResponse(data=data, total=len(data))
     except Exception as e:
         LOGGER.error(f"查询最近审计日志失败，异常描述: {e}\n{traceback.format_exc()}")
         return FailureResponse(message=f"查询失败，异常描述: {e}")
 
 
-@audit.get("/statistics", summary="审计日志统计", description="获取指定用户的审计日志统计信息")
+@audit.get(
+    "/statistics",
+    summary="审计日志统计",
+    description="获取审计日志统计信息（请求方式、响应代码、路由、小时、耗时分位数）, 不传用户ID时统计全部用户",
+    openapi_extra=_READ_POLICY,
+)
 async def get_audit_statistics(
-        user_id: int = Query(..., description="用户ID"),
+        user_id: Optional[int] = Query(None, description="用户ID"),
+        hours: int = Query(24, ge=1, le=24 * 31, description="按小时统计最近多少小时"),
+        top_routers: int = Query(20, ge=1, le=200, description="按路由统计时返回请求量最多的前N个路由"),
         audit_crud: AuditCrud = Depends(get_audit_crud),
 ):
     try:
-        data = await audit_crud.get_statistics_by_user(user_id=user_id)
+        if user_id:
+            data = await audit_crud.get_statistics_by_user(user_id=user_id, hours=hours, top_routers=top_routers)
+        else:
+            data = await audit_crud.get_statistics(hours=hours, top_routers=top_routers)
         return SuccessResponse(data=data)
     except Exception as e:
         LOGGER.error(f"统计审计日志失败，异常描述: {e}\n{traceback.format_exc()}")
         return FailureResponse(message=f"统计失败，异常描述: {e}")
 
 
+def _latency_search(
+        user_id: Optional[int],
+        request_router: Optional[str],
+        start_time: Optional[str],
+        end_time: Optional[str],
+) -> Q:
+    """耗时分析接口的公共过滤条件（按请求时间过滤，走 request_time 索引）。"""
+    q = Q()
+    if user_id:
+        q &= Q(user_id=user_id)
+    if request_router:
+        q &= Q(request_router=request_router)
+    if start_time:
+        q &= Q(request_time__gte=start_time)
+    if end_time:
+        q &= Q(request_time__lte=end_time)
+    return q
+
+
+@audit.get(
+    "/latency/percentiles",
+    summary="路由耗时分位数",
+    description="按路由统计响应耗时的 p50/p95/p99（毫秒）, 按请求量倒序",
+    openapi_extra=_READ_POLICY,
+)
+async def get_latency_percentiles(
+        user_id: int = Query(default=None, description="用户ID"),
+        request_router: str = Query(default=None, description="请求路由（精确匹配）"),
+        start_time: str = Query(default=None, description="开始时间"),
+        end_time: str = Query(default=None, description="结束时间"),
+        top_routers: int = Query(default=20, ge=1, le=100, description="返回请求量最多的前N个路由"),
+        audit_crud: AuditCrud = Depends(get_audit_crud),
+):
+    try:
+        q = _latency_search(user_id, request_router, start_time, end_time)
+        data = await audit_crud.latency_percentiles(search=q, top_routers=top_routers)
+        return SuccessResponse(data=data, total=len(data))
+    except Exception as e:
+        LOGGER.error(f"统计路由耗时分位数失败，异常描述: {e}\n{traceback.format_exc()}")
+        return FailureResponse(message=f"统计失败，异常描述: {e}")
+
+
+@audit.get(
+    "/latency/slowest",
+    summary="最慢请求",
+    description="查询响应耗时最长的N条请求",
+    openapi_extra=_READ_POLICY,
+)
+async def get_slowest_requests(
+        user_id: int = Query(default=None, description="用户ID"),
+        request_router: str = Query(default=None, description="请求路由（精确匹配）"),
+        start_time: str = Query(default=None, description="开始时间"),
+        end_time: str = Query(default=None, description="结束时间"),
+        limit: int = Query(default=20, ge=1, le=200, description="返回数量"),
+        audit_crud: AuditCrud = Depends(get_audit_crud),
+):
+    try:
+        q = _latency_search(user_id, request_router, start_time, end_time)
+        data = await audit_crud.slowest(search=q, limit=limit)
+        return SuccessResponse(data=data, total=len(data))
+    except Exception as e:
+        LOGGER.error(f"查询最慢请求失败，异常描述: {e}\n{traceback.format_exc()}")
+        return FailureResponse(message=f"查询失败，异常描述: {e}")
+
+
+@audit.get(
+    "/latency/histogram",
+    summary="耗时分布直方图",
+    description="按时间桶统计请求量与响应耗时分布（累计直方图）",
+    openapi_extra=_READ_POLICY,
+)
+async def get_latency_histogram(
+        user_id: int = Query(default=None, description="用户ID"),
+        request_router: str = Query(default=None, description="请求路由（精确匹配）"),
+        start_time: str = Query(default=None, description="开始时间"),
+        end_time: str = Query(default=None, description="结束时间"),
+        precision: str = Query(default="hour", pattern="^(hour|day|month)$", description="时间桶粒度: hour | day | month"),
+        audit_crud: AuditCrud = Depends(get_audit_crud),
+):
+    try:
+        q = _latency_search(user_id, request_router, start_time, end_time)
+        data = await audit_crud.latency_histogram(search=q, precision=precision)
+        return SuccessResponse(data=data, total=len(data))
+    except Exception as e:
+        LOGGER.error(f"统计耗时分布失败，异常描述: {e}\n{traceback.format_exc()}")
+        return FailureResponse(message=f"统计失败，异常描述: {e}")
+
+
+@audit.get(
+    "/history",
+    summary="查询历史审计日志",
+    description="按时间范围查询审计日志, 包括已冷归档到文件的数据（按创建时间倒序）",
+    openapi_extra=_READ_POLICY,
+)
+async def get_audit_history(
+        start_time: str = Query(..., description="开始时间"),
+        end_time: str = Query(..., description="结束时间"),
+        user_id: int = Query(default=None, description="用户ID"),
+        request_router: str = Query(default=None, description="请求路由（精确匹配）"),
+        response_code: str = Query(default=None, description="响应代码"),
+        limit: int = Query(default=100, ge=1, le=1000, description="返回数量"),
+        audit_crud: AuditCrud = Depends(get_audit_crud),
+):
+    try:
+        start, end = datetime.fromisoformat(start_time), datetime.fromisoformat(end_time)
+    except ValueError as e:
+        return FailureResponse(message=f"时间格式错误: {e}")
+    filters = {"user_id": user_id, "request_router": request_router, "response_code": response_code}
+    try:
+        data = await audit_crud.search_history(
+            start_time=start,
+            end_time=end,
+            filters={key: value for key, value in filters.items() if value is not None},
+            limit=limit,
+        )
+        return SuccessResponse(data=data, total=len(data))
+    except Exception as e:
+        LOGGER.error(f"查询历史审计日志失败，异常描述: {e}\n{traceback.format_exc()}")
+        return FailureResponse(message=f"查询失败，异常描述: {e}")
+
+
+@audit.post("/archive", summary="归档审计日志", description="立即执行一次冷归档（需配置 AUDIT_ARCHIVE_AFTER_DAYS）")
+async def archive_audits():
+    if not AUDIT_ARCHIVE.enabled:
+        return FailureResponse(message="未启用审计日志归档, 请配置 AUDIT_ARCHIVE_AFTER_DAYS")
+    try:
+        count = await AUDIT_ARCHIVE.archive()
+        return SuccessResponse(message="归档成功", data={"affected": count, **AUDIT_ARCHIVE.stats()})
+    except Exception as e:
+        LOGGER.error(f"归档审计日志失败，异常描述: {e}\n{traceback.format_exc()}")
+        return FailureResponse(message=f"归档失败，异常描述: {e}")
+
+
 @audit.delete("/delete", summary="删除审计日志", description="根据id删除单条审计日志")
 async def delete_audit(
         audit_id: int = Query(..., description="审计日志ID"),
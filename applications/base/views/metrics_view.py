@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+@Author  : yangkai
+@Email   : 807440781@qq.com
+@Project : Krun
+@Module  : metrics_view.py
+@DateTime: 2026/6/18
+"""
+import os
+
+from fastapi import APIRouter
+
+from applications.base.services.audit_archive import AUDIT_ARCHIVE
+from applications.base.services.audit_partition import AUDIT_PARTITIONS
+from applications.base.services.audit_search import AUDIT_SEARCH
+from applications.base.services.audit_writer import AUDIT_WRITER
+from applications.base.services.db_router import DB_ROUTER
+from applications.base.services.pool_monitor import POOL_MONITOR
+from applications.base.services.query_cache import QUERY_CACHE
+from configure import PROJECT_CONFIG
+from core.middlewares.audit_policy import AUDIT_POLICY, audit_policy
+from core.responses.http_response import SuccessResponse
+from enums import AuditMode
+from services import PASSWORD_HASHER, TOKEN_VERSION_CACHE
+
+metrics = APIRouter()
+
+
+@metrics.get(
+    "/metrics",
+    summary="查询运行指标",
+    description="查询当前 worker 进程的连接池、读写分离、缓存与后台任务指标",
+    openapi_extra=audit_policy(AuditMode.OFF),
+)
+async def get_metrics():
+    # 指标均为进程内数据，多 worker 部署时每次请求仅反映处理该请求的 worker
+    data = {
+        "worker_pid": os.getpid(),
+        "workers": PROJECT_CONFIG.SERVER_WORKERS,
+        "database_pools": POOL_MONITOR.stats(),
+        "database_router": DB_ROUTER.stats(),
+        "query_cache": QUERY_CACHE.stats(),
+        "token_cache": TOKEN_VERSION_CACHE.stats(),
+        "password_hasher": PASSWORD_HASHER.stats(),
+        "audit_writer": AUDIT_WRITER.stats(),
+        "audit_partitions": AUDIT_PARTITIONS.stats(),
+        "audit_archive": AUDIT_ARCHIVE.stats(),
+        "audit_search": AUDIT_SEARCH.stats(),
+        "audit_policy": AUDIT_POLICY.stats(),
+    }
+    return SuccessResponse(data=data)
@@ -19,12 +19,12 @@ from applications.example.schemas.example_schema import (
     ProductCreate,
     ProductUpdate,
 )
-from configure import LOGGER
+from configure import PROJECT_CONFIG, LOGGER
 
 
 class CategoryCrud(ScaffoldCrud[Category, CategoryCreate, CategoryUpdate]):
     def __init__(self):
-        super().__init__(model=Category)
+        super().__init__(model=Category, cache_ttl=PROJECT_CONFIG.QUERY_CACHE_TTL)
 
     async def get_by_code(self, code: str) -> Optional[Category]:
         """根据编码获取分类"""
@@ -33,7 +33,7 @@ class CategoryCrud(ScaffoldCrud[Category, CategoryCreate, CategoryUpdate]):
 
 class ProductCrud(ScaffoldCrud[Product, ProductCreate, ProductUpdate]):
     def __init__(self):
-        super().__init__(model=Product)
+        super().__init__(model=Product, cache_ttl=PROJECT_CONFIG.QUERY_CACHE_TTL)
 
     async def get_by_code(self, code: str) -> Optional[Product]:
         """根据编码获取商品"""
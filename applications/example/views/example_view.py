@@ -28,7 +28,9 @@ from applications.example.schemas.example_schema import (
 )
 from applications.example.services.example_crud import CategoryCrud, ProductCrud
 from configure import LOGGER
+from core.exceptions import ParameterException
 from core.responses import SuccessResponse, FailureResponse
+from enums import ConflictMode
 
 example_category = APIRouter()
 example_product = APIRouter()
@@ -67,7 +69,7 @@ async def list_category(
         q &= Q(state=0)
 
     total, items = await category_crud.list(page=page, page_size=page_size, search=q)
-    data = [await item.to_dict() for item in items]
+    data = await category_crud.model.to_dicts(items)
     return SuccessResponse(data=data, total=total)
 
 
@@ -133,11 +135,14 @@ async def create_product(
 @example_product.post("/product/batch_create", summary="批量创建商品")
 async def batch_create_products(
         batch_in: BatchCreateProducts = Body(),
+        on_conflict: ConflictMode = Query(default=ConflictMode.ERROR, description="商品编码冲突处理方式：error/ignore/update"),
         product_crud: ProductCrud = Depends(get_product_crud),
 ):
     try:
-        instances = await product_crud.batch_create(batch_in.products)
-        data = [await item.to_dict() for item in instances]
+        instances = await product_crud.batch_create(
+            batch_in.products, on_conflict=on_conflict, conflict_fields=["code"]
+        )
+        data = await product_crud.model.to_dicts(instances)
         return SuccessResponse(data=data, total=len(data))
     except Exception as e:
         LOGGER.error(f"批量创建商品失败: {e}")
@@ -152,6 +157,7 @@ async def list_product(
         category_id: int = Query(default=None, description="分类ID"),
         min_price: Decimal = Query(default=None, description="最低价格"),
         max_price: Decimal = Query(default=None, description="最高价格"),
+        after: str = Query(default=None, description="游标分页：上一页返回的 next_cursor（首页传空字符串），传入时忽略 page"),
         product_crud: ProductCrud = Depends(get_product_crud),
 ):
     q = Q()
@@ -165,8 +171,16 @@ async def list_product(
         q &= Q(price__lte=max_price)
     q &= Q(state=0)
 
+    if after is not None:
+        try:
+            items, next_cursor = await product_crud.list_keyset(page_size=page_size, search=q, after=after)
+        except ParameterException as e:
+            return FailureResponse(message=e.message)
+        data = await product_crud.model.to_dicts(items)
+        return SuccessResponse(data=data, next_cursor=next_cursor)
+
     total, items = await product_crud.list(page=page, page_size=page_size, search=q)
-    data = [await item.to_dict() for item in items]
+    data = await product_crud.model.to_dicts(items)
     return SuccessResponse(data=data, total=total)
 
 
@@ -188,7 +202,7 @@ async def query_products(
             builder = builder.filter(is_featured=is_featured)
 
         total, items = await builder.order_by("-created_time").paginate(page=page, page_size=page_size)
-        data = [await item.to_dict() for item in items]
+        data = await product_crud.model.to_dicts(items)
         return SuccessResponse(data=data, total=total)
     except Exception as e:
         LOGGER.error(f"查询商品失败: {e}")
@@ -230,8 +244,8 @@ async def batch_update_products(
         product_crud: ProductCrud = Depends(get_product_crud),
 ):
     try:
-        count = await product_crud.batch_update(batch_in.updates, strict=False)
-        return SuccessResponse(data={"updated_count": count})
+        result = await product_crud.batch_update(batch_in.updates, strict=False)
+        return SuccessResponse(data=result)
     except Exception as e:
         LOGGER.error(f"批量更新商品失败: {e}")
         return FailureResponse(message=f"批量更新失败: {e}")
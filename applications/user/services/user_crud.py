@@ -25,19 +25,25 @@ from core.exceptions import (
     NoPermissionException,
 )
 from core.responses import ForbiddenResponse
-from services import verify_password, get_password_hash
+from services import verify_password_async, get_password_hash_async, TOKEN_VERSION_CACHE
 
 
 class UserCrud(ScaffoldCrud[User, UserCreate, UserUpdate]):
     def __init__(self):
         super().__init__(model=User)
 
-    async def get_by_id(self, user_id: int, on_error: bool = True, **kwargs) -> Optional[User]:
+    async def get_by_id(self, user_id: int, on_error: bool = True, for_write: bool = False, **kwargs) -> Optional[User]:
+        """
+        :param for_write: 读取待修改的记录时为 True，始终走主库（只读副本可能存在复制延迟）
+        """
         if not user_id:
             error_message: str = "查询用户信息失败, 参数(user_id)不允许为空"
             LOGGER.error(error_message)
             raise ParameterException(message=error_message)
-        instance = await self.get_or_none(id=user_id, **kwargs)
+        if for_write:
+            instance = await self.model.filter(id=user_id, **kwargs).first()
+        else:
+            instance = await self.get_or_none(id=user_id, **kwargs)
         if not instance and on_error:
             error_message: str = f"查询用户信息失败, 用户(id={user_id})不存在"
             LOGGER.error(error_message)
@@ -72,7 +78,7 @@ class UserCrud(ScaffoldCrud[User, UserCreate, UserUpdate]):
         user = await self.model.filter(username=credentials.username).first()
         if not user:
             raise NotFoundException(message="用户名不存在")
-        verified = verify_password(credentials.password, user.password)
+        verified = await verify_password_async(credentials.password, user.password)
         if not verified:
             raise NotFoundException(message="用户名或密码错误")
         if user.state == 1:
@@ -90,20 +96,31 @@ class UserCrud(ScaffoldCrud[User, UserCreate, UserUpdate]):
         if instances:
             raise DataAlreadyExistsException(message=f"用户(username={username})信息已存在")
 
-        user_in.password = get_password_hash(password=user_in.password)
+        user_in.password = await get_password_hash_async(password=user_in.password)
         instance = await self.create(user_in)
         return instance
 
+    async def _revoke_tokens(self, instance: User, **values) -> User:
+        """
+        吊销用户所有Token：在主库原子递增 token_version（并更新 values 中的字段），
+        不在内存中读改写，避免基于旧版本号覆盖并发的递增。
+
+        :param instance: 待吊销的用户实例，更新后从主库刷新
+        :param values: 同时更新的其他字段
+        """
+        await self.model.filter(id=instance.id).update(
+            token_version=F("token_version") + 1, updated_time=datetime.now(), **values
+        )
+        await instance.refresh_from_db()
+        await TOKEN_VERSION_CACHE.invalidate(instance.id)
+        return instance
+
     async def delete_user(self, user_id: int, **kwargs) -> User:
         instance = await self.model.filter(id=user_id, **kwargs).first()
         if not instance:
             raise NotFoundException(message=f"用户(id={user_id})信息不存在")
 
-        instance.state = 1
-        instance.is_active = 0
-        instance.token_version += 1  # 吊销用户所有Token
-        await instance.save()
-        return instance
+        return await self._revoke_tokens(instance, state=1, is_active=False)
 
     async def delete_users(self, user_in: UserBatchDelete) -> Optional[List[int]]:
         user_ids: Optional[List[int]] = user_in.user_ids
@@ -111,6 +128,7 @@ class UserCrud(ScaffoldCrud[User, UserCreate, UserUpdate]):
             deleted_ids = await self.model.filter(id__in=user_ids).exclude(state=1).values_list("id", flat=True)
             if deleted_ids:
                 await self.model.filter(id__in=deleted_ids).update(state=1, token_version=F('token_version') + 1)
+                await TOKEN_VERSION_CACHE.invalidate(*deleted_ids)
         else:
             deleted_ids = None
         return deleted_ids
@@ -126,16 +144,17 @@ class UserCrud(ScaffoldCrud[User, UserCreate, UserUpdate]):
         except DoesNotExist as e:
             raise NotFoundException(message=f"用户(id={user_id})信息不存在")
 
+        # 状态/激活标记可能变更，同步失效认证缓存
+        await TOKEN_VERSION_CACHE.invalidate(user_id)
         return instance
 
     async def reset_password(self, user_id: int):
-        instance = await self.get_by_id(user_id=user_id, on_error=True)
+        instance = await self.get_by_id(user_id=user_id, on_error=True, for_write=True)
         if instance.is_superuser:
             return ForbiddenResponse(message="不允许重置超级用户密码")
 
-        instance.password = get_password_hash(password="123456")
-        instance.token_version += 1  # 吊销用户所有Token
-        await instance.save()
+        password = await get_password_hash_async(password="123456")
+        await self._revoke_tokens(instance, password=password)
         data = await instance.to_dict(exclude_fields=["id", "password"])
         return data
 
@@ -147,11 +166,9 @@ class UserCrud(ScaffoldCrud[User, UserCreate, UserUpdate]):
         :param new_password: 新密码（明文）
         :return: 更新后的用户实例
         """
-        instance = await self.get_by_id(user_id=user_id, on_error=True)
-        instance.password = get_password_hash(password=new_password)
-        instance.token_version += 1  # 吊销用户所有Token
-        await instance.save()
-        return instance
+        instance = await self.get_by_id(user_id=user_id, on_error=True, for_write=True)
+        password = await get_password_hash_async(password=new_password)
+        return await self._revoke_tokens(instance, password=password)
 
     async def logout(self, user_id: int) -> User:
         """
@@ -160,7 +177,5 @@ class UserCrud(ScaffoldCrud[User, UserCreate, UserUpdate]):
         :param user_id: 用户ID
         :return: 更新后的用户实例
         """
-        instance = await self.get_by_id(user_id=user_id, on_error=True)
-        instance.token_version += 1  # 吊销用户所有Token
-        await instance.save()
-        return instance
+        instance = await self.get_by_id(user_id=user_id, on_error=True, for_write=True)
+        return await self._revoke_tokens(instance)
@@ -28,7 +28,7 @@ from core.responses import (
     FailureResponse,
     DataAlreadyExistsResponse,
 )
-from services import CTX_USER_ID, DependAuth, verify_password, get_password_hash
+from services import CTX_USER_ID, DependAuth, verify_password_async
 
 user_public = APIRouter()
 user_secure = APIRouter()
@@ -137,6 +137,7 @@ async def list_user(
         user_type: int = Query(default=None, description="用户类型：0xx 1xx 2xx"),
         is_active: bool = Query(default=None, description="是否激活"),
         is_superuser: bool = Query(default=None, description="是否为超级管理员"),
+        after: str = Query(default=None, description="游标分页：上一页返回的 next_cursor（首页传空字符串），传入时忽略 page"),
         user_crud: UserCrud = Depends(get_user_crud),
 ):
     q = Q()
@@ -157,8 +158,16 @@ async def list_user(
     if is_superuser is not None:
         q &= Q(is_superuser=is_superuser)
     q &= Q(state=0)
+    if after is not None:
+        try:
+            user_objs, next_cursor = await user_crud.list_keyset(page_size=page_size, order=order, search=q, after=after)
+        except ParameterException as e:
+            return FailureResponse(message=e.message)
+        data = await user_crud.model.to_dicts(user_objs, exclude_fields=["password"])
+        return SuccessResponse(data=data, next_cursor=next_cursor)
+
     total, user_objs = await user_crud.list(page=page, page_size=page_size, order=order, search=q)
-    data = [await obj.to_dict(exclude_fields=["password"]) for obj in user_objs]
+    data = await user_crud.model.to_dicts(user_objs, exclude_fields=["password"])
     return SuccessResponse(data=data, total=total)
 
 
@@ -202,7 +211,7 @@ async def get_users(
         search=q,
         order=user_in.order
     )
-    data = [await obj.to_dict(exclude_fields=["password"]) for obj in instances]
+    data = await user_crud.model.to_dicts(instances, exclude_fields=["password"])
     return SuccessResponse(data=data, total=total)
 
 
@@ -213,12 +222,13 @@ async def update_user_password(
 ):
     user_id = CTX_USER_ID.get()
     try:
-        instance = await user_crud.get_by_id(user_id, on_error=True)
+        # 旧密码校验读取主库，避免副本延迟时使用已失效的旧密码
+        instance = await user_crud.get_by_id(user_id, on_error=True, for_write=True)
     except ParameterException as e:
         return FailureResponse(message=e.message)
     except NotFoundException as e:
         return NotFoundResponse(message=e.message)
-    verified = verify_password(req_in.old_password, instance.password)
+    verified = await verify_password_async(req_in.old_password, instance.password)
     if not verified:
         return FailureResponse(message="旧密码验证错误")
     # 使用 UserCrud 方法，自动吊销所有 Token
@@ -20,7 +20,15 @@ from core.initializations import (
     register_routers,
     init_database_table,
 )
+from core.middlewares import AUDIT_POLICY
 from core.responses import SuccessResponse
+from applications.base.services.audit_archive import AUDIT_ARCHIVE
+from applications.base.services.audit_partition import AUDIT_PARTITIONS
+from applications.base.services.audit_writer import AUDIT_WRITER
+from applications.base.services.db_router import DB_ROUTER
+from applications.base.services.pool_monitor import POOL_MONITOR
+from applications.base.services.query_cache import QUERY_CACHE
+from services import PASSWORD_HASHER, TOKEN_VERSION_CACHE
 
 try:
     from configure import PROJECT_CONFIG, ROUTER_SUMMARY, ROUTER_TAGS
@@ -37,15 +45,30 @@ async def lifespan(app: FastAPI):
     except DBConnectionError as e:
         raise RuntimeError(f"数据库连接失败, 请检查主机地址是否可达: {e}")
     await init_database_table(app)
+    POOL_MONITOR.attach()
+    await AUDIT_WRITER.start()
+    await TOKEN_VERSION_CACHE.start()
+    await DB_ROUTER.start()
+    await AUDIT_PARTITIONS.start()
+    await AUDIT_ARCHIVE.start()
 
     for route in app.routes:
         if isinstance(route, APIRoute):
             ROUTER_SUMMARY[route.path] = route.summary
             ROUTER_TAGS[route.path] = route.tags
+    AUDIT_POLICY.load(app.routes)
 
     yield
 
+    # 先排空审计队列，再关闭数据库连接
+    await AUDIT_ARCHIVE.stop()
+    await AUDIT_PARTITIONS.stop()
+    await DB_ROUTER.stop()
+    await QUERY_CACHE.close()
+    await TOKEN_VERSION_CACHE.stop()
+    await AUDIT_WRITER.stop()
     await Tortoise.close_connections()
+    PASSWORD_HASHER.shutdown()
 
 
 app = FastAPI(
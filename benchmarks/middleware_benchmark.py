@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+@Author  : yangkai
+@Email   : 807440781@qq.com
+@Project : Krun
+@Module  : middleware_benchmark.py
+@DateTime: 2026/6/12
+
+中间件单请求开销对比：原三层 BaseHTTPMiddleware 风格函数中间件 vs 单层纯 ASGI 请求管道。
+
+直接以 ASGI 协议驱动应用（不经过网络与 HTTP 客户端），终端应用为最简 JSON 响应，
+审计写入替换为空操作、日志输出关闭，仅统计中间件本身的开销。
+
+使用方式（需与服务相同的环境变量）：
+    python -m benchmarks.middleware_benchmark --requests 5000
+"""
+import argparse
+import asyncio
+import time
+from typing import List, Tuple
+
+import backend_main  # noqa: F401  先完成 core 初始化，避免循环导入
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import JSONResponse, Response
+from starlette.types import Receive, Scope, Send
+
+from applications.base.services.audit_writer import AUDIT_WRITER
+from common.request_context import apply_response_trace_headers, clear_trace_context, enter_server_span
+from configure import LOGGER, PROJECT_CONFIG
+from core.middlewares import AuditCapture, RequestPipelineMiddleware, authenticate_request
+
+
+async def endpoint(scope: Scope, receive: Receive, send: Send) -> None:
+    """终端应用：读取请求体后返回统一响应体。"""
+    while (await receive()).get("more_body", False):
+        pass
+    response = JSONResponse({"code": "000000", "status": "success", "message": "ok", "data": None})
+    await response(scope, receive, send)
+
+
+async def legacy_auth_middleware(request, call_next):
+    rejected = await authenticate_request(request)
+    if rejected is not None:
+        return rejected
+    return await call_next(request)
+
+
+async def legacy_logging_middleware(request, call_next):
+    """原审计中间件：缓冲完整响应体后重建 Response。"""
+    audit = AuditCapture(request, PROJECT_CONFIG.AUDIT_BODY_CAPTURE_LIMIT)
+    audit.request_capture.feed(await request.body())
+    response = await call_next(request)
+    response_body = b""
+    async for chunk in response.body_iterator:
+        response_body += chunk
+    audit.response_headers = response.headers
+    audit.response_capture.feed(response_body)
+    await audit.finish()
+    return Response(
+        content=response_body,
+        status_code=response.status_code,
+        headers=dict(response.headers),
+        media_type=response.media_type,
+    )
+
+
+async def legacy_request_context_middleware(request, call_next):
+    snapshot, tokens = enter_server_span(request)
+    try:
+        response = await call_next(request)
+        apply_response_trace_headers(response.headers, snapshot)
+        return response
+    finally:
+        clear_trace_context(tokens)
+
+
+def build_legacy_app():
+    app = BaseHTTPMiddleware(endpoint, dispatch=legacy_auth_middleware)
+    app = BaseHTTPMiddleware(app, dispatch=legacy_logging_middleware)
+    return BaseHTTPMiddleware(app, dispatch=legacy_request_context_middleware)
+
+
+def build_pipeline_app():
+    return RequestPipelineMiddleware(endpoint)
+
+
+async def call(app, method: str, path: str, body: bytes) -> int:
+    scope = {
+        "type": "http", "http_version": "1.1", "scheme": "http", "root_path": "",
+        "method": method, "path": path, "raw_path": path.encode(), "query_string": b"",
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        "client": ("127.0.0.1", 50000), "server": ("127.0.0.1", 8000),
+    }
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    status: List[int] = []
+
+    async def receive():
+        return messages.pop() if messages else {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+
+    await app(scope, receive, send)
+    return status[0]
+
+
+async def measure(app, requests: int, method: str, path: str, body: bytes) -> Tuple[float, int]:
+    for _ in range(min(200, requests)):
+        await call(app, method, path, body)
+    started = time.perf_counter()
+    for _ in range(requests):
+        code = await call(app, method, path, body)
+    return (time.perf_counter() - started) / requests * 1e6, code
+
+
+async def main(requests: int) -> None:
+    # 白名单接口（走完整的追溯链/审计/认证流程，不访问数据库）
+    method, path, body = "POST", "/user/create", b'{"username": "benchmark", "password": "benchmark"}'
+    baseline, _ = await measure(endpoint, requests, method, path, body)
+    print(f"请求: {method} {path}, 次数: {requests}")
+    print(f"{'无中间件':<16}{baseline:>10.1f} us/req")
+    for name, app in (("三层函数中间件", build_legacy_app()), ("单层ASGI管道", build_pipeline_app())):
+        elapsed, code = await measure(app, requests, method, path, body)
+        print(f"{name:<16}{elapsed:>10.1f} us/req, 中间件开销 {elapsed - baseline:>8.1f} us/req (status={code})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="中间件单请求开销对比")
+    parser.add_argument("--requests", type=int, default=5000, help="每种方案的请求次数")
+    args = parser.parse_args()
+
+    AUDIT_WRITER.submit = lambda record: True
+    LOGGER.remove()
+    asyncio.run(main(args.requests))
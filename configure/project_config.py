@@ -9,7 +9,7 @@
 import os.path
 import platform
 from functools import lru_cache
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from urllib.parse import quote_plus
 
 from pydantic import Field, model_validator
@@ -57,11 +57,47 @@ class ProjectConfig(BaseSettings):
     SERVER_PORT: int = 8519
     SERVER_DEBUG: bool = SERVER_SYSTEM != "Linux"  # Windows | Linux | Darwin
     SERVER_DELAY: int = 5
+    # Gunicorn worker 进程数（gunicorn_config.workers 读取此项），数据库连接池按此分摊连接预算
+    SERVER_WORKERS: int = 4
 
     # 安全认证配置（须在 backend/.env 或环境变量中配置）
     AUTH_SECRET_KEY: str = Field(..., min_length=64, description="JWT密钥，建议: openssl rand -hex 32")
     AUTH_JWT_ALGORITHM: str = "HS256"
     AUTH_JWT_ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 7  # 7 day
+    # 密码哈希/校验（argon2）专用线程池大小与最大并发数，超出并发的请求在事件循环中排队等待
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_MAX_CONCURRENCY: int = 8
+    # 免认证白名单，规则格式："METHOD /path"（精确匹配）或 "METHOD /path/*"（前缀匹配），METHOD 可为 "*"
+    AUTH_WHITELIST: List[str] = [
+        # login
+        "POST /user/create",
+        "POST /base/auth/access_token",
+
+        # root
+        "GET /",
+
+        # static assets
+        "* /static/*",
+    ]
+
+    @property
+    def AUTH_WHITELIST_RULES(self) -> List[str]:
+        """完整白名单：配置规则 + OpenApi 文档路由（文档地址可由环境变量覆盖）"""
+        return [
+            *self.AUTH_WHITELIST,
+            f"GET {self.APP_DOCS_URL}",
+            f"GET {self.APP_REDOC_URL}",
+            f"GET {self.APP_OPENAPI_URL}",
+        ]
+
+    # Token 版本缓存（user_id -> token_version/state/is_active），命中时认证不访问数据库
+    # 多 worker 时须使用 redis 失效通道，显式配置为 local 时缓存不启用（避免其他 worker 在 TTL 内接受已吊销的 Token）
+    AUTH_TOKEN_CACHE_ENABLED: bool = True
+    AUTH_TOKEN_CACHE_MAX_SIZE: int = 10000
+    AUTH_TOKEN_CACHE_TTL: float = 60.0
+    # 跨 worker 失效通知：auto（SERVER_WORKERS > 1 时为 redis，否则为 local）| local（仅本进程，仅适用于单 worker）| redis（发布/订阅）
+    AUTH_TOKEN_INVALIDATION_BACKEND: str = "auto"
+    AUTH_TOKEN_INVALIDATION_CHANNEL: str = "krun:auth:token_invalidation"
 
     # 日志相关参数配置
     LOGGER_FILE_NAME_PREFIX: str = "执行日志"
@@ -72,6 +108,14 @@ class ProjectConfig(BaseSettings):
     # 大小轮转后保留的备份文件个数（单文件多进程模式）
     LOGGER_ROTATION_BACKUP_COUNT: int = 30
 
+    # 访问日志（每个请求一行，见 core/middlewares/access_log.py）
+    # 输出格式: text | json
+    ACCESS_LOG_FORMAT: str = "text"
+    # 请求/响应头部与报文体明细的日志级别，默认 DEBUG（生产环境文件 sink 为 INFO，不渲染明细）
+    ACCESS_LOG_DETAIL_LEVEL: str = "DEBUG"
+    # 明细中单个字段最多输出的字符数，超出部分截断，0 表示不限制
+    ACCESS_LOG_FIELD_LIMIT: int = 2048
+
     # 项目路径相关配置
     APPLICATIONS_DIR: str = os.path.abspath(os.path.join(_BACKEND_PROJECT_ROOT, "applications"))
     CELERY_SCHEDULER_DIR: str = os.path.abspath(os.path.join(_BACKEND_PROJECT_ROOT, "celery_scheduler"))
@@ -164,6 +208,71 @@ class ProjectConfig(BaseSettings):
         models.append("aerich.models")
         return models
 
+    # 审计日志异步批量写入配置
+    # 队列容量上限，写满后丢弃新审计记录并告警，避免拖慢请求链路
+    AUDIT_QUEUE_MAX_SIZE: int = 10000
+    # 单次批量落库的最大记录数
+    AUDIT_BATCH_SIZE: int = 200
+    # 批次未写满时的最长等待时间（秒）
+    AUDIT_FLUSH_INTERVAL: float = 1.0
+    # 应用关闭时等待队列排空的最长时间（秒）
+    AUDIT_DRAIN_TIMEOUT: float = 10.0
+    # 审计记录中请求体/响应体最多保留的字节数，超出部分标记为截断
+    AUDIT_BODY_CAPTURE_LIMIT: int = 102400
+    # 审计日志采集策略（见 core/middlewares/audit_policy.py）：full | metadata | sampled:<百分比> | errors | off
+    # 默认策略，未单独声明的路由使用
+    AUDIT_DEFAULT_POLICY: str = "full"
+    # 按路由配置，优先级最高，键为 "METHOD /path" 或 "/path"，例如 {"GET /base/audit/recent": "sampled:10"}
+    AUDIT_ROUTE_POLICIES: Dict[str, str] = {}
+    # 按路由标签配置，优先级低于路由声明（openapi_extra），例如 {"基础服务-审计模块": "metadata"}
+    AUDIT_TAG_POLICIES: Dict[str, str] = {}
+    # 审计日志关键字检索倒排表（见 applications/base/services/audit_search.py）按 request_time 划分的时间桶分钟数
+    AUDIT_SEARCH_BUCKET_MINUTES: int = 10
+    # 关键字命中的时间区间超过该数量时（关键字过于常见，倒排表没有裁剪效果）直接按 LIKE 扫描
+    AUDIT_SEARCH_MAX_RANGES: int = 500
+    # 耗时分位数统计（latency_percentiles）同时执行的分位值查询数上限，避免一次请求占满连接池
+    AUDIT_STATS_MAX_CONCURRENCY: int = 4
+
+    # 审计日志分区与保留配置（审计表按 created_time RANGE COLUMNS 分区，见迁移 4）
+    # 保留天数，默认 0 表示永久保留。注意：这是破坏性配置，设置后超期的整个分区被删除（DROP PARTITION），
+    # 数据不可恢复，未分区的数据库则分批删除超期数据；需要留存历史时请先开启冷归档（AUDIT_ARCHIVE_AFTER_DAYS）
+    AUDIT_RETENTION_DAYS: int = 0
+    # 新建分区的粒度: month | day
+    AUDIT_PARTITION_INTERVAL: str = "month"
+    # 提前创建的未来分区数量
+    AUDIT_PARTITION_PREMAKE: int = 3
+    # 分区维护（创建未来分区、删除过期分区）的执行间隔（秒）
+    AUDIT_PARTITION_CHECK_INTERVAL: float = 3600.0
+    # 无法整分区删除时（区间边缘、未分区的数据库）分批删除的每批行数
+    AUDIT_DELETE_BATCH_SIZE: int = 5000
+
+    # 审计日志冷归档配置：早于 N 天的数据按天导出为 gzip 压缩的 JSON Lines 文件（OUTPUT_DATAGRAM_DIR/audit_archive），
+    # 校验行数后从数据库分批删除；0 表示不归档。启用时应小于 AUDIT_RETENTION_DAYS，否则数据会先被分区删除
+    AUDIT_ARCHIVE_AFTER_DAYS: int = 0
+    # 归档任务执行间隔（秒）
+    AUDIT_ARCHIVE_INTERVAL: float = 86400.0
+    # 归档时每次从数据库读取的行数
+    AUDIT_ARCHIVE_CHUNK_SIZE: int = 2000
+
+    # 分页总数统计配置
+    # 封顶统计（count_mode=capped）默认最多统计的记录数
+    QUERY_COUNT_CAP: int = 10000
+    # 按过滤条件缓存总数的有效期（秒）与最大缓存条目数
+    QUERY_COUNT_CACHE_TTL: float = 5.0
+    QUERY_COUNT_CACHE_MAX_SIZE: int = 1024
+    # 查询结果缓存（ScaffoldCrud 通过 cache_ttl 按 CRUD 开启）
+    # 缓存后端：auto（SERVER_WORKERS > 1 时为 redis，否则为 local）| local（进程内 LRU+TTL，仅适用于单 worker，
+    # 多 worker 时缓存不启用）| redis（多 worker 共享）
+    QUERY_CACHE_BACKEND: str = "auto"
+    # 进程内缓存的最大条目数
+    QUERY_CACHE_MAX_SIZE: int = 2048
+    # CRUD 开启缓存时的默认有效期（秒）
+    QUERY_CACHE_TTL: float = 30.0
+    # redis 后端的键前缀
+    QUERY_CACHE_REDIS_PREFIX: str = "krun:query_cache"
+    # 批量写入（bulk_create/bulk_update）单条语句包含的最大行数
+    QUERY_BULK_CHUNK_SIZE: int = 500
+
     # 常用的用户代理字符串列表
     USER_AGENTS: List[str] = [
         # Chrome
@@ -204,6 +313,25 @@ class ProjectConfig(BaseSettings):
     DATABASE_NAME: str = Field(..., min_length=1, description="数据库名称")
     DATABASE_USERNAME: str = Field(..., min_length=1, description="数据库用户名")
     DATABASE_PASSWORD: str = Field(..., min_length=1, description="数据库密码")
+    # 只读副本，如 [{"host": "10.0.0.2"}, {"host": "10.0.0.3", "port": "3307", "maxsize": 20}]，未填写的项沿用主库配置；
+    # 组装为 replica_0、replica_1... 连接，ScaffoldCrud/QueryBuilder 的读操作按策略路由到副本
+    DATABASE_REPLICAS: List[Dict[str, Any]] = []
+    # 副本选择策略：round_robin（轮询）| least_latency（探测延迟最低）
+    DATABASE_REPLICA_POLICY: str = "round_robin"
+    # 副本健康与延迟探测间隔（秒）
+    DATABASE_REPLICA_PROBE_INTERVAL: float = 5.0
+    # 读己之写：同一请求内发生写操作后，该时间窗口（秒）内的读操作仍走主库
+    DATABASE_READ_YOUR_WRITES_WINDOW: float = 2.0
+    # 连接池配置（每个 worker 进程、每个连接各一个连接池）
+    # 本服务在单个数据库实例上可占用的连接总数（所有 worker 合计），需小于 MySQL max_connections
+    DATABASE_CONNECTION_BUDGET: int = 160
+    # 单个连接池最小/最大连接数；最大连接数为 0 时取 DATABASE_CONNECTION_BUDGET // SERVER_WORKERS
+    DATABASE_POOL_MINSIZE: int = 10
+    DATABASE_POOL_MAXSIZE: int = 0
+    # 连接最长复用时间（秒），需小于 MySQL wait_timeout
+    DATABASE_POOL_RECYCLE: int = 3600
+    # 从连接池获取连接的最长等待时间（秒），超时抛出异常并计入指标；0 表示不限制
+    DATABASE_POOL_ACQUIRE_TIMEOUT: float = 10.0
 
     # Redis 配置（仅 requirepass 时用户名留空；密码含 @/: 等会在连接 URL 中做编码）
     REDIS_URL: str = ""
@@ -232,27 +360,78 @@ class ProjectConfig(BaseSettings):
             f"?charset=utf8mb4&time_zone=+08:00"
         )
         self.DATABASE_CONNECTIONS = {
-            "default": {
-                "engine": "tortoise.backends.mysql",
-                "db_url": self.DATABASE_URL,
-                "credentials": {
-                    "host": self.DATABASE_HOST,
-                    "port": self.DATABASE_PORT,
-                    "user": self.DATABASE_USERNAME,
-                    "password": self.DATABASE_PASSWORD,
-                    "database": self.DATABASE_NAME,
-                    "minsize": 10,
-                    "maxsize": 40,
-                    "pool_recycle": 3600,
-                    "charset": "utf8mb4",
-                    "echo": False,
-                    "autocommit": True,
-                },
-            }
+            "default": self.build_mysql_connection(
+                host=self.DATABASE_HOST,
+                port=self.DATABASE_PORT,
+                user=self.DATABASE_USERNAME,
+                password=self.DATABASE_PASSWORD,
+                database=self.DATABASE_NAME,
+                db_url=self.DATABASE_URL,
+                **self.database_pool_options(),
+            )
         }
+        for index, replica in enumerate(self.DATABASE_REPLICAS):
+            self.DATABASE_CONNECTIONS[f"replica_{index}"] = self.build_mysql_connection(
+                host=replica.get("host") or self.DATABASE_HOST,
+                port=str(replica.get("port") or self.DATABASE_PORT),
+                user=replica.get("username") or self.DATABASE_USERNAME,
+                password=replica.get("password") or self.DATABASE_PASSWORD,
+                database=replica.get("name") or self.DATABASE_NAME,
+                **self.database_pool_options(replica),
+            )
         self.REDIS_URL = self.build_redis_url(db=0)
         return self
 
+    def shared_backend(self, backend: str) -> str:
+        """解析缓存/失效通道后端：auto 在多 worker 时取 redis（跨进程共享），单 worker 时取 local。"""
+        backend = backend.strip().lower()
+        if backend == "auto":
+            return "redis" if self.SERVER_WORKERS > 1 else "local"
+        return backend
+
+    def database_pool_options(self, overrides: Optional[Dict[str, Any]] = None) -> Dict[str, int]:
+        """连接池参数：默认按 worker 数分摊连接预算，副本配置中的 minsize/maxsize/pool_recycle 优先。"""
+        overrides = overrides or {}
+        maxsize = int(
+            overrides.get("maxsize")
+            or self.DATABASE_POOL_MAXSIZE
+            or max(1, self.DATABASE_CONNECTION_BUDGET // max(1, self.SERVER_WORKERS))
+        )
+        minsize = min(int(overrides.get("minsize", self.DATABASE_POOL_MINSIZE)), maxsize)
+        pool_recycle = int(overrides.get("pool_recycle", self.DATABASE_POOL_RECYCLE))
+        return {"minsize": minsize, "maxsize": maxsize, "pool_recycle": pool_recycle}
+
+    @staticmethod
+    def build_mysql_connection(
+            *, host: str, port: str, user: str, password: str, database: str, db_url: str = "",
+            minsize: int = 10, maxsize: int = 40, pool_recycle: int = 3600,
+    ) -> Dict[str, Any]:
+        return {
+            "engine": "tortoise.backends.mysql",
+            "db_url": db_url or (
+                f"mysql://{quote_plus(user)}:{quote_plus(password)}@{host}:{port}/{database}"
+                f"?charset=utf8mb4&time_zone=+08:00"
+            ),
+            "credentials": {
+                "host": host,
+                "port": port,
+                "user": user,
+                "password": password,
+                "database": database,
+                "minsize": minsize,
+                "maxsize": maxsize,
+                "pool_recycle": pool_recycle,
+                "charset": "utf8mb4",
+                "echo": False,
+                "autocommit": True,
+            },
+        }
+
+    @property
+    def DATABASE_REPLICA_CONNECTIONS(self) -> List[str]:
+        """只读副本连接名（replica_0、replica_1...）"""
+        return [name for name in self.DATABASE_CONNECTIONS if name.startswith("replica_")]
+
     @staticmethod
     def format_redis_url(*, username: str, password: str, host: str, port: str, db: int) -> str:
         auth = ""
@@ -30,9 +30,7 @@ from core.exceptions.http_exceptions import (
     null_point_exception_handler,
     app_exception_handler,
 )
-from core.middlewares.app_middleware import logging_middleware
-from core.middlewares.auth_middleware import auth_middleware
-from core.middlewares.request_context_middleware import request_context_middleware
+from core.middlewares.pipeline_middleware import RequestPipelineMiddleware
 from services import DependAuth
 
 
@@ -48,6 +46,9 @@ async def register_database(app: FastAPI) -> None:
         "use_tz": False,
         "timezone": "Asia/Shanghai",
     }
+    if PROJECT_CONFIG.DATABASE_REPLICA_CONNECTIONS:
+        # 读写分离：记录写操作以支持读己之写，读操作的副本选择见 DB_ROUTER
+        config["routers"] = ["applications.base.services.db_router.ReadYourWritesRouter"]
     register_tortoise(
         app=app,
         config=config,
@@ -87,16 +88,34 @@ async def register_database(app: FastAPI) -> None:
         )
         return
 
-    # 生成迁移文件
+    await run_migrations(command)
+
+
+async def run_migrations(command: Command) -> None:
+    """
+    执行数据库迁移：存在未执行的迁移文件时直接执行，否则按模型差异生成迁移文件后执行。
+
+    aerich 生成新版本时会删除同一版本号的已有文件，若在未执行的手写迁移（含数据转换）之前自动生成，
+    手写迁移会被自动生成的纯结构变更覆盖；执行迁移时 aerich 记录当前模型快照，之后的自动生成差异为空。
+    """
     try:
-        await command.migrate(name="auto_migrate")
-    except AttributeError as e:
-        LOGGER.error(f"无法从数据库中检索模型历史记录, 请检查[migration]与[aerich]表记录是否一致: {e}\n错误回溯: {traceback.format_exc()}")
-        if PROJECT_CONFIG.aerich_should_run_on_startup:
-            shutil.rmtree(PROJECT_CONFIG.MIGRATION_DIR)
-            await command.init_db(safe=True)
-        else:
-            raise RuntimeError("数据库迁移元数据与本地[migration]不一致, 无法进行迁移, 请手工修复或从备份恢复后再启动应用")
+        pending = await command.heads()
+    except tortoise.exceptions.OperationalError:
+        # aerich 表尚未创建（全新数据库）
+        pending = []
+    if pending:
+        LOGGER.info(f"存在未执行的迁移文件, 跳过自动生成迁移: {pending}")
+    else:
+        # 生成迁移文件
+        try:
+            await command.migrate(name="auto_migrate")
+        except AttributeError as e:
+            LOGGER.error(f"无法从数据库中检索模型历史记录, 请检查[migration]与[aerich]表记录是否一致: {e}\n错误回溯: {traceback.format_exc()}")
+            if PROJECT_CONFIG.aerich_should_run_on_startup:
+                shutil.rmtree(PROJECT_CONFIG.MIGRATION_DIR)
+                await command.init_db(safe=True)
+            else:
+                raise RuntimeError("数据库迁移元数据与本地[migration]不一致, 无法进行迁移, 请手工修复或从备份恢复后再启动应用")
 
     # 应用迁移
     await command.upgrade(run_in_transaction=True)
@@ -157,12 +176,8 @@ def register_middlewares(app: FastAPI):
         expose_headers=PROJECT_CONFIG.CORS_EXPOSE_METHODS,
         max_age=PROJECT_CONFIG.CORS_MAX_AGE,
     )
-    # 注册 HTTP 请求中间件
-    app.middleware('http')(auth_middleware)
-    # 先做认证拦截，再做审计日志记录
-    app.middleware('http')(logging_middleware)
-    # 后做日志追溯链
-    app.middleware('http')(request_context_middleware)
+    # 注册请求处理管道（纯 ASGI 中间件）：日志追溯链 -> 审计日志 -> 认证拦截
+    app.add_middleware(RequestPipelineMiddleware)
 
 
 def register_routers(app: FastAPI) -> None:
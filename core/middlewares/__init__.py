@@ -6,12 +6,20 @@
 @Module  : __init__.py
 @DateTime: 2025/1/12 19:44
 """
-from .app_middleware import logging_middleware
-from .auth_middleware import auth_middleware
-from .request_context_middleware import request_context_middleware
+from .access_log import AccessLog
+from .app_middleware import AuditCapture
+from .audit_policy import AUDIT_POLICY, AuditPolicy, audit_policy
+from .auth_middleware import authenticate_request
+from .pipeline_middleware import RequestPipelineMiddleware
+from .request_context_middleware import trace_send
 
 __all__ = (
-    "logging_middleware",
-    "auth_middleware",
-    "request_context_middleware",
+    "AccessLog",
+    "AuditCapture",
+    "AUDIT_POLICY",
+    "AuditPolicy",
+    "audit_policy",
+    "authenticate_request",
+    "RequestPipelineMiddleware",
+    "trace_send",
 )
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""
+@Author  : yangkai
+@Email   : 807440781@qq.com
+@Project : Krun
+@Module  : access_log.py
+@DateTime: 2026/6/25
+
+结构化访问日志。
+
+每个请求（与审计采集策略无关，含不记录审计的路由与仅错误采集时的成功请求）由请求处理管道输出一行访问日志（INFO）：
+请求方式、路由、HTTP 状态码、响应代码、耗时、来源、用户等摘要字段；
+采集了审计记录的请求，其请求/响应头部与报文体作为明细单独一行输出（ACCESS_LOG_DETAIL_LEVEL，默认 DEBUG）。
+两行均通过 LOGGER.opt(lazy=True) 延迟渲染：没有任何 sink 启用对应级别时不做序列化，
+生产环境（文件 sink 为 INFO）只渲染摘要，头部与报文体不产生任何格式化开销。
+
+输出格式（ACCESS_LOG_FORMAT）：
+    text: ACCESS GET /base/audit/recent 200 000000 1.234ms client=127.0.0.1 user=1 tags=基础服务-审计模块 summary=查询最近审计日志
+    json: {"type":"access","method":"GET","router":"/base/audit/recent","status":200,...}
+单个字段超过 ACCESS_LOG_FIELD_LIMIT 个字符时截断并标记。
+"""
+import time
+from typing import Any, Dict
+
+import orjson
+from starlette.requests import Request
+from starlette.types import Message, Send
+
+from configure import PROJECT_CONFIG, LOGGER, ROUTER_SUMMARY, ROUTER_TAGS
+from enums import Code
+
+# 摘要中的短字段（响应消息、接口描述等）最多保留的字符数
+_SUMMARY_FIELD_LIMIT = 128
+
+
+def _cap(value: Any, limit: int) -> str:
+    """字段渲染为字符串并按 limit 截断；dict/list 使用 orjson 序列化（比 repr 快）。"""
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        text = value
+    elif isinstance(value, (dict, list, tuple)):
+        text = orjson.dumps(value, default=str).decode("utf-8")
+    else:
+        text = str(value)
+    if limit > 0 and len(text) > limit:
+        return f"{text[:limit]}...<TRUNCATED {len(text) - limit} CHARS>"
+    return text
+
+
+def _tags(value: Any) -> str:
+    if isinstance(value, (list, tuple)):
+        return ",".join(str(getattr(tag, "value", tag)) for tag in value)
+    return "" if value is None else str(value)
+
+
+class AccessProbe:
+    """
+    单次请求的访问探针：记录开始时间与 HTTP 状态码，未采集审计记录时组装访问日志使用的轻量记录。
+
+    使用方式：
+        probe = AccessProbe(request)
+        send = probe.wrap(send)
+        ...
+        AccessLog(audit_log or probe.record(), probe.status).emit()
+    """
+
+    __slots__ = ("request", "start_counter", "status")
+
+    def __init__(self, request: Request):
+        self.request = request
+        self.start_counter = time.perf_counter()
+        self.status: int = 0
+
+    def wrap(self, send: Send) -> Send:
+        """返回记录 HTTP 状态码的 send。"""
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                self.status = message.get("status", 0)
+            await send(message)
+
+        return send_wrapper
+
+    def record(self, response_code: str = "") -> Dict[str, Any]:
+        """
+        轻量记录（字段名与审计记录一致，不含头部与报文体）。
+
+        :param response_code: 已解析的响应代码（仅错误采集时的成功请求），未知时为空
+        """
+        request = self.request
+        request_router = request.url.path
+        user_obj = getattr(request.state, "user", None)
+        return {
+            "request_method": request.method,
+            "request_router": request_router,
+            "request_client": request.client.host if request.client else "127.0.0.1",
+            "request_tags": ROUTER_TAGS.get(request_router, "未定义"),
+            "request_summary": ROUTER_SUMMARY.get(request_router, "未定义"),
+            "response_code": response_code,
+            "response_elapsed": int((time.perf_counter() - self.start_counter) * 1000000),
+            "user_id": user_obj.id if user_obj else 0,
+        }
+
+
+class AccessLog:
+    """
+    单次请求的访问日志（持有审计记录的引用，渲染推迟到日志输出时）。
+
+    使用方式：
+        AccessLog(audit_log, response_status).emit()
+    """
+
+    __slots__ = ("record", "status")
+
+    json_format: bool = PROJECT_CONFIG.ACCESS_LOG_FORMAT.lower() == "json"
+    field_limit: int = PROJECT_CONFIG.ACCESS_LOG_FIELD_LIMIT
+    detail_level: str = PROJECT_CONFIG.ACCESS_LOG_DETAIL_LEVEL.upper()
+
+    def __init__(self, record: Dict[str, Any], status: int):
+        """
+        :param record: 审计记录（AuditCapture.finish 组装的 audit_log）或 AccessProbe.record() 的轻量记录
+        :param status: HTTP 状态码
+        """
+        self.record = record
+        self.status = status
+
+    def summary_fields(self) -> Dict[str, Any]:
+        record = self.record
+        return {
+            "type": "access",
+            "method": record.get("request_method"),
+            "router": record.get("request_router"),
+            "status": self.status,
+            "code": record.get("response_code") or "",
+            "message": _cap(record.get("response_message"), _SUMMARY_FIELD_LIMIT),
+            "elapsed_ms": round(record.get("response_elapsed", 0) / 1000, 3),
+            "client": record.get("request_client"),
+            "user_id": record.get("user_id", 0),
+            "tags": _tags(record.get("request_tags")),
+            "summary": _cap(record.get("request_summary"), _SUMMARY_FIELD_LIMIT),
+        }
+
+    def detail_fields(self) -> Dict[str, Any]:
+        record = self.record
+        return {
+            "type": "access_detail",
+            "method": record.get("request_method"),
+            "router": record.get("request_router"),
+            "request_header": _cap(record.get("request_header"), self.field_limit),
+            "request_params": _cap(record.get("request_params"), self.field_limit),
+            "response_header": _cap(record.get("response_header"), self.field_limit),
+            "response_params": _cap(record.get("response_params"), self.field_limit),
+        }
+
+    def render_summary(self) -> str:
+        fields = self.summary_fields()
+        if self.json_format:
+            return orjson.dumps(fields).decode("utf-8")
+        # 仅失败请求输出响应消息
+        failed = self.status >= 400 or fields["code"] not in ("", Code.CODE200.value)
+        message = f" message={fields['message']}" if fields["message"] and failed else ""
+        return (
+            f"ACCESS {fields['method']} {fields['router']} {fields['status']} {fields['code'] or '-'} "
+            f"{fields['elapsed_ms']:.3f}ms client={fields['client']} user={fields['user_id']} "
+            f"tags={fields['tags'] or '-'} summary={fields['summary'] or '-'}{message}"
+        )
+
+    def render_detail(self) -> str:
+        fields = self.detail_fields()
+        if self.json_format:
+            return orjson.dumps(fields).decode("utf-8")
+        return (
+            f"ACCESS-DETAIL {fields['method']} {fields['router']} "
+            f"request_header={fields['request_header']} request_params={fields['request_params']} "
+            f"response_header={fields['response_header']} response_params={fields['response_params']}"
+        )
+
+    def emit(self) -> None:
+        """输出摘要与明细（仅审计记录有明细）；没有 sink 启用对应级别时不会调用渲染方法。"""
+        LOGGER.opt(lazy=True).info("{}", self.render_summary)
+        if "request_header" in self.record:
+            LOGGER.opt(lazy=True).log(self.detail_level, "{}", self.render_detail)
@@ -6,180 +6,272 @@
 @Module  : app_middleware.py
 @DateTime: 2025/1/17 22:29
 """
+import re
 import time
-from io import BytesIO
-from typing import Dict, Any, Optional
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, List, Tuple
 from urllib.parse import unquote
 
 import orjson
-from fastapi import Request, Response
-from starlette.datastructures import FormData
-
-from applications.base.models.audit_model import Audit
-from applications.user.models.user_model import User
-from configure import PROJECT_CONFIG, GLOBAL_CONFIG, LOGGER, ROUTER_SUMMARY, ROUTER_TAGS
-from services import AuthControl
-
-
-def is_upload_request(request: Request) -> bool:
+from starlette.datastructures import Headers
+from starlette.requests import Request
+from starlette.types import Message, Receive, Send
+
+from applications.base.services.audit_writer import AUDIT_WRITER
+from configure import PROJECT_CONFIG, ROUTER_SUMMARY, ROUTER_TAGS
+from enums import AuditMode, Code
+from services import AuthControl, AuthPrincipal
+
+# multipart 分段头中的字段名、文件名与类型
+_MULTIPART_PART_PATTERN = re.compile(
+    rb'Content-Disposition:\s*form-data;\s*name="([^"]*)"(?:;\s*filename="([^"]*)")?'
+    rb'(?:\r\nContent-Type:\s*([^\r\n]*))?',
+    re.IGNORECASE,
+)
+# 不记录审计日志的路由（静态文件&OpenApi文档），业务路由通过审计策略声明（见 audit_policy.py）
+_EXCLUDED_ROUTERS = frozenset((
+    "/",
+    PROJECT_CONFIG.APP_DOCS_URL,
+    PROJECT_CONFIG.APP_REDOC_URL,
+    PROJECT_CONFIG.APP_OPENAPI_URL,
+))
+# 统一响应体 {code,status,message,...} 的前缀字段（响应体被截断时使用）
+_ENVELOPE_CODE_PATTERN = re.compile(rb'"code"\s*:\s*"?([^",}]*)"?')
+_ENVELOPE_MESSAGE_PATTERN = re.compile(rb'"message"\s*:\s*"((?:[^"\\]|\\.)*)"')
+# 仅元数据采集时保留的响应体前缀字节数（只用于解析统一响应体的 code/message）
+_METADATA_CAPTURE_LIMIT = 1024
+
+
+def is_upload_request(request_path: str, content_type: str) -> bool:
     """判断当前请求是否为文件上传请求（multipart/form-data 或路径含 upload）。
 
-    :param request: FastAPI/Starlette 请求对象。
+    :param request_path: 请求路径。
+    :param content_type: 请求头 Content-Type。
     :returns: 是上传请求返回 True，否则 False。
     """
-    path: str = request.url.path.lower()
-    content_type: str = request.headers.get("content-type", "")
+    path: str = request_path.lower()
     return "multipart/form-data" in content_type.lower() or path.startswith("upload") or path.endswith("upload")
 
 
-def is_html_response(response: Response) -> bool:
+def is_html_response(headers: Headers) -> bool:
     """判断响应是否为 HTML 或 XML 文本类型。
 
-    :param response: 响应对象。
+    :param headers: 响应头。
     :returns: Content-Type 含 text/html 或 application/xml 时返回 True。
     """
-    content_type: str = response.headers.get("content-type", "")
+    content_type: str = headers.get("content-type", "")
     return "text/html" in content_type.lower() or "application/xml" in content_type.lower()
 
 
-def is_image_response(response: Response) -> bool:
+def is_image_response(headers: Headers) -> bool:
     """判断响应是否为图片类型。
 
-    :param response: 响应对象。
+    :param headers: 响应头。
     :returns: Content-Type 含 image 时返回 True。
     """
-    content_type: str = response.headers.get("content-type", "")
+    content_type: str = headers.get("content-type", "")
     return "image" in content_type.lower()
 
 
-def is_download_response(response: Response) -> bool:
+def is_download_response(headers: Headers) -> bool:
     """判断响应是否为附件下载（Content-Disposition 含 attachment）。
 
-    :param response: 响应对象。
+    :param headers: 响应头。
     :returns: 为附件下载时返回 True。
     """
-    content_disposition: str = response.headers.get("content-disposition", "")
+    content_disposition: str = headers.get("content-disposition", "")
     return "attachment" in content_disposition.lower()
 
 
-def is_longtext_response(response: Response) -> bool:
-    """判断响应体是否超过 102400 字节（用于决定是否截断审计日志中的响应体）。
+class BodyCapture:
+    """
+    有上限的报文体旁路缓冲区。
 
-    :param response: 响应对象。
-    :returns: Content-Length 大于 5000 时返回 True。
+    报文块原样转发给下游/客户端，此处仅保留前 limit 个字节用于审计，
+    超出部分只计数并在渲染时标记为截断。
     """
-    content_length: int = response.headers.get("content-length", 0)
-    return int(content_length) > 102400
 
+    __slots__ = ("limit", "size", "_chunks", "_captured")
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.size = 0
+        self._chunks: List[bytes] = []
+        self._captured = 0
+
+    @property
+    def truncated(self) -> bool:
+        return self.size > self._captured
+
+    def feed(self, chunk: bytes) -> None:
+        if not chunk:
+            return
+        self.size += len(chunk)
+        remaining = self.limit - self._captured
+        if remaining <= 0:
+            return
+        if len(chunk) > remaining:
+            chunk = chunk[:remaining]
+        self._chunks.append(chunk)
+        self._captured += len(chunk)
+
+    def getvalue(self) -> bytes:
+        return b"".join(self._chunks)
+
+    def render(self) -> str:
+        text: str = self.getvalue().decode("utf-8", errors="ignore")
+        if self.truncated:
+            text += f"...<TRUNCATED {self.size - self._captured} BYTES>"
+        return text
+
+
+def _summarize_multipart(body_prefix: bytes) -> Dict[str, Any]:
+    """从已捕获的 multipart 报文前缀中提取字段与文件信息（不解析文件内容）。"""
+    form_data: Dict[str, Any] = {}
+    for name, filename, content_type in _MULTIPART_PART_PATTERN.findall(body_prefix):
+        field_name = name.decode("utf-8", errors="ignore")
+        if filename:
+            form_data[field_name] = {
+                "filename": filename.decode("utf-8", errors="ignore"),
+                "content_type": content_type.decode("utf-8", errors="ignore") or None,
+            }
+        else:
+            form_data[field_name] = "<FORM FIELD>"
+    return form_data
 
-async def logging_middleware(request: Request, call_next):
-    """记录请求与响应摘要、耗时，并写入审计表；对上传/下载/大响应体做特殊处理。
 
-    :param request: 当前请求。
-    :param call_next: 下一层 ASGI 可调用对象。
-    :returns: 下游返回的 Response。
-    """
-    # 接口服务时间
-    start_time = time.time()
-    request_time: str = time.strftime(GLOBAL_CONFIG.DATETIME_FORMAT2, time.localtime(start_time))
-
-    # 变量初始化
-    request_body, response_body = b'', b''
-
-    # 读取并保存原始请求体，重置请求流以便后续处理
-    original_request_body: bytes = await request.body()
-    request._body = original_request_body
-    request._stream = BytesIO(original_request_body)
-
-    # 判断是否为文件上传请求
-    is_upload: bool = is_upload_request(request)
-    if is_upload:
-        form_data: Dict[str, Any] = {}
-        original_form_data: FormData = await request.form()
-        # 提取字段和文件信息
-        for field_name, field_value in original_form_data.items():
-            if hasattr(field_value, 'file'):
-                form_data[field_name] = {
-                    "filename": field_value.filename,
-                    "content_type": field_value.content_type,
-                    "size": field_value.size
-                }
-            else:
-                form_data[field_name] = field_value
-
-        # 重置流的位置到开头，确保后续处理能正确读取
-        request_body = orjson.dumps(form_data)
-        request._stream.seek(0)
-
-    # 记录请求信息
-    request_method: str = request.method
-    request_router: str = request.url.path
-    request_header: dict = dict(request.headers)
-    if "referer" in request_header and request_header["referer"]:
+def _parse_envelope(body: bytes, complete: bool) -> Tuple[str, str]:
+    """解析统一响应体中的 code/message；截断时退化为前缀正则匹配。"""
+    if complete:
         try:
-            request_header["referer"] = unquote(request_header["referer"])
-        except:
+            _response = orjson.loads(body)
+            if isinstance(_response, dict):
+                return str(_response.get("code", "") or ""), str(_response.get("message", "") or "")
+        except orjson.JSONDecodeError:
             pass
-    request_client: str = request.client.host if request.client else "127.0.0.1"
-    request_tags: str = ROUTER_TAGS.get(request_router or "未定义", "未定义")
-    request_summary: str = ROUTER_SUMMARY.get(request_router or "未定义", "未定义")
-    request_body: bytes = request_body if is_upload else original_request_body.decode("utf-8", errors="ignore")
-    request_params: str = unquote(request.query_params.__str__())
-
-    # 请求流传递并获取响应
-    response = await call_next(request)
-
-    # 判断是否管控响应
-    is_download: bool = is_download_response(response)
-    is_html: bool = is_html_response(response)
-    is_image: bool = is_image_response(response)
-    is_longtext: bool = is_longtext_response(response)
-
-    response_header: dict = dict(response.headers)
-
-    # 路由排除（静态文件&OpenApi文档）
-    if not request_router.startswith("/static/") and request_router not in (
-            '/',
-            '/base/audit/list',
-            PROJECT_CONFIG.APP_DOCS_URL,
-            PROJECT_CONFIG.APP_REDOC_URL,
-            PROJECT_CONFIG.APP_OPENAPI_URL,
-    ):
-        # 消费响应体
-        if is_download:
-            response_body: bytes = b"<FILE DOWNLOAD>"
-        elif is_html:
-            response_body: bytes = b"<HTML CONTENT>"
-        elif is_image:
-            response_body: bytes = b"<IMAGE CONTENT>"
-        elif is_longtext:
-            response_body: bytes = b"<LONGTEXT CONTENT>"
-        else:
-            body_chunks = []
-            async for chunk in response.body_iterator:
-                body_chunks.append(chunk)
-
-            response_body: str = b"".join(body_chunks).decode("utf-8", errors="ignore")
-
-            # 重置响应体
-            response = Response(
-                content=response_body,
-                status_code=response.status_code,
-                headers=response_header,
-                media_type=response.media_type
-            )
+    code_match = _ENVELOPE_CODE_PATTERN.search(body)
+    message_match = _ENVELOPE_MESSAGE_PATTERN.search(body)
+    code: str = code_match.group(1).decode("utf-8", errors="ignore") if code_match else ""
+    message: str = ""
+    if message_match:
+        try:
+            message = orjson.loads(b'"' + message_match.group(1) + b'"')
+        except orjson.JSONDecodeError:
+            message = message_match.group(1).decode("utf-8", errors="ignore")
+    return code, message
+
+
+class AuditCapture:
+    """
+    单次请求的审计采集器。
+
+    通过包装 receive/send 旁路复制请求体与响应体：报文块产生即转发给下游与客户端，
+    审计记录最多保留 capture_limit 个字节，超出部分标记为截断；不再整体缓冲响应体，
+    流式响应保持流式。请求结束后由 finish() 组装审计记录并交由后台写入器批量落库。
+
+    采集方式（mode）由路由审计策略决定：
+    - FULL：完整采集请求体与响应体；
+    - METADATA：不采集请求体，响应体只保留前 _METADATA_CAPTURE_LIMIT 个字节用于解析响应代码，不记录报文；
+    - ERRORS：完整采集，请求结束时仅错误请求（HTTP 状态码 >= 400 或响应代码非成功）入库。
+    """
+
+    def __init__(self, request: Request, capture_limit: int, mode: AuditMode = AuditMode.FULL):
+        self.request = request
+        self.mode = mode
+        # 接口服务时间（耗时按单调时钟计算）
+        self.start_time = time.time()
+        self.start_counter = time.perf_counter()
+        metadata_only: bool = mode == AuditMode.METADATA
+        self.request_capture = BodyCapture(0 if metadata_only else capture_limit)
+        self.response_capture = BodyCapture(_METADATA_CAPTURE_LIMIT if metadata_only else capture_limit)
+        self.response_status: int = 0
+        self.response_code: str = ""
+        self.response_headers: Optional[Headers] = None
+        self.response_placeholder: Optional[str] = None
+
+    @staticmethod
+    def is_excluded(request_router: str) -> bool:
+        """路由排除（静态文件&OpenApi文档）"""
+        return request_router.startswith("/static/") or request_router in _EXCLUDED_ROUTERS
+
+    def wrap(self, receive: Receive, send: Send) -> Tuple[Receive, Send]:
+        """返回旁路采集请求体/响应体的 receive 与 send。"""
+
+        async def receive_wrapper() -> Message:
+            message = await receive()
+            if message["type"] == "http.request":
+                self.request_capture.feed(message.get("body", b""))
+            return message
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                self.response_status = message.get("status", 0)
+                response_headers = Headers(raw=message.get("headers", []))
+                self.response_headers = response_headers
+                # 判断是否管控响应
+                if is_download_response(response_headers):
+                    self.response_placeholder = "<FILE DOWNLOAD>"
+                elif is_html_response(response_headers):
+                    self.response_placeholder = "<HTML CONTENT>"
+                elif is_image_response(response_headers):
+                    self.response_placeholder = "<IMAGE CONTENT>"
+            elif message["type"] == "http.response.body" and self.response_placeholder is None:
+                self.response_capture.feed(message.get("body", b""))
+            await send(message)
+
+        # 仅元数据采集时不旁路请求体
+        return (receive if self.mode == AuditMode.METADATA else receive_wrapper), send_wrapper
+
+    def is_error(self, response_code: str) -> bool:
+        """HTTP 状态码 >= 400 或统一响应体的响应代码非成功时视为错误请求。"""
+        return self.response_status >= 400 or bool(response_code and response_code != Code.CODE200.value)
+
+    async def finish(self) -> Optional[Dict[str, Any]]:
+        """
+        组装审计记录并提交给后台写入器，返回审计记录（供访问日志复用）；
+        仅错误采集时非错误请求直接丢弃，返回 None。
+        """
+        request = self.request
+        request_time: datetime = datetime.fromtimestamp(self.start_time)
+        request_router: str = request.url.path
 
         # 接口服务结束时间
-        end_time = time.time()
-        response_time: str = time.strftime(GLOBAL_CONFIG.DATETIME_FORMAT2, time.localtime(end_time))
-        response_elapsed = f"{end_time - start_time:.4f}s"
+        response_elapsed: int = int((time.perf_counter() - self.start_counter) * 1000000)
+        response_time: datetime = request_time + timedelta(microseconds=response_elapsed)
+
+        # 记录响应信息
+        response_code, response_message = "", ""
+        if self.response_placeholder is None:
+            response_code, response_message = _parse_envelope(
+                self.response_capture.getvalue(), complete=not self.response_capture.truncated
+            )
+        self.response_code = response_code[:16]
+        if self.mode == AuditMode.ERRORS and not self.is_error(response_code):
+            return None
+
+        # 记录请求信息
+        request_params: str = unquote(request.query_params.__str__())
+        if self.mode == AuditMode.METADATA:
+            request_body: str = ""
+        elif is_upload_request(request_router, request.headers.get("content-type", "")):
+            request_body: str = orjson.dumps(_summarize_multipart(self.request_capture.getvalue())).decode("utf-8")
+        else:
+            request_body: str = self.request_capture.render()
+        request_header: dict = dict(request.headers)
+        if "referer" in request_header and request_header["referer"]:
+            try:
+                request_header["referer"] = unquote(request_header["referer"])
+            except:
+                pass
+        request_client: str = request.client.host if request.client else "127.0.0.1"
+        response_header: dict = dict(self.response_headers or {})
 
         # 记录日志
         audit_log: Dict[str, Any] = {
             "request_time": request_time,
-            "request_tags": request_tags,
-            "request_summary": request_summary,
-            "request_method": request_method,
+            "request_tags": ROUTER_TAGS.get(request_router or "未定义", "未定义"),
+            "request_summary": ROUTER_SUMMARY.get(request_router or "未定义", "未定义"),
+            "request_method": request.method,
             "request_router": request_router,
             "request_client": request_client,
             "request_header": request_header,
@@ -188,45 +280,25 @@ async def logging_middleware(request: Request, call_next):
             "response_header": response_header,
             "response_elapsed": response_elapsed
         }
-        if isinstance(response_body, str):
-            _response = orjson.loads(response_body)
-            audit_log["response_code"] = _response.get("code", "")
-            audit_log["response_message"] = _response.get("message", "")[:512]
-            audit_log["response_params"] = response_body
-            del _response
-
-        request_message: str = f"\n> > > > > > > > > > > > > > > > > > > >\n" \
-                               f"请求时间：{audit_log.get('request_time')}\n" \
-                               f"请求模块：{audit_log.get('request_tags')}\n" \
-                               f"请求接口：{audit_log.get('request_summary')}\n" \
-                               f"请求方式：{audit_log.get('request_method')}\n" \
-                               f"请求路由：{audit_log.get('request_router')}\n" \
-                               f"请求来源：{audit_log.get('request_client')}\n" \
-                               f"请求头部：{audit_log.get('request_header')}\n" \
-                               f"请求参数：{audit_log.get('request_params')}\n" \
-                               f"响应头部：{audit_log.get('response_header')}\n" \
-                               f"响应代码：{audit_log.get('response_code')}\n" \
-                               f"响应消息：{audit_log.get('response_message')}\n" \
-                               f"响应参数：{audit_log.get('response_params')}\n" \
-                               f"响应时间：{audit_log.get('response_time')}\n" \
-                               f"响应耗时：{audit_log.get('response_elapsed')}\n" \
-                               f"< < < < < < < < < < < < < < < < < < < < "
-
-        LOGGER.info(request_message)
+        if self.response_placeholder is None:
+            audit_log["response_code"] = response_code[:16]
+            audit_log["response_message"] = response_message[:512]
+            audit_log["response_params"] = "<METADATA ONLY>" if self.mode == AuditMode.METADATA else self.response_capture.render()
+        else:
+            audit_log["response_params"] = self.response_placeholder
 
         try:
-            # 获取用户信息
-            user_obj: Optional[User] = None
+            # 获取用户信息：优先复用认证阶段已解析的用户，白名单接口携带 Token 时才单独解析
+            user_obj: Optional[AuthPrincipal] = getattr(request.state, "user", None)
             token = request.headers.get("token")
-            if token:
-                user_obj: User = await AuthControl.is_authed(token)
+            if user_obj is None and token:
+                user_obj = await AuthControl.is_authed(token)
             audit_log["user_id"] = user_obj.id if user_obj else 0
             audit_log["username"] = user_obj.username if user_obj else ""
         except Exception as e:
             audit_log["user_id"] = 0
             audit_log["username"] = ""
 
-        # 审计落库
-        await Audit.create(**audit_log)
-
-    return response
+        # 审计入队，由后台写入器批量落库
+        AUDIT_WRITER.submit(audit_log)
+        return audit_log
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""
+@Author  : yangkai
+@Email   : 807440781@qq.com
+@Project : Krun
+@Module  : audit_policy.py
+@DateTime: 2026/6/24
+
+审计日志按路由/标签的采集策略。
+
+策略写法（字符串）：full | metadata | sampled:<百分比> | errors | off，例如 "sampled:10" 表示按 10% 采样。
+每个路由的策略在应用启动时从 APIRoute 元数据一次性解析，优先级从高到低：
+1. 配置 AUDIT_ROUTE_POLICIES：键为 "METHOD /path" 或 "/path"（匹配全部请求方式），便于运维不改代码调整；
+2. 路由声明：openapi_extra=audit_policy(AuditMode.METADATA)，即 OpenAPI 扩展字段 x-audit-policy；
+3. 配置 AUDIT_TAG_POLICIES：键为路由标签，路由有多个标签时取第一个配置过的标签；
+4. 配置 AUDIT_DEFAULT_POLICY。
+请求时按 (请求方式, 路径) 查表，带路径参数的路由按路由正则逐个匹配。
+"""
+import random
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Pattern, Tuple, Union
+
+from fastapi.routing import APIRoute
+
+from configure import PROJECT_CONFIG, LOGGER
+from enums import AuditMode
+
+# 路由声明策略使用的 OpenAPI 扩展字段
+AUDIT_POLICY_KEY = "x-audit-policy"
+
+
+class AuditPolicy(NamedTuple):
+    """审计采集策略：采集方式与采样百分比（仅 sampled 使用）"""
+    mode: AuditMode
+    sample_rate: float = 100.0
+
+    def __str__(self) -> str:
+        if self.mode == AuditMode.SAMPLED:
+            return f"{self.mode.value}:{self.sample_rate:g}"
+        return self.mode.value
+
+    @classmethod
+    def parse(cls, value: Union[str, "AuditPolicy"]) -> "AuditPolicy":
+        """解析策略字符串，格式错误时抛出 ValueError。"""
+        if isinstance(value, AuditPolicy):
+            return value
+        mode, _, rate = str(value).strip().lower().partition(":")
+        if mode not in AuditMode.get_members(only_value=True):
+            raise ValueError(f"不支持的审计策略: {value}, 可选: {AuditMode.get_members(only_value=True)}")
+        if AuditMode(mode) != AuditMode.SAMPLED:
+            if rate:
+                raise ValueError(f"审计策略 {mode} 不支持采样比例: {value}")
+            return cls(AuditMode(mode))
+        try:
+            sample_rate = float(rate)
+        except ValueError:
+            raise ValueError(f"审计采样策略需指定百分比, 例如 sampled:10, 当前: {value}")
+        if not 0 <= sample_rate <= 100:
+            raise ValueError(f"审计采样百分比需在 0~100 之间: {value}")
+        return cls(AuditMode.SAMPLED, sample_rate)
+
+    def capture_mode(self) -> Optional[AuditMode]:
+        """本次请求的实际采集方式：sampled 按比例决定完整采集或不记录，不记录时返回 None。"""
+        if self.mode == AuditMode.OFF:
+            return None
+        if self.mode == AuditMode.SAMPLED:
+            return AuditMode.FULL if random.random() * 100 < self.sample_rate else None
+        return self.mode
+
+
+def audit_policy(mode: AuditMode, sample_rate: Optional[float] = None) -> Dict[str, str]:
+    """
+    生成路由声明用的 openapi_extra，例如：
+        @audit.get("/list", openapi_extra=audit_policy(AuditMode.OFF))
+        @audit.get("/recent", openapi_extra=audit_policy(AuditMode.SAMPLED, 10))
+    """
+    text = mode.value if sample_rate is None else f"{mode.value}:{sample_rate:g}"
+    return {AUDIT_POLICY_KEY: str(AuditPolicy.parse(text))}
+
+
+class AuditPolicyRegistry:
+    """
+    路由审计策略表（每个 worker 进程一个实例，lifespan 启动阶段调用 load() 填充）。
+
+    使用方式：
+        AUDIT_POLICY.load(app.routes)                                   # lifespan 启动阶段
+        mode = AUDIT_POLICY.capture_mode("GET", "/base/audit/recent")  # 请求时，返回 None 表示不记录
+    """
+
+    def __init__(
+            self,
+            default: str = "full",
+            route_policies: Optional[Dict[str, str]] = None,
+            tag_policies: Optional[Dict[str, str]] = None,
+    ):
+        """
+        :param default: 默认策略
+        :param route_policies: 按路由配置的策略，键为 "METHOD /path" 或 "/path"
+        :param tag_policies: 按路由标签配置的策略
+        """
+        self.default = AuditPolicy.parse(default)
+        self.route_policies: Dict[str, AuditPolicy] = {
+            self._route_key(*key.split()) if len(key.split()) == 2 else key.strip(): AuditPolicy.parse(value)
+            for key, value in (route_policies or {}).items()
+        }
+        self.tag_policies: Dict[str, AuditPolicy] = {
+            key: AuditPolicy.parse(value) for key, value in (tag_policies or {}).items()
+        }
+        # 静态路由：(请求方式, 路径) -> 策略
+        self._static: Dict[Tuple[str, str], AuditPolicy] = {}
+        # 带路径参数的路由：(请求方式, 路由路径, 路由正则, 策略)
+        self._dynamic: List[Tuple[str, str, Pattern, AuditPolicy]] = []
+        # 运行指标
+        self.captured: int = 0
+        self.skipped: int = 0
+
+    @staticmethod
+    def _route_key(method: str, path: str) -> str:
+        return f"{method.upper()} {path}"
+
+    def _resolve(self, route: APIRoute, method: str) -> AuditPolicy:
+        for key in (self._route_key(method, route.path), route.path):
+            if key in self.route_policies:
+                return self.route_policies[key]
+        declared = (route.openapi_extra or {}).get(AUDIT_POLICY_KEY)
+        if declared:
+            return AuditPolicy.parse(declared)
+        for tag in route.tags or ():
+            tag = getattr(tag, "value", tag)
+            if tag in self.tag_policies:
+                return self.tag_policies[tag]
+        return self.default
+
+    def load(self, routes: Iterable[Any]) -> None:
+        """从应用路由解析每个路由的策略（重复调用会整体替换）。"""
+        static: Dict[Tuple[str, str], AuditPolicy] = {}
+        dynamic: List[Tuple[str, str, Pattern, AuditPolicy]] = []
+        for route in routes:
+            if not isinstance(route, APIRoute):
+                continue
+            for method in route.methods or ():
+                policy = self._resolve(route, method)
+                if route.param_convertors:
+                    dynamic.append((method, route.path, route.path_regex, policy))
+                else:
+                    static[(method, route.path)] = policy
+        self._static, self._dynamic = static, dynamic
+        counts: Dict[str, int] = {}
+        for policy in list(static.values()) + [item[3] for item in dynamic]:
+            counts[str(policy)] = counts.get(str(policy), 0) + 1
+        LOGGER.info(f"审计策略已加载: 默认={self.default}, 路由策略分布={counts}")
+
+    def resolve(self, method: str, path: str) -> AuditPolicy:
+        """查询请求对应的策略，未匹配到路由（404、静态文件等）时返回默认策略。"""
+        policy = self._static.get((method, path))
+        if policy is not None:
+            return policy
+        for route_method, _, path_regex, policy in self._dynamic:
+            if route_method == method and path_regex.match(path):
+                return policy
+        return self.default
+
+    def capture_mode(self, method: str, path: str) -> Optional[AuditMode]:
+        """本次请求的实际采集方式，返回 None 表示不记录。"""
+        mode = self.resolve(method, path).capture_mode()
+        if mode is None:
+            self.skipped += 1
+        else:
+            self.captured += 1
+        return mode
+
+    def stats(self) -> Dict[str, Any]:
+        policies: Dict[str, str] = {f"{method} {path}": str(policy) for (method, path), policy in self._static.items()}
+        policies.update({f"{method} {path}": str(policy) for method, path, _, policy in self._dynamic})
+        return {
+            "default": str(self.default),
+            "captured": self.captured,
+            "skipped": self.skipped,
+            "routes": {key: value for key, value in policies.items() if value != str(self.default)},
+        }
+
+
+AUDIT_POLICY = AuditPolicyRegistry(
+    default=PROJECT_CONFIG.AUDIT_DEFAULT_POLICY,
+    route_policies=PROJECT_CONFIG.AUDIT_ROUTE_POLICIES,
+    tag_policies=PROJECT_CONFIG.AUDIT_TAG_POLICIES,
+)
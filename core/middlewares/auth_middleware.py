@@ -8,9 +8,10 @@
 """
 from __future__ import annotations
 
-from typing import Iterable
+from typing import Dict, FrozenSet, Iterable, Optional, Set, Tuple
 
-from fastapi import Request
+from starlette.requests import Request
+from starlette.responses import Response
 
 from configure import PROJECT_CONFIG
 from core.responses import UnauthorizedResponse
@@ -24,82 +25,108 @@ def _normalize_path(path: str) -> str:
     return path
 
 
-def _rule_matches(rule: str, request_method: str, request_path: str) -> bool:
+class _PrefixNode:
+    __slots__ = ("children", "methods")
+
+    def __init__(self):
+        self.children: Dict[str, "_PrefixNode"] = {}
+        self.methods: FrozenSet[str] = frozenset()
+
+
+class WhitelistMatcher:
     """
+    预编译的白名单匹配器（启动时编译一次）。
+
     rule format:
-      - "METHOD /path" (exact)
-      - "METHOD /path/*" (prefix)
+      - "METHOD /path" (exact)      -> path -> methods 哈希表
+      - "METHOD /path/*" (prefix)   -> 按字符构建的前缀树
       - METHOD can be "*" to match any
-    """
-    rule = rule.strip()
-    if not rule:
-        return False
-
-    parts = rule.split(" ", 1)
-    if len(parts) != 2:
-        return False
 
-    rule_method, rule_path_pattern = parts
-    rule_method = rule_method.upper()
-
-    if rule_method != "*" and rule_method != request_method:
-        return False
+    匹配时精确规则为一次哈希查找，前缀规则沿请求路径逐字符下探，复杂度 O(路径长度)，
+    与规则数量无关。
+    """
 
-    rule_path_pattern = _normalize_path(rule_path_pattern)
+    def __init__(self, rules: Iterable[str]):
+        exact: Dict[str, Set[str]] = {}
+        self._root = _PrefixNode()
+        for rule in rules:
+            parsed = self._parse(rule)
+            if parsed is None:
+                continue
+            rule_method, rule_path_pattern, is_prefix = parsed
+            if is_prefix:
+                node = self._root
+                for char in rule_path_pattern:
+                    node = node.children.setdefault(char, _PrefixNode())
+                node.methods = node.methods | {rule_method}
+            else:
+                exact.setdefault(rule_path_pattern, set()).add(rule_method)
+        self._exact: Dict[str, FrozenSet[str]] = {path: frozenset(methods) for path, methods in exact.items()}
+
+    @staticmethod
+    def _parse(rule: str) -> Optional[Tuple[str, str, bool]]:
+        parts = rule.strip().split(" ", 1)
+        if len(parts) != 2:
+            return None
+        rule_method, rule_path_pattern = parts[0].upper(), _normalize_path(parts[1].strip())
+        # prefix match: /static/* => /static/<anything>
+        if rule_path_pattern.endswith("/*"):
+            return rule_method, _normalize_path(rule_path_pattern[: -len("/*")]), True
+        return rule_method, rule_path_pattern, False
+
+    @staticmethod
+    def _method_allowed(methods: FrozenSet[str], request_method: str) -> bool:
+        return request_method in methods or "*" in methods
+
+    def match(self, request_method: str, request_path: str) -> bool:
+        """
+        :param request_method: 大写的请求方法
+        :param request_path: 经 _normalize_path 处理的请求路径
+        """
+        methods = self._exact.get(request_path)
+        if methods is not None and self._method_allowed(methods, request_method):
+            return True
 
-    # prefix match: /static/* => /static/<anything>
-    if rule_path_pattern.endswith("/*"):
-        base = rule_path_pattern[: -len("/*")]
-        base = _normalize_path(base)
-        return request_path == base or request_path.startswith(base + "/")
+        # 前缀规则 /base/* 命中 /base 与 /base/<anything>
+        node = self._root
+        for char in request_path:
+            if char == "/" and node.methods and self._method_allowed(node.methods, request_method):
+                return True
+            node = node.children.get(char)
+            if node is None:
+                return False
+        return bool(node.methods) and self._method_allowed(node.methods, request_method)
 
-    # exact match
-    return request_path == rule_path_pattern
 
+# 白名单在导入时编译一次，规则见 ProjectConfig.AUTH_WHITELIST
+_WHITELIST_MATCHER = WhitelistMatcher(PROJECT_CONFIG.AUTH_WHITELIST_RULES)
 
-def _is_whitelisted(whitelist: Iterable[str], request_method: str, request_path: str) -> bool:
-    for rule in whitelist:
-        if _rule_matches(rule, request_method=request_method, request_path=request_path):
-            return True
-    return False
 
+async def authenticate_request(request: Request) -> Optional[Response]:
+    """
+    请求鉴权：白名单与 CORS 预检直接放行，其余请求校验 Token。
 
-async def auth_middleware(request: Request, call_next):
+    :param request: 当前请求
+    :return: 放行返回 None；鉴权失败返回应直接下发给客户端的 401 响应
+    """
     request_method = request.method.upper()
     request_path = _normalize_path(request.url.path)
 
     # 允许CORS前置请求
     if request_method == "OPTIONS":
-        return await call_next(request)
-
-    whitelist = [
-        # login
-        "POST /user/create",
-        "POST /base/auth/access_token",
-
-        # root
-        "GET /",
-
-        # openapi/docs
-        f"GET {PROJECT_CONFIG.APP_DOCS_URL}",
-        f"GET {PROJECT_CONFIG.APP_REDOC_URL}",
-        f"GET {PROJECT_CONFIG.APP_OPENAPI_URL}",
-
-        # static assets
-        "* /static/*",
-    ]
+        return None
 
-    if _is_whitelisted(whitelist=whitelist, request_method=request_method, request_path=request_path):
-        return await call_next(request)
+    if _WHITELIST_MATCHER.match(request_method, request_path):
+        return None
 
     token = request.headers.get("token")
     if not token:
         return UnauthorizedResponse(message="请求服务鉴权失败, 请携带有效 Token 进行访问")
 
-    # 对( RBAC发生在依赖权限中)进行认证
+    # 对( RBAC发生在依赖权限中)进行认证，解析出的用户挂载到 request.state 供后续依赖与审计复用
     try:
-        await AuthControl.is_authed(token)
+        request.state.user = await AuthControl.is_authed(token)
     except Exception as e:
         # 统一以未认证返回，避免调试模式下泄露异常细节
         return UnauthorizedResponse(message="请求服务鉴权已过期, 请重新登录获取有效 Token 后进行访问")
-    return await call_next(request)
+    return None
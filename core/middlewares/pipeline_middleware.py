@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+@Author  : yangkai
+@Email   : 807440781@qq.com
+@Project : Krun
+@Module  : pipeline_middleware.py
+@DateTime: 2026/6/12
+
+请求处理管道（纯 ASGI 中间件）。
+
+将原先三层 BaseHTTPMiddleware 风格的函数中间件（日志追溯链 -> 审计日志 -> 认证拦截）
+合并为单个 ASGI 中间件，按相同顺序在同一次调用内完成，避免每层 call_next 带来的
+额外任务、内存流与响应重建开销。
+"""
+from starlette.requests import Request
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from common.request_context import clear_trace_context, enter_server_span
+from configure import PROJECT_CONFIG
+from services import CTX_AUTH_PRINCIPAL
+from .access_log import AccessLog, AccessProbe
+from .app_middleware import AuditCapture
+from .audit_policy import AUDIT_POLICY
+from .auth_middleware import authenticate_request
+from .request_context_middleware import trace_send
+
+
+class RequestPipelineMiddleware:
+    """
+    单层请求处理管道，处理顺序与原中间件栈一致：
+
+    1. 日志追溯链：分配 SpanID，响应头回传 X-Trace-ID / X-Span-ID / X-Parent-Span-ID；
+    2. 审计日志：按路由审计策略旁路采集请求/响应体（含认证拦截产生的 401 响应），不记录追溯链响应头；
+    3. 认证拦截：白名单放行，其余请求校验 Token，失败直接返回 401；
+    4. 访问日志：每个请求结束时输出一行（与审计采集策略无关），采集了审计记录时复用审计记录；
+       下游抛出异常且未发送响应时按 500 记录。
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.capture_limit: int = PROJECT_CONFIG.AUDIT_BODY_CAPTURE_LIMIT
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request = Request(scope, receive)
+        snapshot, tokens = enter_server_span(request)
+        # 认证主体按请求隔离：认证、路由依赖与审计共享同一次解析结果
+        principal_token = CTX_AUTH_PRINCIPAL.set(None)
+        try:
+            send = trace_send(send, snapshot)
+            probe = AccessProbe(request)
+            send = probe.wrap(send)
+
+            audit = None
+            if not AuditCapture.is_excluded(request.url.path):
+                mode = AUDIT_POLICY.capture_mode(request.method, request.url.path)
+                if mode is not None:
+                    audit = AuditCapture(request, self.capture_limit, mode)
+                    receive, send = audit.wrap(receive, send)
+
+            audit_log = None
+            try:
+                rejected = await authenticate_request(request)
+                if rejected is not None:
+                    await rejected(scope, receive, send)
+                else:
+                    await self.app(scope, receive, send)
+
+                if audit is not None:
+                    audit_log = await audit.finish()
+            finally:
+                if audit_log is None:
+                    audit_log = probe.record(audit.response_code if audit is not None else "")
+                AccessLog(audit_log, probe.status or 500).emit()
+        finally:
+            CTX_AUTH_PRINCIPAL.reset(principal_token)
+            clear_trace_context(tokens)
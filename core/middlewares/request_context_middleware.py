@@ -6,23 +6,24 @@
 @Module  : request_context_middleware.py
 @DateTime: 2026/5/29
 """
-from fastapi import Request
+from starlette.datastructures import MutableHeaders
+from starlette.types import Message, Send
 
-from common.request_context import (
-    apply_response_trace_headers,
-    clear_trace_context,
-    enter_server_span,
-)
+from common.request_context import TraceSnapshot, apply_response_trace_headers
 
 
-async def request_context_middleware(request: Request, call_next):
+def trace_send(send: Send, snapshot: TraceSnapshot) -> Send:
     """
-    最外层中间件：解析 X-Trace-ID（可选），为本次入站 HTTP 分配 SpanID，响应头回传 X-Span-ID。
+    包装 send：在响应头中回传 X-Trace-ID / X-Span-ID / X-Parent-Span-ID。
+
+    :param send: 下一层 send
+    :param snapshot: 本次入站请求的追踪快照（由 enter_server_span 生成）
+    :return: 包装后的 send
     """
-    snapshot, tokens = enter_server_span(request)
-    try:
-        response = await call_next(request)
-        apply_response_trace_headers(response.headers, snapshot)
-        return response
-    finally:
-        clear_trace_context(tokens)
+
+    async def send_wrapper(message: Message) -> None:
+        if message["type"] == "http.response.start":
+            apply_response_trace_headers(MutableHeaders(scope=message), snapshot)
+        await send(message)
+
+    return send_wrapper
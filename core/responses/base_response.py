@@ -6,16 +6,56 @@
 @Module  : base_response.py
 @DateTime: 2025/1/16 16:14
 """
+from datetime import datetime, date, time, timedelta
+from decimal import Decimal
 from typing import Optional, Union, List, Any, Dict
 
 import orjson
 from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
 from starlette.responses import JSONResponse
 
+from configure.global_config import GLOBAL_CONFIG
 from enums import Code, Status, Message
 
+# 未传入 next_cursor 时不在响应体中输出该字段
+_UNSET: Any = object()
+
+# datetime 交由 default 按全局格式输出；允许 int 等非字符串键（与 jsonable_encoder 行为一致）
+_ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+
+def _orjson_default(obj: Any) -> Any:
+    """
+    orjson 不支持的类型的序列化规则（与 ScaffoldModel.to_dict 的格式保持一致）：
+    datetime/date/time 按 GLOBAL_CONFIG 格式化，Decimal/timedelta 转字符串，
+    Pydantic 模型转字典，其余类型回退到 jsonable_encoder。
+    UUID、Enum、dataclass 由 orjson 原生处理。
+    """
+    if isinstance(obj, datetime):
+        return obj.strftime(GLOBAL_CONFIG.DATETIME_FORMAT2)
+    if isinstance(obj, date):
+        return obj.strftime(GLOBAL_CONFIG.DATE_FORMAT)
+    if isinstance(obj, time):
+        return obj.strftime(GLOBAL_CONFIG.TIME_FORMAT)
+    if isinstance(obj, Decimal):
+        return str(obj)
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, bytes):
+        return obj.decode("utf-8")
+    if isinstance(obj, timedelta):
+        return str(obj)
+    return jsonable_encoder(obj)
+
 
 class BaseResponse(JSONResponse):
+    """
+    统一响应体 {code,status,message,data,total}，直接使用 orjson 一次性序列化，
+    不再先经 jsonable_encoder 遍历转换、再由标准库 json 二次遍历。
+    """
     http_status_code = 200
     code: Code = Code.CODE200
     status: Status = Status.SUCCESS
@@ -29,7 +69,8 @@ class BaseResponse(JSONResponse):
                  status: Optional[Status] = None,
                  message: Optional[str] = None,
                  data: Optional[dict] = None,
-                 total: Optional[int] = None, **kwargs):
+                 total: Optional[int] = None,
+                 next_cursor: Optional[str] = _UNSET, **kwargs):
 
         if http_status_code and isinstance(http_status_code, int):
             self.http_status_code = http_status_code
@@ -59,9 +100,19 @@ class BaseResponse(JSONResponse):
             data=data,
             total=total
         )
+        # 游标分页接口额外返回下一页游标（最后一页为 null），普通接口保持原有结构
+        if next_cursor is not _UNSET:
+            resp["next_cursor"] = next_cursor
 
         super(BaseResponse, self).__init__(
             status_code=self.http_status_code,
-            content=jsonable_encoder(resp),
+            content=resp,
             **kwargs
         )
+
+    def render(self, content: Any) -> bytes:
+        try:
+            return orjson.dumps(content, default=_orjson_default, option=_ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            # 超出 orjson 支持范围（如超过 64 位的整数）时回退到原序列化方式
+            return super(BaseResponse, self).render(jsonable_encoder(content))
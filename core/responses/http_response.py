@@ -21,8 +21,8 @@ class SuccessResponse(BaseResponse):
     data = {}
     total = None
 
-    def __init__(self, message: Optional[str] = None, data: DataType = None, total: Optional[int] = None):
-        super(SuccessResponse, self).__init__(message=message, data=data, total=total)
+    def __init__(self, message: Optional[str] = None, data: DataType = None, total: Optional[int] = None, **kwargs):
+        super(SuccessResponse, self).__init__(message=message, data=data, total=total, **kwargs)
 
 
 class FailureResponse(BaseResponse):
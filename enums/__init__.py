@@ -7,13 +7,19 @@
 @DateTime: 2025/1/12 19:39
 """
 from .app_enum import Code, Message, Status
+from .audit_enum import AuditMode
 from .base_error_enum import BaseErrorEnum
 from .http_enum import HTTPMethod
+from .query_enum import CountMode, ConflictMode, MatchMode
 
 __all__ = (
     "Code",
     "Message",
     "Status",
+    "AuditMode",
     "BaseErrorEnum",
     "HTTPMethod",
+    "CountMode",
+    "ConflictMode",
+    "MatchMode",
 )
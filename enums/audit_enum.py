@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+"""
+@Author  : yangkai
+@Email   : 807440781@qq.com
+@Project : Krun
+@Module  : audit_enum.py
+@DateTime: 2026/6/24
+"""
+from enums.base_enum_cls import StringEnum
+
+
+class AuditMode(StringEnum):
+    """
+    审计日志采集方式枚举
+    """
+    FULL = "full"  # 完整采集：请求/响应头部与报文体
+    METADATA = "metadata"  # 仅元数据：不采集请求体与响应体，保留路由、头部、响应代码与耗时
+    SAMPLED = "sampled"  # 按比例采样：命中的请求完整采集，未命中的请求不记录
+    ERRORS = "errors"  # 仅错误：完整采集，仅 HTTP 状态码 >= 400 或响应代码非成功时记录
+    OFF = "off"  # 不记录
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""
+@Author  : yangkai
+@Email   : 807440781@qq.com
+@Project : Krun
+@Module  : query_enum.py
+@DateTime: 2026/6/15
+"""
+from enums.base_enum_cls import StringEnum
+
+
+class CountMode(StringEnum):
+    """
+    分页查询总数统计方式枚举
+    """
+    EXACT = "exact"  # 精确统计：SELECT COUNT(*)
+    NONE = "none"  # 不统计，total 返回 null
+    ESTIMATE = "estimate"  # 估算：取执行计划（EXPLAIN）中的预估行数，不支持时退化为精确统计
+    CAPPED = "capped"  # 封顶统计：最多数到 count_cap + 1 条，返回值大于 count_cap 表示“超过 count_cap 条”
+
+
+class ConflictMode(StringEnum):
+    """
+    批量写入唯一键冲突处理方式枚举
+    """
+    ERROR = "error"  # 不处理：冲突时抛出异常，整批回滚
+    IGNORE = "ignore"  # 忽略：冲突行跳过，保留已存在的记录（MySQL: INSERT IGNORE）
+    UPDATE = "update"  # 更新：冲突行以新值覆盖指定字段（MySQL: ON DUPLICATE KEY UPDATE）
+
+
+class MatchMode(StringEnum):
+    """
+    文本条件匹配方式枚举
+    """
+    CONTAINS = "contains"  # 包含：LIKE '%x%'（不区分大小写），无法使用索引，全表扫描
+    PREFIX = "prefix"  # 前缀：LIKE 'x%'，可使用字段上的 B-Tree 索引
+    EXACT = "exact"  # 精确：= 'x'，可使用字段上的 B-Tree 索引
@@ -46,8 +46,8 @@ class UvicornWorker(_BaseUvicornWorker):
 worker_class = f"{__name__}.UvicornWorker"
 logger_class = f"{__name__}.InterceptGunicornLogger"
 
-# 进程与并发（可按机器 CPU 与业务调整）
-workers = 4
+# 进程与并发（可按机器 CPU 与业务调整；数据库连接池按 worker 数分摊连接预算）
+workers = PROJECT_CONFIG.SERVER_WORKERS
 threads = 4
 bind = f"{PROJECT_CONFIG.SERVER_HOST}:{PROJECT_CONFIG.SERVER_PORT}"
 
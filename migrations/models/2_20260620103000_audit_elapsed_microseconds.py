@@ -0,0 +1,17 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        UPDATE `krun_audit` SET `response_elapsed` = CAST(ROUND(CAST(REPLACE(`response_elapsed`, 's', '') AS DECIMAL(16,6)) * 1000000) AS UNSIGNED);
+        ALTER TABLE `krun_audit` MODIFY COLUMN `response_elapsed` BIGINT NOT NULL  COMMENT '响应耗时(微秒)' DEFAULT 0;
+        ALTER TABLE `krun_audit` ADD INDEX `idx_krun_audit_respons_52b62f` (`response_elapsed`);
+        ALTER TABLE `krun_audit` ADD INDEX `idx_krun_audit_request_020d1a` (`request_router`, `response_elapsed`);"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE `krun_audit` DROP INDEX `idx_krun_audit_request_020d1a`;
+        ALTER TABLE `krun_audit` DROP INDEX `idx_krun_audit_respons_52b62f`;
+        ALTER TABLE `krun_audit` MODIFY COLUMN `response_elapsed` VARCHAR(16) NOT NULL  COMMENT '响应耗时';
+        UPDATE `krun_audit` SET `response_elapsed` = CONCAT(CAST(`response_elapsed` / 1000000 AS DECIMAL(12,4)), 's');"""
@@ -0,0 +1,17 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE TABLE IF NOT EXISTS `krun_audit_search_token` (
+    `id` BIGINT NOT NULL PRIMARY KEY AUTO_INCREMENT COMMENT '主键',
+    `token` VARCHAR(2) NOT NULL  COMMENT '二元组（小写）',
+    `bucket` DATETIME(6) NOT NULL  COMMENT '时间桶起始时间（按 request_time 划分）',
+    UNIQUE KEY `uid_krun_audit__token_c892d0` (`token`, `bucket`),
+    KEY `idx_krun_audit__bucket_6f86d6` (`bucket`)
+) CHARACTER SET utf8mb4 COMMENT='审计日志关键字检索倒排表';"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP TABLE IF EXISTS `krun_audit_search_token`;"""
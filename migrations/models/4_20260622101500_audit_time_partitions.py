@@ -0,0 +1,18 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE `krun_audit` DROP PRIMARY KEY, ADD PRIMARY KEY (`id`, `created_time`);
+        ALTER TABLE `krun_audit` PARTITION BY RANGE COLUMNS(`created_time`) (
+    PARTITION `p_history` VALUES LESS THAN ('2026-06-01 00:00:00'),
+    PARTITION `p202606` VALUES LESS THAN ('2026-07-01 00:00:00'),
+    PARTITION `p202607` VALUES LESS THAN ('2026-08-01 00:00:00'),
+    PARTITION `p_future` VALUES LESS THAN (MAXVALUE)
+);"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE `krun_audit` REMOVE PARTITIONING;
+        ALTER TABLE `krun_audit` DROP PRIMARY KEY, ADD PRIMARY KEY (`id`);"""
@@ -6,16 +6,31 @@
 @Module  : __init__.py
 @DateTime: 2025/1/12 19:38
 """
-from .ctx import CTX_USER_ID
+from .ctx import CTX_USER_ID, CTX_AUTH_PRINCIPAL
+from .token_cache import AuthPrincipal, TOKEN_VERSION_CACHE
 from .dependency import AuthControl, DependAuth
-from .password import verify_password, get_password_hash, generate_password, create_access_token
+from .password import (
+    PASSWORD_HASHER,
+    verify_password,
+    verify_password_async,
+    get_password_hash,
+    get_password_hash_async,
+    generate_password,
+    create_access_token,
+)
 
 __all__ = (
     "CTX_USER_ID",
+    "CTX_AUTH_PRINCIPAL",
+    "AuthPrincipal",
+    "TOKEN_VERSION_CACHE",
     "AuthControl",
     "DependAuth",
+    "PASSWORD_HASHER",
     "verify_password",
+    "verify_password_async",
     "get_password_hash",
+    "get_password_hash_async",
     "generate_password",
     "create_access_token",
 )
@@ -7,5 +7,10 @@
 @DateTime: 2025/2/18 19:03
 """
 import contextvars
+from typing import Any, Optional, Tuple
 
 CTX_USER_ID: contextvars.ContextVar[int] = contextvars.ContextVar("user_id", default=0)
+# 本次请求已解析的认证主体 (token, user)，由中间件与路由依赖共享，避免重复解析 Token 与查询用户
+CTX_AUTH_PRINCIPAL: contextvars.ContextVar[Optional[Tuple[str, Any]]] = contextvars.ContextVar(
+    "auth_principal", default=None
+)
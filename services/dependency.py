@@ -13,12 +13,17 @@ from fastapi import Depends, Header, HTTPException
 
 from applications.user.models.user_model import User
 from configure import PROJECT_CONFIG
-from services import CTX_USER_ID
+from services import CTX_USER_ID, CTX_AUTH_PRINCIPAL
+from services.token_cache import AuthPrincipal, TOKEN_VERSION_CACHE
 
 
 class AuthControl:
     @classmethod
-    async def is_authed(cls, token: str = Header(..., description="token验证")) -> Optional["User"]:
+    async def is_authed(cls, token: str = Header(..., description="token验证")) -> Optional[AuthPrincipal]:
+        # 同一请求内已由中间件/其他依赖解析过相同 Token 时直接复用
+        principal = CTX_AUTH_PRINCIPAL.get()
+        if principal is not None and principal[0] == token:
+            return principal[1]
         try:
             decode_data = jwt.decode(
                 jwt=token,
@@ -26,15 +31,22 @@ class AuthControl:
                 algorithms=PROJECT_CONFIG.AUTH_JWT_ALGORITHM
             )
             user_id = decode_data.get("user_id")
-            user = await User.filter(id=user_id, state__not=1, is_active=True).first()
-            if not user:
-                raise HTTPException(status_code=401, detail="请求服务鉴权失败, 用户状态异常, 请联系管理员后重试")
+            # 优先命中 Token 版本缓存，未命中时查库并回填（缓存仅保存有效用户）
+            user = TOKEN_VERSION_CACHE.get(user_id)
+            if user is None:
+                generation = TOKEN_VERSION_CACHE.generation
+                instance = await User.filter(id=user_id, state__not=1, is_active=True).first()
+                if not instance:
+                    raise HTTPException(status_code=401, detail="请求服务鉴权失败, 用户状态异常, 请联系管理员后重试")
+                user = AuthPrincipal.from_user(instance)
+                TOKEN_VERSION_CACHE.set(user, generation=generation)
 
             token_version = decode_data.get("token_version", 0)
             if token_version != user.token_version:
                 raise HTTPException(status_code=401, detail="请求服务鉴权已过期, 请重新登录获取有效 Token 后进行访问")
 
             CTX_USER_ID.set(int(user_id))
+            CTX_AUTH_PRINCIPAL.set((token, user))
             return user
         except jwt.DecodeError:
             raise HTTPException(status_code=401, detail="请求服务鉴权失败, 请携带有效 Token 进行访问")
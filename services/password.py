@@ -6,6 +6,10 @@
 @Module  : password.py
 @DateTime: 2025/1/18 12:10
 """
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
 import jwt
 from passlib import pwd
 from passlib.context import CryptContext
@@ -16,6 +20,65 @@ from configure import PROJECT_CONFIG
 pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
 
 
+class PasswordHasher:
+    """
+    密码哈希/校验的异步执行器（每个 worker 进程一个实例）。
+
+    argon2 单次计算耗时数十毫秒，直接在协程中调用会阻塞事件循环。此处交由专用的有界线程池执行，
+    并以信号量限制同时提交到线程池的任务数：超出的请求在事件循环中排队（客户端断开时可直接取消），
+    登录高峰不会占满默认线程池，也不会拖慢同一 worker 上的其他请求。
+    """
+
+    def __init__(self, max_workers: int = 4, max_concurrency: int = 8):
+        """
+        :param max_workers: 线程池大小
+        :param max_concurrency: 同时提交到线程池的最大任务数
+        """
+        self.max_workers = max(1, max_workers)
+        self.max_concurrency = max(self.max_workers, max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="password-hash")
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        # 运行指标
+        self.waiting: int = 0
+        self.max_waiting: int = 0
+        self.running: int = 0
+        self.completed: int = 0
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        self.waiting += 1
+        self.max_waiting = max(self.max_waiting, self.waiting)
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.running += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        finally:
+            self.running -= 1
+            self.completed += 1
+            self._semaphore.release()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "workers": self.max_workers,
+            "max_concurrency": self.max_concurrency,
+            "running": self.running,
+            "waiting": self.waiting,
+            "max_waiting": self.max_waiting,
+            "completed": self.completed,
+        }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+PASSWORD_HASHER = PasswordHasher(
+    max_workers=PROJECT_CONFIG.PASSWORD_HASH_WORKERS,
+    max_concurrency=PROJECT_CONFIG.PASSWORD_HASH_MAX_CONCURRENCY,
+)
+
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
@@ -24,6 +87,14 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await PASSWORD_HASHER.run(pwd_context.verify, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    return await PASSWORD_HASHER.run(pwd_context.hash, password)
+
+
 def generate_password() -> str:
     return pwd.genword()
 
@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+"""
+@Author  : yangkai
+@Email   : 807440781@qq.com
+@Project : Krun
+@Module  : token_cache.py
+@DateTime: 2026/6/13
+
+Token 版本缓存。
+
+AuthControl.is_authed 每次请求都需要比对用户当前的 token_version，此处按 user_id
+在进程内缓存 (token_version, state, is_active) 等认证所需字段（LRU + TTL），
+命中时认证不访问数据库。用户被删除、修改/重置密码、登出时由 UserCrud 立即失效，
+并通过失效通道通知其他 worker 进程。
+"""
+import asyncio
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from configure import PROJECT_CONFIG, LOGGER
+
+
+@dataclass(frozen=True)
+class AuthPrincipal:
+    """已认证用户的轻量快照，仅包含认证与审计所需字段。"""
+    id: int
+    username: str
+    token_version: int
+    state: int
+    is_active: bool
+    is_superuser: bool
+
+    @classmethod
+    def from_user(cls, user) -> "AuthPrincipal":
+        return cls(
+            id=user.id,
+            username=user.username,
+            token_version=user.token_version,
+            state=user.state,
+            is_active=bool(user.is_active),
+            is_superuser=bool(user.is_superuser),
+        )
+
+
+class InvalidationChannel(ABC):
+    """
+    跨 worker 失效通知通道。
+
+    publish() 广播需要失效的 user_id，start() 注册回调并开始接收其他进程的通知。
+    shared 表示通道能否跨进程送达：不能跨进程时，多 worker 部署下其他 worker 收不到失效通知。
+    """
+
+    shared: bool = False
+
+    @abstractmethod
+    async def start(self, callback: Callable[[List[int]], None]) -> None:
+        ...
+
+    @abstractmethod
+    async def publish(self, user_ids: List[int]) -> None:
+        ...
+
+    async def stop(self) -> None:
+        pass
+
+
+class LocalInvalidationChannel(InvalidationChannel):
+    """
+    进程内通道：通知同一进程内的全部订阅者（单 worker 部署与测试使用）。
+
+    多个 TokenVersionCache 共用同一个实例即可在单进程内模拟多 worker 的失效广播。
+    """
+
+    def __init__(self):
+        self._subscribers: List[Callable[[List[int]], None]] = []
+
+    async def start(self, callback: Callable[[List[int]], None]) -> None:
+        self._subscribers.append(callback)
+
+    async def publish(self, user_ids: List[int]) -> None:
+        for callback in list(self._subscribers):
+            callback(user_ids)
+
+    async def stop(self) -> None:
+        self._subscribers.clear()
+
+
+class RedisInvalidationChannel(InvalidationChannel):
+    """基于 Redis 发布/订阅的通道，所有 worker 订阅同一频道。"""
+
+    shared: bool = True
+
+    def __init__(self, redis_url: str, channel: str):
+        self.redis_url = redis_url
+        self.channel = channel
+        self._client = None
+        self._pubsub = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, callback: Callable[[List[int]], None]) -> None:
+        try:
+            from redis import asyncio as aioredis
+        except ImportError as e:
+            raise RuntimeError("Token 失效通道为 redis, 但未安装 redis 依赖, 请重新安装项目依赖") from e
+        self._client = aioredis.from_url(self.redis_url)
+        self._pubsub = self._client.pubsub()
+        await self._pubsub.subscribe(self.channel)
+        self._task = asyncio.create_task(self._listen(callback), name="token-invalidation")
+
+    async def _listen(self, callback: Callable[[List[int]], None]) -> None:
+        async for message in self._pubsub.listen():
+            if message.get("type") != "message":
+                continue
+            try:
+                data = message["data"]
+                if isinstance(data, bytes):
+                    data = data.decode("utf-8")
+                callback([int(user_id) for user_id in data.split(",") if user_id])
+            except Exception as e:
+                LOGGER.error(f"Token 失效通知解析失败: {message}, 异常描述: {e}")
+
+    async def publish(self, user_ids: List[int]) -> None:
+        await self._client.publish(self.channel, ",".join(str(user_id) for user_id in user_ids))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+            self._pubsub = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class TokenVersionCache:
+    """
+    user_id -> AuthPrincipal 的 LRU + TTL 缓存（每个 worker 进程一个实例）。
+
+    失效时递增代数（generation）：查询数据库前记录代数，回填时若期间发生过失效则放弃回填，
+    避免并发请求把失效前读到的旧 token_version 写回缓存。
+
+    多 worker 部署默认使用 redis 失效通道（AUTH_TOKEN_INVALIDATION_BACKEND=auto）；显式配置为 local 时缓存不启用：否则一个 worker 处理登出、改密、删除用户后，
+    其他 worker 在 TTL 内仍会接受已吊销的 Token。
+    """
+
+    def __init__(
+            self,
+            max_size: int = 10000,
+            ttl: float = 60.0,
+            enabled: bool = True,
+            channel: Optional[InvalidationChannel] = None,
+            workers: int = 1,
+    ):
+        """
+        :param max_size: 缓存的最大用户数
+        :param ttl: 缓存有效期（秒），失效通知丢失时的兜底
+        :param enabled: 是否启用缓存
+        :param channel: 跨 worker 失效通知通道，默认为进程内通道
+        :param workers: worker 进程数，大于 1 时要求失效通道能跨进程送达
+        """
+        self.max_size = max(1, max_size)
+        self.ttl = ttl
+        self.channel = channel or LocalInvalidationChannel()
+        self.enabled = enabled and ttl > 0
+        if self.enabled and workers > 1 and not self.channel.shared:
+            self.enabled = False
+            LOGGER.warning(
+                f"Token 版本缓存未启用: {workers} 个 worker 进程但失效通道不能跨进程, "
+                f"请配置 AUTH_TOKEN_INVALIDATION_BACKEND=redis"
+            )
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._generation: int = 0
+        self._started: bool = False
+        # 运行指标
+        self.hits: int = 0
+        self.misses: int = 0
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    async def start(self) -> None:
+        """启动失效通道订阅；订阅失败时禁用缓存，认证退回逐次查库。"""
+        if self._started or not self.enabled:
+            return
+        try:
+            await self.channel.start(self.evict)
+            self._started = True
+        except Exception as e:
+            self.enabled = False
+            LOGGER.error(f"Token 失效通道启动失败, 已禁用 Token 版本缓存, 异常描述: {e}")
+
+    async def stop(self) -> None:
+        if not self._started:
+            return
+        await self.channel.stop()
+        self._started = False
+        self._entries.clear()
+
+    def get(self, user_id: int) -> Optional[AuthPrincipal]:
+        if not self.enabled:
+            return None
+        entry = self._entries.get(user_id)
+        if entry is None:
+            self.misses += 1
+            return None
+        principal, expires_at = entry
+        if expires_at <= time.monotonic():
+            self._entries.pop(user_id, None)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return principal
+
+    def set(self, principal: AuthPrincipal, generation: int) -> None:
+        """
+        回填缓存。
+
+        :param principal: 从数据库读取的用户快照
+        :param generation: 读取数据库前的缓存代数，期间发生过失效则放弃回填
+        """
+        if not self.enabled or generation != self._generation:
+            return
+        self._entries[principal.id] = (principal, time.monotonic() + self.ttl)
+        self._entries.move_to_end(principal.id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def evict(self, user_ids: Iterable[int]) -> None:
+        """仅失效本进程缓存（失效通道回调）。"""
+        self._generation += 1
+        for user_id in user_ids:
+            self._entries.pop(int(user_id), None)
+
+    async def invalidate(self, *user_ids: int) -> None:
+        """失效本进程缓存并通知其他 worker；需在 token_version 变更落库之后调用。"""
+        user_ids: List[int] = [int(user_id) for user_id in user_ids if user_id]
+        if not user_ids:
+            return
+        self.evict(user_ids)
+        if not self._started:
+            return
+        try:
+            await self.channel.publish(user_ids)
+        except Exception as e:
+            LOGGER.error(f"Token 失效通知发布失败, user_ids={user_ids}, 异常描述: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {"enabled": self.enabled, "size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+def _build_channel() -> InvalidationChannel:
+    if PROJECT_CONFIG.shared_backend(PROJECT_CONFIG.AUTH_TOKEN_INVALIDATION_BACKEND) == "redis":
+        return RedisInvalidationChannel(
+            redis_url=PROJECT_CONFIG.REDIS_URL,
+            channel=PROJECT_CONFIG.AUTH_TOKEN_INVALIDATION_CHANNEL,
+        )
+    return LocalInvalidationChannel()
+
+
+TOKEN_VERSION_CACHE = TokenVersionCache(
+    max_size=PROJECT_CONFIG.AUTH_TOKEN_CACHE_MAX_SIZE,
+    ttl=PROJECT_CONFIG.AUTH_TOKEN_CACHE_TTL,
+    enabled=PROJECT_CONFIG.AUTH_TOKEN_CACHE_ENABLED,
+    channel=_build_channel(),
+    workers=PROJECT_CONFIG.SERVER_WORKERS,
+)
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+@Author  : yangkai
+@Email   : 807440781@qq.com
+@Project : Krun
+@Module  : test_audit_search.py
+@DateTime: 2026/6/26
+
+审计日志关键字检索倒排表测试（SQLite 内存库）：按倒排表缩小范围后的检索结果须与逐行 LIKE 扫描一致。
+
+运行方式：
+    python -m unittest discover -s tests
+"""
+import unittest
+from datetime import datetime, timedelta
+
+import core  # noqa: F401  先完成 core 初始化，避免循环导入
+from tortoise import Tortoise
+from tortoise.expressions import Q
+
+from applications.base.models.audit_model import Audit, AuditSearchToken
+from applications.base.services.audit_search import AUDIT_SEARCH_FIELDS, AuditSearchIndex
+from configure import PROJECT_CONFIG
+
+_WORDS = ("alpha", "beta", "gamma", "订单", "支付", "退款")
+
+
+class AuditSearchIndexTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        await Tortoise.init(
+            db_url="sqlite://:memory:",
+            modules={"models": PROJECT_CONFIG.APPLICATIONS_MODELS},
+        )
+        await Tortoise.generate_schemas()
+        self.index = AuditSearchIndex(bucket_minutes=10)
+        self.now = datetime.now()
+
+    async def asyncTearDown(self):
+        await Tortoise.close_connections()
+
+    def _record(self, i: int, request_time: datetime, router: str) -> dict:
+        return dict(
+            user_id=1, username=f"user{i}", request_time=request_time, request_method="POST",
+            request_router=f"{router}{i}", request_params=f'{{"k": "{_WORDS[i % len(_WORDS)]}-{i}"}}',
+            response_time=request_time, response_code="200", response_message="ok", response_elapsed=10,
+        )
+
+    async def _write(self, records: list, indexed: bool = True) -> None:
+        if indexed:
+            await self.index.index(records)
+        await Audit.bulk_create([Audit(**record) for record in records])
+
+    async def _assert_same_as_like(self, keyword: str) -> None:
+        terms = keyword.split()
+        like = Q()
+        for term in terms:
+            like &= Q(*(Q(**{f"{field}__icontains": term}) for field in AUDIT_SEARCH_FIELDS), join_type="OR")
+        expected = sorted(await Audit.filter(like).values_list("id", flat=True))
+        ranges = await self.index.search_q(terms)
+        search = like if ranges is None else like & ranges
+        self.assertEqual(sorted(await Audit.filter(search).values_list("id", flat=True)), expected, keyword)
+
+    def test_tokens(self):
+        self.assertEqual(AuditSearchIndex.tokens("Ab c订单"), {"ab", "c订", "订单"})
+        self.assertEqual(AuditSearchIndex.tokens("a"), set())
+
+    def test_bucket_of(self):
+        value = datetime(2026, 6, 21, 13, 47, 12, 345)
+        self.assertEqual(self.index.bucket_of(value), datetime(2026, 6, 21, 13, 40))
+
+    async def test_search_matches_like_scan(self):
+        # 建立倒排表之前写入的历史记录
+        await self._write([self._record(i, self.now - timedelta(days=3, minutes=i), "/old/r") for i in range(20)], indexed=False)
+        start = self.now - timedelta(days=2)
+        records = [self._record(i, start + timedelta(minutes=7 * i), "/base/r") for i in range(300)]
+        for offset in range(0, len(records), 50):
+            await self._write(records[offset:offset + 50])
+
+        for keyword in ("gamma", "订单", "退款-5", "alpha 12", "GAMMA-2", "/base/r3", "/old/r1", "zz", "a"):
+            await self._assert_same_as_like(keyword)
+        # 只命中少量时间桶的关键字只扫描对应的时间区间
+        ranges = await self.index.search_q(["退款-5"])
+        self.assertLess(len(ranges.children), 10)
+
+        # 删除较早的时间桶后，覆盖范围之前的记录按 LIKE 扫描，结果不变
+        await self.index.purge(self.now - timedelta(days=1))
+        for keyword in ("gamma", "退款-5", "/base/r3"):
+            await self._assert_same_as_like(keyword)
+
+    async def test_purge_keeps_recent_buckets(self):
+        await self._write([self._record(0, self.now, "/base/r")])
+        count = await AuditSearchToken.all().count()
+        await self.index.purge()
+        self.assertEqual(await AuditSearchToken.all().count(), count)
+        # 其他进程会再次写入（INSERT IGNORE 忽略已存在的行），本进程已写入的二元组不再写库
+        self.assertEqual(await AuditSearchIndex().index([self._record(0, self.now, "/base/r")]), count)
+        self.assertEqual(await self.index.index([self._record(0, self.now, "/base/r")]), 0)
+        self.assertEqual(await AuditSearchToken.all().count(), count)
+
+
+if __name__ == "__main__":
+    unittest.main()
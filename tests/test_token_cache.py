@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+@Author  : yangkai
+@Email   : 807440781@qq.com
+@Project : Krun
+@Module  : test_token_cache.py
+@DateTime: 2026/6/26
+
+Token 版本缓存与失效通道测试：多个缓存实例共用一个 LocalInvalidationChannel，模拟多 worker 的失效广播。
+
+运行方式：
+    python -m unittest discover -s tests
+"""
+import unittest
+
+import core  # noqa: F401  先完成 core 初始化，避免循环导入
+from services.token_cache import (
+    AuthPrincipal,
+    InvalidationChannel,
+    LocalInvalidationChannel,
+    TokenVersionCache,
+)
+
+
+def _principal(user_id: int, token_version: int = 0) -> AuthPrincipal:
+    return AuthPrincipal(
+        id=user_id, username=f"user{user_id}", token_version=token_version,
+        state=0, is_active=True, is_superuser=False,
+    )
+
+
+class _SharedChannel(LocalInvalidationChannel):
+    """能跨进程送达的通道替身（如 redis）。"""
+    shared = True
+
+
+class TokenVersionCacheTest(unittest.IsolatedAsyncioTestCase):
+
+    async def test_invalidate_broadcasts_to_other_workers(self):
+        channel = _SharedChannel()
+        worker_a = TokenVersionCache(channel=channel, workers=2)
+        worker_b = TokenVersionCache(channel=channel, workers=2)
+        await worker_a.start()
+        await worker_b.start()
+        for cache in (worker_a, worker_b):
+            cache.set(_principal(1), generation=cache.generation)
+            self.assertIsNotNone(cache.get(1))
+
+        await worker_a.invalidate(1)
+
+        self.assertIsNone(worker_a.get(1))
+        self.assertIsNone(worker_b.get(1))
+
+    async def test_stale_fill_after_invalidation_is_dropped(self):
+        cache = TokenVersionCache()
+        await cache.start()
+        generation = cache.generation
+        await cache.invalidate(1)
+
+        cache.set(_principal(1), generation=generation)
+
+        self.assertIsNone(cache.get(1))
+
+    def test_local_channel_disabled_with_multiple_workers(self):
+        self.assertFalse(TokenVersionCache(channel=LocalInvalidationChannel(), workers=4).enabled)
+        self.assertTrue(TokenVersionCache(channel=LocalInvalidationChannel(), workers=1).enabled)
+        self.assertTrue(TokenVersionCache(channel=_SharedChannel(), workers=4).enabled)
+        self.assertFalse(InvalidationChannel.shared)
+
+    def test_zero_ttl_disables_cache(self):
+        cache = TokenVersionCache(ttl=0)
+        cache.set(_principal(1), generation=cache.generation)
+        self.assertIsNone(cache.get(1))
+
+
+if __name__ == "__main__":
+    unittest.main()